@@ -1,7 +1,9 @@
 """ASGI composition root for MarkiNote."""
 from __future__ import annotations
 
-from contextlib import asynccontextmanager
+import asyncio
+import logging
+from contextlib import asynccontextmanager, suppress
 from functools import partial
 from typing import cast
 
@@ -34,13 +36,36 @@ from markinote_api.modules.documents.storage import LocalDocumentStorage
 from markinote_api.modules.operations.backup import BackupManager
 from markinote_api.modules.operations.journal import CommandJournal, JsonCommandJournal, SqlCommandJournal
 from markinote_api.modules.operations.router import router as operations_router
+from markinote_api.modules.rendering.prerender import DocumentPrerenderer
 from markinote_api.modules.rendering.router import router as rendering_router
+from markinote_api.modules.rendering.service import configure_render_cache
+from markinote_api.modules.rendering.workers import RenderProcessPool
 from markinote_api.platform.errors import ProblemDetails, install_exception_handlers
+from markinote_api.platform.executor import BoundedIOExecutor
+from markinote_api.platform.file_locks import configure_file_locks
 from markinote_api.platform.health import router as health_router
+from markinote_api.platform.io import configure_durability
 from markinote_api.platform.logging import configure_logging
 from markinote_api.platform.middleware import install_middleware
 from markinote_api.platform.schemas import ApiRootResponse
 from markinote_api.platform.telemetry import configure_telemetry
+from markinote_api.platform.watcher import LibraryWatcher
+
+
+async def _reconcile_library_size(
+    storage: LocalDocumentStorage,
+    interval_seconds: int,
+    logger: logging.Logger,
+) -> None:
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            await asyncio.to_thread(storage.reconcile_library_size)
+        except Exception:
+            logger.exception(
+                "library size reconciliation failed",
+                extra={"error_code": "library_size_reconciliation_failed"},
+            )
 
 
 def create_application(settings: Settings | None = None) -> FastAPI:
@@ -50,7 +75,27 @@ def create_application(settings: Settings | None = None) -> FastAPI:
 
     @asynccontextmanager
     async def lifespan(application: FastAPI):
+        reconciler: asyncio.Task[None] | None = None
+        watcher: LibraryWatcher | None = None
         try:
+            storage = application.state.document_service.storage
+            if settings.library_watcher != "off":
+                # Start watching before the cold index build so that no
+                # external change can fall between the scan and the watch.
+                watcher = LibraryWatcher(
+                    storage.root,
+                    backend=settings.library_watcher,
+                    poll_interval=settings.library_watch_poll_seconds,
+                )
+                watcher.subscribe(storage.apply_library_changes)
+                watcher.start()
+                application.state.library_watcher = watcher
+            storage.rebuild_search_index()
+            if application.state.render_pool is not None:
+                await asyncio.to_thread(application.state.render_pool.start)
+            reconciler = asyncio.create_task(
+                _reconcile_library_size(storage, settings.library_size_reconcile_seconds, logger)
+            )
             application.state.agent_run_reconciled_count = 0
             if settings.agent_run_reconcile_on_startup:
                 try:
@@ -75,6 +120,19 @@ def create_application(settings: Settings | None = None) -> FastAPI:
                     )
             yield
         finally:
+            if reconciler is not None:
+                reconciler.cancel()
+                with suppress(asyncio.CancelledError):
+                    await reconciler
+            if watcher is not None:
+                await asyncio.to_thread(watcher.stop)
+            # Held editor saves are written before the pool that serves them goes.
+            await asyncio.to_thread(application.state.document_service.close)
+            application.state.document_executor.shutdown()
+            if application.state.document_prerenderer is not None:
+                await asyncio.to_thread(application.state.document_prerenderer.close)
+            if application.state.render_pool is not None:
+                await asyncio.to_thread(application.state.render_pool.close)
             database = getattr(application.state, "database", None)
             if database is not None:
                 database.close()
@@ -101,30 +159,77 @@ def create_application(settings: Settings | None = None) -> FastAPI:
                 413: "Request or resource too large",
                 422: "Contract validation failed",
                 500: "Internal server error",
+                503: "Resource busy",
             }.items()
         },
     )
     app.state.settings = settings
     app.state.logger = logger
 
+    configure_file_locks(
+        settings.lock_backend,
+        settings.lock_folder,
+        stripes=settings.lock_stripes,
+        timeout=settings.lock_timeout_seconds,
+    )
+    configure_durability(settings.write_durability, batch_window=settings.write_batch_window_ms / 1000)
+    configure_render_cache(
+        settings.render_cache_bytes,
+        directory=settings.backups_folder / ".render-cache",
+        max_disk_bytes=settings.render_cache_disk_bytes,
+        highlight_bytes=settings.render_highlight_cache_bytes,
+    )
+    document_storage = LocalDocumentStorage(
+        settings.library_folder,
+        settings.trash_folder,
+        allowed_extensions=settings.allowed_extensions,
+        max_document_bytes=settings.max_document_bytes,
+        max_library_bytes=settings.max_library_bytes,
+        trash_max_items=settings.trash_max_items,
+        trash_max_bytes=settings.trash_max_bytes,
+    )
     backup_manager = BackupManager(
         settings.backups_folder,
         settings.library_folder,
         settings.backup_max_groups,
         settings.backup_max_bytes,
+        on_library_change=document_storage.refresh_indexes,
     )
     app.state.backup_manager = backup_manager
-    app.state.document_service = DocumentService(
-        LocalDocumentStorage(
-            settings.library_folder,
-            settings.trash_folder,
-            allowed_extensions=settings.allowed_extensions,
-            max_document_bytes=settings.max_document_bytes,
-            max_library_bytes=settings.max_library_bytes,
-            trash_max_items=settings.trash_max_items,
-            trash_max_bytes=settings.trash_max_bytes,
+    app.state.render_pool = (
+        RenderProcessPool(
+            settings.render_workers,
+            timeout=settings.render_timeout_seconds,
+            cache_bytes=settings.render_cache_bytes,
+            highlight_bytes=settings.render_highlight_cache_bytes,
         )
+        if settings.render_backend == "process"
+        else None
+    )
+    app.state.document_prerenderer = (
+        DocumentPrerenderer(max_bytes=settings.max_preview_bytes, pool=app.state.render_pool)
+        if settings.render_on_save
+        else None
+    )
+    app.state.document_service = DocumentService(
+        document_storage,
+        save_coalesce_seconds=settings.document_save_coalesce_ms / 1000,
+        on_saved=None if app.state.document_prerenderer is None else app.state.document_prerenderer.schedule,
+    )
+    app.state.document_executor = BoundedIOExecutor(
+        settings.document_io_workers,
+        {
+            "search": settings.document_io_search_limit,
+            "list": settings.document_io_list_limit,
+            "read": settings.document_io_read_limit,
+            "write": settings.document_io_write_limit,
+            "render": settings.document_io_render_limit,
+        },
+        name="markinote-documents",
     )
+    # Set by the lifespan when MARKINOTE_LIBRARY_WATCHER is not "off"; other
+    # long-lived caches may subscribe to it for external library changes.
+    app.state.library_watcher = None
 
     database: Database | None = None
     conversation_repository: ConversationRepository
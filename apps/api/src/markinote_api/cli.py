@@ -1,10 +1,21 @@
-"""Command line entry point."""
+"""Command line entry points."""
 from __future__ import annotations
 
+import argparse
+import json
 import os
+import sys
+from collections.abc import Sequence
+from pathlib import Path
 
 import uvicorn
 
+from markinote_api.config import get_settings
+from markinote_api.modules.documents.importer import ImportCheckpoint, LibraryImporter
+from markinote_api.modules.documents.storage import LocalDocumentStorage
+from markinote_api.platform.file_locks import configure_file_locks
+from markinote_api.platform.io import configure_durability
+
 
 def main() -> None:
     uvicorn.run(
@@ -12,6 +23,93 @@ def main() -> None:
         host=os.getenv("MARKINOTE_HOST", "127.0.0.1"),
         port=int(os.getenv("MARKINOTE_PORT", "8000")),
         reload=os.getenv("MARKINOTE_RELOAD", "").lower() in {"1", "true", "yes"},
+        # Settings reject more than one worker unless MARKINOTE_LOCK_BACKEND=file.
+        workers=get_settings().workers,
         factory=False,
         access_log=False,
     )
+
+
+def _import_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="markinote-import",
+        description="Copy a local folder of Markdown and text files into the configured library.",
+    )
+    parser.add_argument("source", type=Path, help="folder to import")
+    parser.add_argument("--target", default="", help="library folder to import into; the root by default")
+    parser.add_argument("--workers", type=int, default=min(32, (os.cpu_count() or 1) * 4))
+    parser.add_argument(
+        "--checkpoint",
+        type=Path,
+        default=Path(".markinote-import.jsonl"),
+        help="progress file; rerunning with the same file resumes an interrupted import",
+    )
+    parser.add_argument(
+        "--overwrite",
+        action="store_true",
+        help="replace library documents whose content differs; they are reported as conflicts otherwise",
+    )
+    parser.add_argument(
+        "--api-stopped",
+        action="store_true",
+        help="confirm that no API process uses the library; required unless MARKINOTE_LOCK_BACKEND=file",
+    )
+    return parser
+
+
+def import_library(argv: Sequence[str] | None = None) -> int:
+    """Bulk-import a folder straight into the library and print a JSON summary.
+
+    Files are written with the same locks as the API. Those locks and the
+    size ledger are only shared between processes under
+    ``MARKINOTE_LOCK_BACKEND=file``; with the process backend the import
+    refuses to run unless ``--api-stopped`` confirms that no API uses the
+    library. A running API picks the files up through its library watcher,
+    which is the only way it learns of them; with the watcher off, restart
+    the API after importing. Any API rebuilds its indexes on startup.
+    """
+    arguments = _import_parser().parse_args(argv)
+    source = arguments.source.resolve()
+    if not source.is_dir():
+        print(json.dumps({"error": "source is not a folder"}), file=sys.stderr)
+        return 2
+    settings = get_settings()
+    if settings.lock_backend != "file" and not arguments.api_stopped:
+        print(
+            json.dumps({"error": "stop the API and pass --api-stopped, or use MARKINOTE_LOCK_BACKEND=file"}),
+            file=sys.stderr,
+        )
+        return 2
+    configure_file_locks(
+        settings.lock_backend,
+        settings.lock_folder,
+        stripes=settings.lock_stripes,
+        timeout=settings.lock_timeout_seconds,
+    )
+    configure_durability(settings.write_durability, batch_window=settings.write_batch_window_ms / 1000)
+    storage = LocalDocumentStorage(
+        settings.library_folder,
+        settings.trash_folder,
+        allowed_extensions=settings.allowed_extensions,
+        max_document_bytes=settings.max_document_bytes,
+        max_library_bytes=settings.max_library_bytes,
+        trash_max_items=settings.trash_max_items,
+        trash_max_bytes=settings.trash_max_bytes,
+    )
+    target = arguments.target.strip("/")
+    try:
+        checkpoint = ImportCheckpoint(arguments.checkpoint, source=source, target=target)
+    except ValueError:
+        print(json.dumps({"error": "checkpoint belongs to another import"}), file=sys.stderr)
+        return 2
+    importer = LibraryImporter(
+        storage,
+        workers=arguments.workers,
+        overwrite=arguments.overwrite,
+        checkpoint=checkpoint,
+        progress=lambda summary: print(json.dumps(summary, ensure_ascii=False), file=sys.stderr, flush=True),
+    )
+    summary = importer.run(source, target).summary()
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    statuses = summary["statuses"]
+    return 1 if statuses.get("failed") or statuses.get("conflict") else 0
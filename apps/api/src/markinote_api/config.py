@@ -60,6 +60,57 @@ class Settings(BaseSettings):
     max_library_bytes: int = 1024 * 1024 * 1024
     trash_max_items: int = 500
     trash_max_bytes: int = 1024 * 1024 * 1024
+    # The quota ledger is updated by every adapter write; the periodic walk
+    # only corrects drift from writers that bypass the adapter.
+    library_size_reconcile_seconds: int = 5 * 60
+    # External edits (git pull, sync clients, bulk imports) reach the search
+    # indexes and folder tree through this watcher; "off" leaves them to the
+    # explicit refresh paths.
+    library_watcher: Literal["auto", "inotify", "polling", "off"] = "auto"
+    library_watch_poll_seconds: float = Field(default=2.0, gt=0, le=3600)
+    # "process" locks are enough for one API process. Several uvicorn workers
+    # sharing the library and the JSON journals need the flock-based "file"
+    # backend, which stripes keys over a fixed set of lock files.
+    lock_backend: Literal["process", "file"] = "process"
+    lock_folder: Path = REPOSITORY_ROOT / ".locks"
+    lock_stripes: int = Field(default=64, ge=1, le=4096)
+    lock_timeout_seconds: float = Field(default=30.0, gt=0, le=3600)
+    workers: int = Field(default=1, ge=1, le=64)
+    # Durability of journal, manifest and metadata writes; documents are
+    # always strict. "batched" keeps strict's guarantee but lets concurrent
+    # writers share directory fsyncs within the window.
+    write_durability: Literal["strict", "batched", "relaxed"] = "batched"
+    write_batch_window_ms: float = Field(default=2.0, ge=0, le=100)
+    # Document routes run on their own pool so that agent streams holding
+    # the server's shared threadpool cannot starve them. Each operation kind
+    # is capped separately, and a slow kind leaves workers for the others.
+    document_io_workers: int = Field(default=16, ge=1, le=256)
+    document_io_search_limit: int = Field(default=4, ge=1, le=256)
+    document_io_list_limit: int = Field(default=8, ge=1, le=256)
+    document_io_read_limit: int = Field(default=8, ge=1, le=256)
+    document_io_write_limit: int = Field(default=4, ge=1, le=256)
+    # Previews rendered on demand when no stored render exists yet.
+    document_io_render_limit: int = Field(default=2, ge=1, le=256)
+    # Editor saves of one document within this window are acknowledged at
+    # once and written newest-only when it ends; 0 writes every save. Held
+    # saves exist only in this process: a crash loses them, and other
+    # workers would not see them, so coalescing needs a single worker.
+    document_save_coalesce_ms: int = Field(default=0, ge=0, le=10_000)
+    # Rendered previews are cached by content hash. The disk tier lives in
+    # <backups_folder>/.render-cache and survives restarts; 0 disables it.
+    render_cache_bytes: int = Field(default=32 * 1024 * 1024, ge=0)
+    render_cache_disk_bytes: int = Field(default=0, ge=0)
+    # Highlighted code blocks are memoized by language and code across documents.
+    render_highlight_cache_bytes: int = Field(default=8 * 1024 * 1024, ge=0)
+    # "process" renders cache misses in warm worker processes so that a heavy
+    # preview cannot hold the API's GIL; a worker whose render exceeds the
+    # timeout is killed and replaced. "thread" renders in the request thread.
+    render_backend: Literal["thread", "process"] = "thread"
+    render_workers: int = Field(default=2, ge=1, le=64)
+    render_timeout_seconds: float = Field(default=10.0, gt=0, le=600)
+    # Saved documents are rendered in the background and stored by content
+    # version for GET /api/v1/documents/rendered; off renders on first view.
+    render_on_save: bool = True
     allowed_extensions: set[str] = Field(default_factory=lambda: {"md", "markdown", "txt"})
     max_message_chars: int = 32 * 1024
     max_attachment_bytes: int = 256 * 1024
@@ -110,6 +161,7 @@ class Settings(BaseSettings):
         "max_library_bytes",
         "trash_max_items",
         "trash_max_bytes",
+        "library_size_reconcile_seconds",
     )
     @classmethod
     def positive_limit(cls, value: int) -> int:
@@ -154,6 +206,12 @@ class Settings(BaseSettings):
                 "ai_max_sse_event_bytes must cover ai_max_tool_arguments_bytes "
                 "plus the tool-result envelope"
             )
+        if self.workers > 1 and self.lock_backend != "file":
+            raise ValueError("more than one worker requires lock_backend=file")
+        if self.workers > 1 and self.document_save_coalesce_ms:
+            raise ValueError("document_save_coalesce_ms requires a single worker")
+        if self.workers > 1 and self.agent_run_single_writer:
+            raise ValueError("agent_run_single_writer cannot be attested with several workers")
         if self.agent_run_reconcile_on_startup and not self.agent_run_single_writer:
             raise ValueError(
                 "agent run startup reconciliation requires an explicit single-writer "
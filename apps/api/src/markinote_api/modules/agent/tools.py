@@ -6,6 +6,7 @@ import logging
 import os
 import socket
 from collections.abc import Callable
+from functools import lru_cache
 from pathlib import Path
 from typing import Protocol, cast
 from urllib.parse import urljoin, urlsplit, urlunsplit
@@ -14,7 +15,8 @@ from markinote_api.modules.documents.errors import DocumentError
 from markinote_api.modules.documents.service import DocumentService
 from markinote_api.modules.documents.storage import LocalDocumentStorage
 from markinote_api.platform.files import safe_filename
-from markinote_api.platform.io import read_utf8_text, resource_lock
+from markinote_api.platform.io import read_utf8_text
+from markinote_api.platform.path_locks import path_locks
 from markinote_api.platform.paths import relative_to_root, resolve_under_root
 
 MUTATING_TOOLS = {'write_file', 'edit_file', 'create_file', 'create_folder', 'delete_item', 'move_item'}
@@ -368,12 +370,18 @@ def _document_service(extra, library_dir, backup_manager):
         return configured
     library = Path(library_dir).resolve()
     backup_root = Path(backup_manager.backup_dir).resolve() if backup_manager else library.parent
+    return _fallback_document_service(library, backup_root, MAX_TOOL_FILE_BYTES)
+
+
+@lru_cache(maxsize=8)
+def _fallback_document_service(library, backup_root, max_document_bytes):
+    # Reused across calls so the adapter's search indexes are built only once.
     return DocumentService(
         LocalDocumentStorage(
             library,
             backup_root / '.tool-trash',
             allowed_extensions=DOCUMENT_EXTENSIONS,
-            max_document_bytes=MAX_TOOL_FILE_BYTES,
+            max_document_bytes=max_document_bytes,
             max_library_bytes=0,
             trash_max_items=100,
             trash_max_bytes=256 * 1024 * 1024,
@@ -480,6 +488,12 @@ def execute_tool(tool_name, arguments, library_dir, backup_manager, backup_group
     if not handler:
         return '未知工具：请求的工具不在允许列表中', None
 
+    configured = extra.get('document_service')
+    if isinstance(configured, DocumentService):
+        # Tools read and back up files directly under their own path locks, so
+        # coalesced editor saves are written before any lock is taken.
+        configured.flush_saves()
+
     try:
         return handler(args, library_dir, backup_manager, backup_group_id, **extra)
     except MutationCompensatedError:
@@ -543,7 +557,7 @@ def _write_file(args, lib_dir, bm, gid, **extra):
     if len(content.encode('utf-8')) > MAX_TOOL_FILE_BYTES:
         return f'写入内容超过 {MAX_TOOL_FILE_BYTES} 字节限制', None
 
-    with resource_lock(lib_dir):
+    with path_locks(lib_dir).exclusive(rel):
         if not os.path.isfile(full):
             return f'文件不存在: {rel}（如需创建新文件请用 create_file）', None
         operation_index = None
@@ -574,7 +588,7 @@ def _edit_file(args, lib_dir, bm, gid, **extra):
     if not isinstance(new_text, str):
         return 'new_text 必须为字符串', None
 
-    with resource_lock(lib_dir):
+    with path_locks(lib_dir).exclusive(rel):
         if not os.path.isfile(full):
             return f'文件不存在: {rel}', None
         content = read_utf8_text(full)
@@ -613,7 +627,7 @@ def _create_file(args, lib_dir, bm, gid, **extra):
     if len(content.encode('utf-8')) > MAX_TOOL_FILE_BYTES:
         return f'创建内容超过 {MAX_TOOL_FILE_BYTES} 字节限制', None
 
-    with resource_lock(lib_dir):
+    with path_locks(lib_dir).exclusive(rel):
         if os.path.exists(full):
             return f'文件已存在: {rel}', None
         parent = os.path.dirname(full)
@@ -641,7 +655,7 @@ def _create_file(args, lib_dir, bm, gid, **extra):
 
 def _create_folder(args, lib_dir, bm, gid, **extra):
     full, rel = _safe_path(args['path'], lib_dir)
-    with resource_lock(lib_dir):
+    with path_locks(lib_dir).exclusive(rel):
         if os.path.exists(full):
             return f'文件夹已存在: {rel}', None
         parent = os.path.dirname(full)
@@ -670,7 +684,7 @@ def _delete_item(args, lib_dir, bm, gid, **extra):
     full, rel = _safe_path(args['path'], lib_dir)
     if not gid or not bm:
         return 'Deletion refused because no durable backup group is available.', None
-    with resource_lock(lib_dir):
+    with path_locks(lib_dir).exclusive(rel):
         if not os.path.exists(full):
             return f'路径不存在: {rel}', None
         is_file = os.path.isfile(full)
@@ -702,11 +716,13 @@ def _move_item(args, lib_dir, bm, gid, **extra):
     if not isinstance(target_arg, str):
         return 'target 必须为字符串', None
     if target_arg.strip() in {'', '/', '\\'}:
-        tgt_full = os.path.abspath(lib_dir)
+        tgt_full, tgt_rel = os.path.abspath(lib_dir), ''
     else:
-        tgt_full, _ = _safe_path(target_arg, lib_dir)
+        tgt_full, tgt_rel = _safe_path(target_arg, lib_dir)
 
-    with resource_lock(lib_dir):
+    # The target may be a folder that receives the item or the exact
+    # destination; locking it covers both.
+    with path_locks(lib_dir).exclusive(src_rel, tgt_rel):
         if not os.path.exists(src_full):
             return f'源路径不存在: {src_rel}', None
         if os.path.isdir(tgt_full) and os.path.exists(tgt_full):
@@ -792,56 +808,29 @@ def _search_files(args, lib_dir, bm, gid, **extra):
         return '搜索关键词不能为空', None
     if len(query) > 200:
         return '搜索关键词过长', None
+    if not isinstance(search_path, str):
+        return '搜索目录不存在', None
 
+    prefix = ''
     if search_path:
-        base, _ = _safe_path(search_path, lib_dir)
-    else:
-        base = lib_dir
+        base, prefix = _safe_path(search_path, lib_dir)
+        if not os.path.isdir(base):
+            return '搜索目录不存在', None
 
-    if not os.path.isdir(base):
-        return '搜索目录不存在', None
+    service = _document_service(extra, lib_dir, bm)
+    result = service.search_content(query, path=prefix, limit=20)
 
     results = []
-    query_lower = query.lower()
-    max_results = 20
-    max_scanned_files = 2000
-    scanned_files = 0
-
-    for root, dirs, files in os.walk(base):
-        dirs[:] = [d for d in dirs if not d.startswith('.') and not os.path.islink(os.path.join(root, d))]
-        for fname in files:
-            scanned_files += 1
-            if scanned_files > max_scanned_files:
-                break
-            if fname.startswith('.'):
-                continue
-            ext = fname.rsplit('.', 1)[-1].lower() if '.' in fname else ''
-            if ext not in ('md', 'markdown', 'txt'):
-                continue
-            fpath = os.path.join(root, fname)
-            try:
-                if os.path.getsize(fpath) > MAX_TOOL_FILE_BYTES:
-                    continue
-                with open(fpath, encoding='utf-8', errors='ignore') as f:
-                    matches = []
-                    for i, line in enumerate(f, 1):
-                        if query_lower in line.lower():
-                            matches.append(f'  L{i}: {line.rstrip()[:120]}')
-                            if len(matches) >= 5:
-                                break
-                if matches:
-                    rel = os.path.relpath(fpath, lib_dir).replace('\\', '/')
-                    results.append(f'文档 {rel}（至少 {len(matches)} 处匹配）\n' + '\n'.join(matches))
-                    if len(results) >= max_results:
-                        break
-            except Exception:
-                continue
-        if len(results) >= max_results or scanned_files > max_scanned_files:
-            break
+    for item in result['items']:
+        matches = [f"  L{match['line']}: {match['text'][:120]}" for match in item['matches']]
+        results.append(f"文档 {item['path']}（{item['match_count']} 行匹配）\n" + '\n'.join(matches))
 
     if not results:
         return f'未找到包含 "{query}" 的文件', None
-    return f'搜索 "{query}" 的结果 ({len(results)} 个文件):\n\n' + '\n\n'.join(results), None
+    header = f'搜索 "{query}" 的结果 ({len(results)} 个文件'
+    if result['truncated']:
+        header += f'，共 {result["total"]} 个匹配文件'
+    return header + '):\n\n' + '\n\n'.join(results), None
 
 
 def _validate_public_url(url):
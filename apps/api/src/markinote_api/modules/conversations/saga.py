@@ -16,6 +16,7 @@ from markinote_api.modules.operations.backup import BackupManager
 from markinote_api.platform.errors import Problem
 from markinote_api.platform.io import atomic_write_json, resource_lock
 from markinote_api.platform.metrics import OPERATION_ROLLBACK_ATTEMPTS
+from markinote_api.platform.path_locks import path_locks
 from markinote_api.platform.paths import resolve_under_root
 
 LOGGER = logging.getLogger(__name__)
@@ -281,7 +282,7 @@ class ConversationRollbackSaga:
 
         record["manifest_snapshots"] = manifests
         snapshots: list[dict[str, Any]] = []
-        with resource_lock(self.backup_manager.library_dir):
+        with path_locks(self.backup_manager.library_dir).shared(*selected_paths):
             for index, relative in enumerate(sorted(selected_paths)):
                 target, normalized = resolve_under_root(
                     self.backup_manager.library_dir,
@@ -302,7 +303,10 @@ class ConversationRollbackSaga:
     def _restore(self, saga_dir: Path, record: dict[str, Any]) -> list[str]:
         errors: list[str] = []
         snapshots = record.get("path_snapshots", [])
-        with resource_lock(self.backup_manager.library_dir):
+        locked = [
+            str(item["path"]) for item in snapshots if isinstance(item, dict) and "path" in item
+        ]
+        with path_locks(self.backup_manager.library_dir).exclusive(*locked):
             for entry in sorted(
                 (item for item in snapshots if isinstance(item, dict)),
                 key=lambda item: str(item.get("path", "")).count("/"),
@@ -0,0 +1,461 @@
+"""Inverted full-text index over document contents with BM25 ranking.
+
+Text is NFC-normalized and casefolded. Letter/digit runs become word terms;
+CJK runs become overlapping bigrams plus the run's final character, so every
+character of a Chinese or Japanese note starts at least one indexed term.
+Postings keep the line numbers of each occurrence, which lets callers show
+matching lines without rescanning whole documents.
+
+Each indexed document remembers its content version and the stat signature it
+was read under. Queries re-validate only the ranked page they return and
+reindex any document whose signature changed, so results stay fresh without
+walking the library.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+import re
+import threading
+import unicodedata
+from array import array
+from bisect import bisect_left, insort
+from collections.abc import Iterator
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from markinote_api.modules.documents.search_index import walk_visible
+from markinote_api.platform.files import allowed_file
+from markinote_api.platform.io import content_version
+
+_CJK = "぀-ヿ㐀-䶿一-鿿가-힯豈-﫿"
+_TOKEN_RE = re.compile(rf"[{_CJK}]+|[^\W_{_CJK}]+")
+_CJK_RE = re.compile(rf"[{_CJK}]")
+_MIN_PREFIX_CHARS = 3
+_BM25_K1 = 1.2
+_BM25_B = 0.75
+# New terms wait in a short sorted list until it outgrows this or the square
+# root of the vocabulary, then are merged into the main list in one pass.
+_RECENT_TERMS_MIN = 256
+
+Signature = tuple[int, int, int]
+
+
+def _signature(stat_info: os.stat_result) -> Signature:
+    return stat_info.st_ino, stat_info.st_size, stat_info.st_mtime_ns
+
+
+def _run_terms(run: str) -> Iterator[str]:
+    if not _CJK_RE.match(run):
+        yield run
+        return
+    for index in range(len(run) - 1):
+        yield run[index:index + 2]
+    yield run[-1]
+
+
+def tokenize(text: str) -> Iterator[tuple[int, str]]:
+    """Yield ``(line_number, term)`` pairs for ``text``, numbering lines from 1."""
+    normalized = unicodedata.normalize("NFC", text).casefold()
+    for line_number, line in enumerate(normalized.splitlines(), 1):
+        for match in _TOKEN_RE.finditer(line):
+            for term in _run_terms(match.group()):
+                yield line_number, term
+
+
+def _term_lines(content: bytes) -> tuple[dict[str, array], int]:
+    """Return each term's line numbers and the number of terms in ``content``."""
+    lines: dict[str, array] = {}
+    length = 0
+    for line_number, term in tokenize(content.decode("utf-8", errors="ignore")):
+        occurrences = lines.get(term)
+        if occurrences is None:
+            occurrences = lines[term] = array("I")
+        occurrences.append(line_number)
+        length += 1
+    return lines, length
+
+
+def query_terms(query: str) -> list[tuple[str, bool]]:
+    """Split a query into ``(term, prefix)`` pairs.
+
+    Word terms of at least three characters and single CJK characters match
+    every indexed term they prefix, so partially typed words still match.
+    """
+    terms: dict[tuple[str, bool], None] = {}
+    normalized = unicodedata.normalize("NFC", query).casefold()
+    for match in _TOKEN_RE.finditer(normalized):
+        run = match.group()
+        if _CJK_RE.match(run):
+            if len(run) == 1:
+                terms[(run, True)] = None
+            else:
+                for index in range(len(run) - 1):
+                    terms[(run[index:index + 2], False)] = None
+        else:
+            terms[(run, len(run) >= _MIN_PREFIX_CHARS)] = None
+    return list(terms)
+
+
+@dataclass(slots=True)
+class _IndexedDocument:
+    version: str
+    signature: Signature
+    length: int
+    lines: dict[str, array] = field(default_factory=dict)
+
+
+@dataclass(frozen=True, slots=True)
+class ContentHit:
+    """One ranked document with the line numbers where query terms occur."""
+
+    path: str
+    score: float
+    line_numbers: tuple[int, ...]
+    size: int
+    mtime: float
+
+
+class LibraryContentIndex:
+    """Thread-safe inverted index over one library root's documents."""
+
+    def __init__(
+        self,
+        root: Path,
+        allowed_extensions: frozenset[str],
+        *,
+        max_document_bytes: int,
+    ) -> None:
+        self.root = root
+        self.allowed_extensions = allowed_extensions
+        self.max_document_bytes = max_document_bytes
+        self._lock = threading.RLock()
+        self._built = False
+        self._documents: dict[str, _IndexedDocument] = {}
+        self._paths: list[str] = []
+        self._postings: dict[str, set[str]] = {}
+        # Sorted terms for prefix queries: the main list and a short list of
+        # recent additions. A term that loses its last posting stays listed
+        # and prefix expansion skips it, until dead terms make up half of the
+        # lists and they are compacted; a listed term may also come back.
+        self._vocabulary: list[str] = []
+        self._recent_terms: list[str] = []
+        self._dead_terms = 0
+        self._total_length = 0
+
+    @property
+    def built(self) -> bool:
+        return self._built
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def rebuild(self) -> int:
+        with self._lock:
+            self._documents.clear()
+            self._paths.clear()
+            self._postings.clear()
+            self._total_length = 0
+            for relative, is_folder in walk_visible(self.root, "", self.allowed_extensions):
+                if not is_folder:
+                    self._load(relative, keep_sorted=False)
+            self._paths.sort()
+            self._vocabulary = sorted(self._postings)
+            self._recent_terms = []
+            self._dead_terms = 0
+            self._built = True
+            return len(self._documents)
+
+    def ensure_built(self) -> None:
+        if not self._built:
+            with self._lock:
+                if not self._built:
+                    self.rebuild()
+
+    def refresh(self, relative_path: str) -> None:
+        """Resynchronize one document or subtree with the disk.
+
+        Documents whose stat signature is unchanged keep their postings, so
+        refreshing after the adapter's own writes costs one ``stat`` each.
+        """
+        with self._lock:
+            if not self._built:
+                return
+            if not relative_path:
+                self.rebuild()
+                return
+            present: set[str] = set()
+            candidate = self.root / relative_path
+            hidden = any(part.startswith(".") for part in relative_path.split("/"))
+            try:
+                if not hidden and not candidate.is_symlink():
+                    if candidate.is_dir():
+                        for relative, is_folder in walk_visible(candidate, relative_path, self.allowed_extensions):
+                            if not is_folder and self._sync(relative):
+                                present.add(relative)
+                    elif (
+                        candidate.is_file()
+                        and allowed_file(candidate.name, self.allowed_extensions)
+                        and self._sync(relative_path)
+                    ):
+                        present.add(relative_path)
+            except OSError:
+                pass
+            for path in (relative_path, *self._descendant_paths(relative_path)):
+                if path not in present:
+                    self._remove(path)
+
+    def _sync(self, relative_path: str) -> bool:
+        document = self._documents.get(relative_path)
+        if document is not None:
+            try:
+                stat_info = os.stat(self.root / relative_path, follow_symlinks=False)
+            except OSError:
+                return False
+            if _signature(stat_info) == document.signature:
+                return True
+            self._remove(relative_path)
+        self._load(relative_path)
+        return relative_path in self._documents
+
+    def put(self, relative_path: str, content: bytes) -> None:
+        """Index content that the caller has just written to ``relative_path``.
+
+        The content is tokenized before the index lock is taken, so searches
+        are not held up by a large save.
+        """
+        if not self._built:
+            return
+        version = content_version(content)
+        current = self._documents.get(relative_path)
+        terms = None if current is not None and current.version == version else _term_lines(content)
+        with self._lock:
+            try:
+                signature = _signature(os.stat(self.root / relative_path, follow_symlinks=False))
+            except OSError:
+                self._discard_subtree(relative_path)
+                return
+            current = self._documents.get(relative_path)
+            if current is not None and current.version == version:
+                current.signature = signature
+                return
+            if terms is None:
+                # Replaced by another writer since the unlocked check.
+                terms = _term_lines(content)
+            self._remove(relative_path)
+            self._insert(relative_path, terms, version, signature)
+
+    def move(self, source_path: str, destination_path: str) -> None:
+        """Re-key an indexed subtree after a rename without rereading it."""
+        with self._lock:
+            if not self._built:
+                return
+            moved = [
+                (path, self._documents[path])
+                for path in (source_path, *self._descendant_paths(source_path))
+                if path in self._documents
+            ]
+            if not moved:
+                return
+            self._discard_subtree(destination_path)
+            for path, document in moved:
+                self._remove(path)
+                target = destination_path + path[len(source_path):]
+                self._documents[target] = document
+                insort(self._paths, target)
+                self._total_length += document.length
+                for term in document.lines:
+                    self._post(term, target)
+
+    def search(self, query: str, *, prefix: str = "", limit: int) -> tuple[list[ContentHit], int]:
+        """Return the best ``limit`` BM25 hits and the total number of matches.
+
+        Every query term must occur in a document. Only returned hits are
+        stat'ed; a changed document is reindexed and the query repeated.
+        """
+        terms = query_terms(query)
+        if not terms:
+            return [], 0
+        self.ensure_built()
+        with self._lock:
+            for _attempt in range(3):
+                ranked, total = self._rank(terms, prefix, limit)
+                hits: list[ContentHit] = []
+                stale: list[str] = []
+                for score, path, line_numbers in ranked:
+                    try:
+                        stat_info = os.stat(self.root / path, follow_symlinks=False)
+                    except OSError:
+                        stale.append(path)
+                        continue
+                    if _signature(stat_info) != self._documents[path].signature:
+                        stale.append(path)
+                        continue
+                    hits.append(
+                        ContentHit(path, score, line_numbers, stat_info.st_size, stat_info.st_mtime)
+                    )
+                if not stale:
+                    return hits, total
+                for path in stale:
+                    self._discard_subtree(path)
+                    self._load(path)
+            return hits, total
+
+    def _rank(
+        self,
+        terms: list[tuple[str, bool]],
+        prefix: str,
+        limit: int,
+    ) -> tuple[list[tuple[float, str, tuple[int, ...]]], int]:
+        expansions = [self._expand(term, is_prefix) for term, is_prefix in terms]
+        document_sets: list[set[str]] = []
+        for expansion in expansions:
+            documents: set[str] = set()
+            for term in expansion:
+                documents.update(self._postings[term])
+            document_sets.append(documents)
+        smallest, *others = sorted(document_sets, key=len)
+        candidates = smallest.intersection(*others)
+        if prefix:
+            candidates = {path for path in candidates if path.startswith(prefix + "/")}
+        if not candidates:
+            return [], 0
+
+        count = len(self._documents)
+        average_length = self._total_length / count if count else 1.0
+        frequencies = [
+            math.log(1 + (count - len(documents) + 0.5) / (len(documents) + 0.5)) for documents in document_sets
+        ]
+
+        scored: list[tuple[float, str, tuple[int, ...]]] = []
+        for path in candidates:
+            document = self._documents[path]
+            normalizer = _BM25_K1 * (1 - _BM25_B + _BM25_B * document.length / (average_length or 1.0))
+            score = 0.0
+            line_numbers: set[int] = set()
+            for expansion, idf in zip(expansions, frequencies, strict=True):
+                occurrences = 0
+                for term in expansion:
+                    lines = document.lines.get(term)
+                    if lines is not None:
+                        occurrences += len(lines)
+                        line_numbers.update(lines)
+                score += idf * occurrences * (_BM25_K1 + 1) / (occurrences + normalizer)
+            scored.append((score, path, tuple(sorted(line_numbers))))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return scored[: max(1, limit)], len(scored)
+
+    def _expand(self, term: str, is_prefix: bool) -> list[str]:
+        if not is_prefix:
+            return [term] if term in self._postings else []
+        expansion: list[str] = []
+        for vocabulary in (self._vocabulary, self._recent_terms):
+            index = bisect_left(vocabulary, term)
+            while index < len(vocabulary) and vocabulary[index].startswith(term):
+                if vocabulary[index] in self._postings:
+                    expansion.append(vocabulary[index])
+                index += 1
+        return expansion
+
+    def _listed(self, term: str) -> bool:
+        for vocabulary in (self._vocabulary, self._recent_terms):
+            index = bisect_left(vocabulary, term)
+            if index < len(vocabulary) and vocabulary[index] == term:
+                return True
+        return False
+
+    def _list_term(self, term: str) -> None:
+        if self._listed(term):
+            self._dead_terms -= 1
+            return
+        insort(self._recent_terms, term)
+        if len(self._recent_terms) > max(_RECENT_TERMS_MIN, math.isqrt(len(self._vocabulary))):
+            # Two sorted runs: the sort merges them in linear time.
+            self._vocabulary.extend(self._recent_terms)
+            self._vocabulary.sort()
+            self._recent_terms = []
+
+    def _unlist_term(self) -> None:
+        self._dead_terms += 1
+        if self._dead_terms * 2 > len(self._vocabulary) + len(self._recent_terms):
+            self._vocabulary = [term for term in self._vocabulary if term in self._postings]
+            self._recent_terms = [term for term in self._recent_terms if term in self._postings]
+            self._dead_terms = 0
+
+    def _load(self, relative_path: str, *, keep_sorted: bool = True) -> None:
+        path = self.root / relative_path
+        try:
+            stat_info = os.stat(path, follow_symlinks=False)
+            if stat_info.st_size > self.max_document_bytes:
+                return
+            with open(path, "rb") as stream:
+                content = stream.read(self.max_document_bytes + 1)
+        except OSError:
+            return
+        if len(content) > self.max_document_bytes:
+            return
+        self._insert(
+            relative_path,
+            _term_lines(content),
+            content_version(content),
+            _signature(stat_info),
+            keep_sorted=keep_sorted,
+        )
+
+    def _insert(
+        self,
+        relative_path: str,
+        terms: tuple[dict[str, array], int],
+        version: str,
+        signature: Signature,
+        *,
+        keep_sorted: bool = True,
+    ) -> None:
+        lines, length = terms
+        self._documents[relative_path] = _IndexedDocument(version, signature, length, lines)
+        self._total_length += length
+        if keep_sorted:
+            insort(self._paths, relative_path)
+        else:
+            self._paths.append(relative_path)
+        for term in lines:
+            self._post(term, relative_path, keep_sorted=keep_sorted)
+
+    def _post(self, term: str, relative_path: str, *, keep_sorted: bool = True) -> None:
+        postings = self._postings.get(term)
+        if postings is None:
+            postings = self._postings[term] = set()
+            if keep_sorted:
+                self._list_term(term)
+        postings.add(relative_path)
+
+    def _remove(self, relative_path: str) -> None:
+        document = self._documents.pop(relative_path, None)
+        if document is None:
+            return
+        self._total_length -= document.length
+        index = bisect_left(self._paths, relative_path)
+        if index < len(self._paths) and self._paths[index] == relative_path:
+            del self._paths[index]
+        for term in document.lines:
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.discard(relative_path)
+            if not postings:
+                del self._postings[term]
+                self._unlist_term()
+
+    def _descendant_paths(self, relative_path: str) -> list[str]:
+        prefix = relative_path + "/"
+        start = bisect_left(self._paths, prefix)
+        end = start
+        while end < len(self._paths) and self._paths[end].startswith(prefix):
+            end += 1
+        return self._paths[start:end]
+
+    def _discard_subtree(self, relative_path: str) -> None:
+        for path in self._descendant_paths(relative_path):
+            self._remove(path)
+        self._remove(relative_path)
@@ -0,0 +1,259 @@
+"""Parallel, resumable bulk import of a local folder into the library.
+
+The source tree is walked once; hidden names and symbolic links are skipped
+as in the library itself, files with unsupported extensions are ignored, and
+every path component must pass the portable filename policy. Files are
+copied by a thread pool through ``LocalDocumentStorage.import_file``, which
+uses the same locks, quota reservation and staged atomic writes as uploads
+but leaves the derived indexes alone. The importer's storage adapter is not
+the API's, so refreshing its indexes would help nobody: a running API indexes
+the new files through its library watcher, and an API started later builds
+its indexes from the library anyway. The size ledger is invalidated once the
+import ends, so that with the file lock backend the workers of a running API
+measure the library again instead of trusting a count that predates it.
+
+Progress is appended to a checkpoint file as JSON lines. A rerun with the
+same checkpoint skips every file whose size and mtime are unchanged since it
+was recorded, so an interrupted import resumes where it stopped. Conflicts
+and failures are not recorded and are retried by the next run.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from collections import Counter
+from collections.abc import Callable, Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from markinote_api.modules.documents.errors import DocumentError
+from markinote_api.modules.documents.storage import LocalDocumentStorage
+from markinote_api.platform.files import allowed_file, safe_filename
+
+_MAX_REPORTED_ISSUES = 100
+_RECORDED_STATUSES = frozenset({"created", "replaced", "unchanged"})
+
+
+@dataclass(frozen=True, slots=True)
+class ImportItem:
+    """One source file and the library path it is imported to."""
+
+    source: Path
+    path: str
+    size: int
+    mtime_ns: int
+
+
+@dataclass(slots=True)
+class ImportReport:
+    """Running totals of one import; ``summary`` is JSON-friendly."""
+
+    started: float = field(default_factory=time.monotonic)
+    statuses: Counter[str] = field(default_factory=Counter)
+    bytes_copied: int = 0
+    issues: list[dict[str, str]] = field(default_factory=list)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def note(self, status: str, path: str, reason: str | None = None, *, copied: int = 0) -> None:
+        with self._lock:
+            self.statuses[status] += 1
+            self.bytes_copied += copied
+            if reason is not None and len(self.issues) < _MAX_REPORTED_ISSUES:
+                self.issues.append({"path": path, "status": status, "reason": reason})
+
+    def summary(self) -> dict[str, Any]:
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        with self._lock:
+            statuses = dict(sorted(self.statuses.items()))
+            copied = self.bytes_copied
+            issues = list(self.issues)
+        processed = sum(statuses.values())
+        return {
+            "statuses": statuses,
+            "processed": processed,
+            "bytes_copied": copied,
+            "seconds": round(elapsed, 3),
+            "files_per_second": round(processed / elapsed, 1),
+            "megabytes_per_second": round(copied / elapsed / 1_000_000, 2),
+            "issues": issues,
+        }
+
+
+class ImportCheckpoint:
+    """Append-only JSON-lines record of files that reached the library.
+
+    The first line names the source and target the checkpoint belongs to; a
+    checkpoint written for another import is refused rather than reused.
+    """
+
+    def __init__(self, path: str | os.PathLike[str], *, source: Path, target: str) -> None:
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._done: dict[str, tuple[int, int]] = {}
+        header = {"source": str(source), "target": target}
+        if self.path.exists():
+            self._load(header)
+        else:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._stream = open(self.path, "a", encoding="utf-8")  # noqa: SIM115
+        if not self._done and self._stream.tell() == 0:
+            self._write(header)
+
+    def __len__(self) -> int:
+        return len(self._done)
+
+    def _load(self, header: dict[str, str]) -> None:
+        with open(self.path, encoding="utf-8") as stream:
+            lines = stream.read().splitlines()
+        if lines and json.loads(lines[0]) != header:
+            raise ValueError("checkpoint belongs to another import")
+        for line in lines[1:]:
+            try:
+                record = json.loads(line)
+                self._done[record["path"]] = (int(record["size"]), int(record["mtime_ns"]))
+            except (ValueError, KeyError, TypeError):
+                # An interrupted run may leave a torn final line.
+                continue
+
+    def done(self, item: ImportItem) -> bool:
+        return self._done.get(item.path) == (item.size, item.mtime_ns)
+
+    def record(self, item: ImportItem) -> None:
+        with self._lock:
+            self._done[item.path] = (item.size, item.mtime_ns)
+            self._write({"path": item.path, "size": item.size, "mtime_ns": item.mtime_ns})
+
+    def _write(self, value: dict[str, Any]) -> None:
+        self._stream.write(json.dumps(value, ensure_ascii=False, separators=(",", ":")) + "\n")
+        self._stream.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            if not self._stream.closed:
+                os.fsync(self._stream.fileno())
+                self._stream.close()
+
+
+def plan_import(
+    source_root: Path,
+    target: str,
+    allowed_extensions: frozenset[str],
+    report: ImportReport,
+) -> Iterator[ImportItem]:
+    """Yield the importable files below ``source_root``, depth first.
+
+    Names are NFC-normalized by the filename policy; a folder whose name is
+    rejected is reported once and not descended into.
+    """
+    stack: list[tuple[Path, str]] = [(source_root, target)]
+    while stack:
+        directory, prefix = stack.pop()
+        try:
+            with os.scandir(directory) as iterator:
+                entries = sorted(iterator, key=lambda entry: entry.name, reverse=True)
+        except OSError as exc:
+            report.note("failed", prefix, type(exc).__name__)
+            continue
+        files: list[ImportItem] = []
+        for entry in entries:
+            if entry.name.startswith("."):
+                continue
+            try:
+                if entry.is_symlink():
+                    continue
+                is_directory = entry.is_dir(follow_symlinks=False)
+                if not is_directory and not entry.is_file(follow_symlinks=False):
+                    continue
+                if not is_directory and not allowed_file(entry.name, allowed_extensions):
+                    report.note("ignored", entry.name)
+                    continue
+                name = safe_filename(entry.name)
+                relative = f"{prefix}/{name}" if prefix else name
+                if is_directory:
+                    stack.append((Path(entry.path), relative))
+                else:
+                    stat_info = entry.stat(follow_symlinks=False)
+                    files.append(ImportItem(Path(entry.path), relative, stat_info.st_size, stat_info.st_mtime_ns))
+            except ValueError as exc:
+                report.note("rejected", f"{prefix}/{entry.name}" if prefix else entry.name, str(exc))
+            except OSError as exc:
+                report.note("failed", f"{prefix}/{entry.name}" if prefix else entry.name, type(exc).__name__)
+        yield from reversed(files)
+
+
+class LibraryImporter:
+    """Copy a planned import with a bounded number of files in flight.
+
+    ``run`` closes the checkpoint when it returns, including after a failure.
+    """
+
+    def __init__(
+        self,
+        storage: LocalDocumentStorage,
+        *,
+        workers: int = 8,
+        overwrite: bool = False,
+        checkpoint: ImportCheckpoint | None = None,
+        progress: Callable[[dict[str, Any]], None] | None = None,
+        progress_seconds: float = 5.0,
+    ) -> None:
+        self.storage = storage
+        self.workers = max(1, int(workers))
+        self.overwrite = overwrite
+        self.checkpoint = checkpoint
+        self.progress = progress
+        self.progress_seconds = progress_seconds
+
+    def run(self, source_root: str | os.PathLike[str], target: str = "") -> ImportReport:
+        source = Path(source_root).resolve()
+        if not source.is_dir():
+            raise NotADirectoryError(str(source))
+        report = ImportReport()
+        items = plan_import(source, target.strip("/"), self.storage.allowed_extensions, report)
+        last_progress = time.monotonic()
+        pending: set[Future[None]] = set()
+        try:
+            with ThreadPoolExecutor(self.workers, thread_name_prefix="markinote-import") as pool:
+                for item in items:
+                    if self.checkpoint is not None and self.checkpoint.done(item):
+                        report.note("resumed", item.path)
+                        continue
+                    if len(pending) >= self.workers * 4:
+                        completed, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in completed:
+                            future.result()
+                    pending.add(pool.submit(self._copy, item, report))
+                    if self.progress is not None and time.monotonic() - last_progress >= self.progress_seconds:
+                        last_progress = time.monotonic()
+                        self.progress(report.summary())
+                for future in pending:
+                    future.result()
+        finally:
+            if self.checkpoint is not None:
+                self.checkpoint.close()
+            self.storage.invalidate_library_size()
+        return report
+
+    def _copy(self, item: ImportItem, report: ImportReport) -> None:
+        try:
+            result = self.storage.import_file(item.path, item.source, overwrite=self.overwrite)
+        except DocumentError as exc:
+            report.note("failed", item.path, exc.code)
+            return
+        except OSError as exc:
+            report.note("failed", item.path, type(exc).__name__)
+            return
+        status = result["status"]
+        report.note(
+            status,
+            item.path,
+            "exists with different content" if status == "conflict" else None,
+            copied=result["size"] if status in {"created", "replaced"} else 0,
+        )
+        if status in _RECORDED_STATUSES and self.checkpoint is not None:
+            self.checkpoint.record(item)
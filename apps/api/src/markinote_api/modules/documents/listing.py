@@ -0,0 +1,210 @@
+"""Cached, sorted directory snapshots for paginated listings.
+
+A folder is scanned once into a snapshot keyed by the directory's stat
+identity; each requested sort order is materialized lazily as a sorted key
+array next to the snapshot. Pages are cut with keyset cursors: a cursor
+carries the sort key of the last item returned, so the next page starts with
+a binary search and stays stable when entries are added or removed between
+requests. Folders always precede files, as in the unpaginated listing.
+"""
+
+from __future__ import annotations
+
+import base64
+import binascii
+import json
+import os
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass, field
+from functools import total_ordering
+from typing import Any, Literal
+
+SortField = Literal["name", "modified", "size"]
+SortOrder = Literal["asc", "desc"]
+SORT_FIELDS: tuple[str, ...] = ("name", "modified", "size")
+
+
+@dataclass(frozen=True, slots=True)
+class ListedEntry:
+    """One visible child of a folder with the fields listings sort by."""
+
+    payload: dict[str, Any]
+    is_folder: bool
+    folded_name: str
+    modified_ns: int
+    size: int
+
+
+@total_ordering
+class _Descending:
+    """Invert the ordering of a wrapped value inside a sort key tuple."""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value: Any) -> None:
+        self.value = value
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, _Descending) and self.value == other.value
+
+    def __lt__(self, other: _Descending) -> bool:
+        return other.value < self.value
+
+    def __hash__(self) -> int:
+        return hash(self.value)
+
+
+def _primary(entry: ListedEntry, sort: str) -> Any:
+    if sort == "modified":
+        return entry.modified_ns
+    if sort == "size":
+        return entry.size
+    return entry.folded_name
+
+
+def _sort_key(
+    is_file: bool,
+    primary: Any,
+    folded_name: str,
+    name: str,
+    order: str,
+) -> tuple[Any, ...]:
+    if order == "desc":
+        return (is_file, _Descending(primary), _Descending(folded_name), _Descending(name))
+    return (is_file, primary, folded_name, name)
+
+
+def entry_sort_key(entry: ListedEntry, sort: str, order: str) -> tuple[Any, ...]:
+    return _sort_key(
+        not entry.is_folder,
+        _primary(entry, sort),
+        entry.folded_name,
+        entry.payload["name"],
+        order,
+    )
+
+
+class InvalidCursor(ValueError):
+    """A pagination cursor is malformed or belongs to another sort order."""
+
+
+def encode_cursor(entry: ListedEntry, sort: str, order: str) -> str:
+    state = [sort, order, not entry.is_folder, _primary(entry, sort), entry.folded_name,
+             entry.payload["name"]]
+    raw = json.dumps(state, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str, order: str) -> tuple[Any, ...]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        state = json.loads(raw.decode("utf-8"))
+    except (binascii.Error, UnicodeDecodeError, ValueError) as exc:
+        raise InvalidCursor("malformed cursor") from exc
+    if not isinstance(state, list) or len(state) != 6 or state[:2] != [sort, order]:
+        raise InvalidCursor("cursor does not match the requested order")
+    _, _, is_file, primary, folded_name, name = state
+    expected = str if sort == "name" else int
+    if (
+        not isinstance(is_file, bool)
+        or not isinstance(primary, expected)
+        or isinstance(primary, bool)
+        or not isinstance(folded_name, str)
+        or not isinstance(name, str)
+    ):
+        raise InvalidCursor("malformed cursor")
+    return _sort_key(is_file, primary, folded_name, name, order)
+
+
+@dataclass(slots=True)
+class _Snapshot:
+    identity: tuple[int, int, int]
+    entries: list[ListedEntry]
+    views: dict[tuple[str, str], tuple[list[ListedEntry], list[tuple[Any, ...]]]] = field(
+        default_factory=dict
+    )
+
+
+def directory_identity(stat_info: os.stat_result) -> tuple[int, int, int]:
+    return (stat_info.st_dev, stat_info.st_ino, stat_info.st_mtime_ns)
+
+
+class DirectoryListingCache:
+    """Bounded LRU of folder snapshots and their sorted views.
+
+    A snapshot is reused while the folder's device, inode and mtime are
+    unchanged, which covers entries being added, removed or renamed. Edits
+    to a child file do not touch the folder's mtime, so callers also
+    ``invalidate`` the parent whenever they learn that a child changed.
+    """
+
+    def __init__(self, max_directories: int = 256) -> None:
+        self.max_directories = max(1, int(max_directories))
+        self._lock = threading.Lock()
+        self._snapshots: OrderedDict[str, _Snapshot] = OrderedDict()
+
+    def view(
+        self,
+        directory: str,
+        identity: tuple[int, int, int],
+        scan: Callable[[], list[ListedEntry]],
+        sort: str,
+        order: str,
+    ) -> tuple[Sequence[ListedEntry], Sequence[tuple[Any, ...]]]:
+        """Return the entries of ``directory`` and their keys in sorted order."""
+        with self._lock:
+            snapshot = self._snapshots.get(directory)
+            if snapshot is not None and snapshot.identity == identity:
+                self._snapshots.move_to_end(directory)
+            else:
+                snapshot = None
+        if snapshot is None:
+            # Scanning runs outside the cache lock; the caller's shared path
+            # lock already keeps this adapter's writers out of the folder.
+            snapshot = _Snapshot(identity, scan())
+            with self._lock:
+                self._snapshots[directory] = snapshot
+                self._snapshots.move_to_end(directory)
+                while len(self._snapshots) > self.max_directories:
+                    self._snapshots.popitem(last=False)
+        with self._lock:
+            view = snapshot.views.get((sort, order))
+            if view is None:
+                entries = sorted(snapshot.entries, key=lambda entry: entry_sort_key(entry, sort, order))
+                view = snapshot.views[(sort, order)] = (
+                    entries,
+                    [entry_sort_key(entry, sort, order) for entry in entries],
+                )
+        return view
+
+    def invalidate(self, *directories: str) -> None:
+        with self._lock:
+            for directory in directories:
+                self._snapshots.pop(directory, None)
+
+    def invalidate_below(self, directory: str) -> None:
+        """Drop ``directory`` and every cached folder beneath it."""
+        prefix = f"{directory}/" if directory else ""
+        with self._lock:
+            for cached in [key for key in self._snapshots if key == directory or key.startswith(prefix)]:
+                del self._snapshots[cached]
+
+
+def page(
+    entries: Sequence[ListedEntry],
+    keys: Sequence[tuple[Any, ...]],
+    *,
+    sort: str,
+    order: str,
+    limit: int | None,
+    cursor: str | None,
+) -> tuple[Sequence[ListedEntry], str | None]:
+    """Cut one page out of a sorted view and return it with the next cursor."""
+    start = bisect_right(keys, decode_cursor(cursor, sort, order)) if cursor else 0
+    end = len(entries) if limit is None else min(len(entries), start + limit)
+    selected = entries[start:end]
+    next_cursor = encode_cursor(selected[-1], sort, order) if selected and end < len(entries) else None
+    return selected, next_cursor
@@ -1,22 +1,51 @@
 """Versioned document API backed by the shared DocumentService."""
 from __future__ import annotations
 
-from typing import Any, Literal
+import json
+from collections.abc import AsyncIterator
+from typing import Annotated, Any, Literal
 
 from fastapi import APIRouter, Depends, File, Form, Header, Query, Request, Response, UploadFile
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel, ConfigDict, Field
 
-from markinote_api.modules.documents.errors import DocumentCapacityExceeded, DocumentConflict
+from markinote_api.modules.documents.errors import DocumentConflict
 from markinote_api.modules.documents.service import DocumentService
+from markinote_api.modules.rendering.service import RENDERER_FINGERPRINT, render_document, rendered_document
+from markinote_api.modules.rendering.workers import RenderTimeout
+from markinote_api.platform.errors import Problem
+from markinote_api.platform.executor import BoundedIOExecutor
 from markinote_api.platform.metrics import DOCUMENT_CONFLICTS
 
 router = APIRouter(prefix="/api/v1/documents", tags=["documents"])
 
+_RAW_MEDIA_TYPES = {
+    "md": "text/markdown; charset=utf-8",
+    "markdown": "text/markdown; charset=utf-8",
+}
 
-def get_service(request: Request) -> DocumentService:
+
+# Async so that FastAPI resolves them on the event loop rather than in the
+# shared threadpool the document executor exists to avoid.
+async def get_service(request: Request) -> DocumentService:
     return request.app.state.document_service
 
 
+async def get_io(request: Request) -> BoundedIOExecutor:
+    return request.app.state.document_executor
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Apply RFC 9110 weak comparison for ``If-None-Match``."""
+    if not if_none_match:
+        return False
+    opaque = etag.removeprefix("W/")
+    return any(
+        candidate == "*" or candidate.removeprefix("W/") == opaque
+        for candidate in (value.strip() for value in if_none_match.split(","))
+    )
+
+
 class DocumentItem(BaseModel):
     model_config = ConfigDict(extra="allow")
     name: str
@@ -29,6 +58,8 @@ class DocumentItem(BaseModel):
 class DocumentList(BaseModel):
     items: list[DocumentItem]
     current_path: str
+    next_cursor: str | None = None
+    total: int = Field(ge=0)
 
 
 class DocumentSearchResponse(BaseModel):
@@ -38,6 +69,24 @@ class DocumentSearchResponse(BaseModel):
     truncated: bool
 
 
+class ContentSearchMatch(BaseModel):
+    line: int = Field(ge=1)
+    text: str
+
+
+class ContentSearchItem(DocumentItem):
+    score: float
+    match_count: int = Field(ge=0)
+    matches: list[ContentSearchMatch]
+
+
+class ContentSearchResponse(BaseModel):
+    items: list[ContentSearchItem]
+    query: str
+    total: int = Field(ge=0)
+    truncated: bool
+
+
 class DocumentContent(BaseModel):
     model_config = ConfigDict(extra="allow")
     path: str
@@ -48,6 +97,12 @@ class DocumentContent(BaseModel):
     version: str
 
 
+class RenderedDocument(BaseModel):
+    path: str
+    version: str
+    html: str
+
+
 class SaveDocument(BaseModel):
     content: str
     expected_version: str | None = Field(default=None, alias="expectedVersion")
@@ -78,6 +133,43 @@ class RestoreTrash(BaseModel):
     trash_id: str = Field(min_length=1, alias="trashId")
 
 
+class BatchCreateFolder(CreateFolder):
+    op: Literal["create_folder"]
+
+
+class BatchCreateFile(CreateFile):
+    op: Literal["create_file"]
+
+
+class BatchSave(SaveDocument):
+    op: Literal["save"]
+    path: str = Field(min_length=1)
+
+
+class BatchMove(MoveDocument):
+    op: Literal["move"]
+
+
+class BatchRename(RenameDocument):
+    op: Literal["rename"]
+
+
+class BatchDelete(BaseModel):
+    op: Literal["delete"]
+    path: str = Field(min_length=1)
+
+
+BatchOperation = Annotated[
+    BatchCreateFolder | BatchCreateFile | BatchSave | BatchMove | BatchRename | BatchDelete,
+    Field(discriminator="op"),
+]
+
+
+class BatchRequest(BaseModel):
+    operations: list[BatchOperation] = Field(min_length=1, max_length=500)
+    atomic: bool = False
+
+
 class SuccessResponse(BaseModel):
     success: Literal[True] = True
 
@@ -143,6 +235,26 @@ class FolderItem(BaseModel):
 
 class FolderListResponse(BaseModel):
     folders: list[FolderItem]
+    generation: int
+
+
+class BatchItemError(BaseModel):
+    code: str
+    message: str
+    details: dict[str, Any] = Field(default_factory=dict)
+
+
+class BatchItemResult(BaseModel):
+    index: int = Field(ge=0)
+    op: str
+    status: Literal["applied", "failed", "skipped", "rolled_back", "rollback_failed"]
+    result: dict[str, Any] | None = None
+    error: BatchItemError | None = None
+
+
+class BatchResponse(BaseModel):
+    committed: bool
+    results: list[BatchItemResult]
 
 
 class DocumentChangesResponse(BaseModel):
@@ -152,21 +264,77 @@ class DocumentChangesResponse(BaseModel):
 
 
 @router.get("", response_model=DocumentList)
-def list_documents(path: str = "", service: DocumentService = Depends(get_service)) -> DocumentList:
-    result = service.list(path)
+async def list_documents(
+    path: str = "",
+    sort: Literal["name", "modified", "size"] = "name",
+    order: Literal["asc", "desc"] = "asc",
+    limit: int | None = Query(default=None, ge=1, le=1000),
+    cursor: str | None = Query(default=None, min_length=1, max_length=2048),
+    service: DocumentService = Depends(get_service),
+    io: BoundedIOExecutor = Depends(get_io),
+) -> DocumentList:
+    result = await io.run(
+        "list", service.list, path, sort=sort, order=order, limit=limit, cursor=cursor
+    )
     return DocumentList(
         items=[DocumentItem.model_validate(item) for item in result["items"]],
         current_path=result["current_path"],
+        next_cursor=result["next_cursor"],
+        total=result["total"],
+    )
+
+
+@router.get(
+    "/entries",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"application/x-ndjson": {"schema": {"type": "string"}}}}},
+)
+async def stream_documents(
+    path: str = "",
+    sort: Literal["name", "modified", "size"] = "name",
+    order: Literal["asc", "desc"] = "asc",
+    limit: int | None = Query(default=None, ge=1, le=1000),
+    cursor: str | None = Query(default=None, min_length=1, max_length=2048),
+    service: DocumentService = Depends(get_service),
+    io: BoundedIOExecutor = Depends(get_io),
+) -> StreamingResponse:
+    """Stream one listing page as NDJSON, one ``DocumentItem`` per line.
+
+    The page's continuation cursor and the folder's entry count travel in the
+    ``X-Next-Cursor`` and ``X-Total-Count`` headers.
+    """
+    result = await io.run(
+        "list", service.list, path, sort=sort, order=order, limit=limit, cursor=cursor
     )
+    headers = {"X-Total-Count": str(result["total"])}
+    if result["next_cursor"]:
+        headers["X-Next-Cursor"] = result["next_cursor"]
+
+    async def lines() -> AsyncIterator[bytes]:
+        for item in result["items"]:
+            yield json.dumps(item, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers=headers)
 
 
-@router.get("/search", response_model=DocumentSearchResponse)
-def search_documents(
+@router.get("/search", response_model=DocumentSearchResponse | ContentSearchResponse)
+async def search_documents(
     q: str = Query(min_length=1, max_length=120),
     limit: int = Query(default=80, ge=1, le=200),
+    mode: Literal["name", "content"] = "name",
+    path: str = "",
     service: DocumentService = Depends(get_service),
-) -> DocumentSearchResponse:
-    result = service.search(q, limit=limit)
+    io: BoundedIOExecutor = Depends(get_io),
+) -> DocumentSearchResponse | ContentSearchResponse:
+    if mode == "content":
+        result = await io.run("search", service.search_content, q, path=path, limit=limit)
+        return ContentSearchResponse(
+            items=[ContentSearchItem.model_validate(item) for item in result["items"]],
+            query=result["query"],
+            total=result["total"],
+            truncated=result["truncated"],
+        )
+    result = await io.run("search", service.search, q, limit=limit)
     return DocumentSearchResponse(
         items=[DocumentItem.model_validate(item) for item in result["items"]],
         query=result["query"],
@@ -175,28 +343,119 @@ def search_documents(
     )
 
 
-@router.get("/content", response_model=DocumentContent)
-def read_document(
+_NOT_MODIFIED: dict[int | str, dict[str, Any]] = {304: {"description": "Document unchanged since the supplied ETag"}}
+_REVALIDATE = "private, no-cache"
+
+
+@router.get("/content", response_model=DocumentContent, responses=_NOT_MODIFIED)
+async def read_document(
     path: str,
     response: Response,
+    if_none_match: str | None = Header(default=None),
     service: DocumentService = Depends(get_service),
-) -> DocumentContent:
-    result = service.read(path)
-    response.headers["ETag"] = f'"{result["version"]}"'
+    io: BoundedIOExecutor = Depends(get_io),
+) -> Any:
+    if if_none_match:
+        # Revalidation only needs the cached, stat-keyed version.
+        etag = f'"{(await io.run("read", service.describe, path))["version"]}"'
+        if _etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag, "Cache-Control": _REVALIDATE})
+    result = await io.run("read", service.read, path)
+    response.headers.update({"ETag": f'"{result["version"]}"', "Cache-Control": _REVALIDATE})
     return DocumentContent.model_validate(result)
 
 
+@router.get(
+    "/content/raw",
+    response_class=FileResponse,
+    responses={
+        200: {"content": {"text/markdown": {"schema": {"type": "string"}}}},
+        **_NOT_MODIFIED,
+    },
+)
+async def read_raw_document(
+    path: str,
+    if_none_match: str | None = Header(default=None),
+    service: DocumentService = Depends(get_service),
+    io: BoundedIOExecutor = Depends(get_io),
+) -> Response:
+    result = await io.run("read", service.describe, path)
+    headers = {"ETag": f'"{result["version"]}"', "Cache-Control": _REVALIDATE}
+    if _etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    # Saves replace files atomically, so the body sent from the path is always
+    # one complete version. A save landing after the lookup only makes the
+    # ETag older than the body, and the next revalidation refetches it.
+    return FileResponse(
+        result["location"],
+        headers=headers,
+        media_type=_RAW_MEDIA_TYPES.get(
+            result["filename"].rsplit(".", 1)[-1].lower(), "text/plain; charset=utf-8"
+        ),
+    )
+
+
+def _rendered_etag(version: str) -> str:
+    # A renderer upgrade changes the HTML of an unchanged document.
+    return f'"{version}-{RENDERER_FINGERPRINT[:12]}"'
+
+
+@router.get("/rendered", response_model=RenderedDocument, responses=_NOT_MODIFIED)
+async def read_rendered_document(
+    path: str,
+    request: Request,
+    response: Response,
+    if_none_match: str | None = Header(default=None),
+    service: DocumentService = Depends(get_service),
+    io: BoundedIOExecutor = Depends(get_io),
+) -> Any:
+    description = await io.run("read", service.describe, path)
+    version = description["version"]
+    if _etag_matches(if_none_match, _rendered_etag(version)):
+        return Response(
+            status_code=304, headers={"ETag": _rendered_etag(version), "Cache-Control": _REVALIDATE}
+        )
+    # Saves render in the background; a miss renders the stored content now.
+    html = await io.run("read", rendered_document, version)
+    if html is None:
+        document = await io.run("read", service.read, path)
+        if document["size"] > request.app.state.settings.max_preview_bytes:
+            raise Problem(
+                413,
+                "document_too_large",
+                "Document too large",
+                "The document exceeds the configured preview limit.",
+            )
+        version = document["version"]
+        try:
+            html = await io.run(
+                "render", render_document, version, document["content"], pool=request.app.state.render_pool
+            )
+        except RenderTimeout:
+            raise Problem(
+                503,
+                "render_timeout",
+                "Preview timed out",
+                "The document took longer than the configured render timeout.",
+            ) from None
+    response.headers.update({"ETag": _rendered_etag(version), "Cache-Control": _REVALIDATE})
+    return RenderedDocument(path=description["path"], version=version, html=html)
+
+
 @router.put("/content", response_model=StoredDocumentResponse)
-def save_document(
+async def save_document(
     path: str,
     body: SaveDocument,
     response: Response,
     if_match: str | None = Header(default=None),
     service: DocumentService = Depends(get_service),
+    io: BoundedIOExecutor = Depends(get_io),
 ) -> dict[str, Any]:
     expected = if_match or body.expected_version
     try:
-        result = service.save(path, body.content, expected_version=expected)
+        result = await io.run(
+            "write", service.save, path, body.content, expected_version=expected, coalesce=True
+        )
     except DocumentConflict:
         DOCUMENT_CONFLICTS.labels("v1").inc()
         raise
@@ -205,81 +464,115 @@ def save_document(
 
 
 @router.post("/folders", response_model=CreatedFolderResponse)
-def create_folder(
+async def create_folder(
     body: CreateFolder,
     service: DocumentService = Depends(get_service),
+    io: BoundedIOExecutor = Depends(get_io),
 ) -> dict[str, Any]:
-    return {"success": True, **service.create_folder(body.path, body.name)}
+    return {"success": True, **await io.run("write", service.create_folder, body.path, body.name)}
 
 
 @router.post("/files", response_model=CreatedFileResponse)
-def create_file(
+async def create_file(
     body: CreateFile,
     service: DocumentService = Depends(get_service),
+    io: BoundedIOExecutor = Depends(get_io),
 ) -> dict[str, Any]:
-    return {"success": True, **service.create_file(body.path, body.name, body.content)}
+    return {"success": True, **await io.run("write", service.create_file, body.path, body.name, body.content)}
 
 
 @router.post("/upload", response_model=StoredDocumentResponse)
 async def upload_document(
-    request: Request,
     path: str = Form(default=""),
     file: UploadFile = File(...),
     service: DocumentService = Depends(get_service),
+    io: BoundedIOExecutor = Depends(get_io),
 ) -> dict[str, Any]:
-    limit = request.app.state.settings.max_document_bytes
-    content = await file.read(limit + 1)
-    if len(content) > limit:
-        raise DocumentCapacityExceeded("The uploaded document exceeds the configured size limit.")
-    return {"success": True, **service.upload(path, file.filename or "", content)}
+    # Starlette has already spooled the part to a temporary file; storage
+    # streams it from there instead of materializing it as one bytes object.
+    result = await io.run("write", service.upload, path, file.filename or "", file.file)
+    return {"success": True, **result}
 
 
 @router.post("/move", response_model=MovedDocumentResponse)
-def move_document(
+async def move_document(
     body: MoveDocument,
     service: DocumentService = Depends(get_service),
+    io: BoundedIOExecutor = Depends(get_io),
 ) -> dict[str, Any]:
-    return {"success": True, **service.move(body.source, body.target)}
+    return {"success": True, **await io.run("write", service.move, body.source, body.target)}
 
 
 @router.post("/rename", response_model=RenamedDocumentResponse)
-def rename_document(
+async def rename_document(
     body: RenameDocument,
     service: DocumentService = Depends(get_service),
+    io: BoundedIOExecutor = Depends(get_io),
+) -> dict[str, Any]:
+    return {"success": True, **await io.run("write", service.rename, body.old_path, body.new_name)}
+
+
+@router.post("/batch", response_model=BatchResponse)
+async def batch_documents(
+    body: BatchRequest,
+    service: DocumentService = Depends(get_service),
+    io: BoundedIOExecutor = Depends(get_io),
 ) -> dict[str, Any]:
-    return {"success": True, **service.rename(body.old_path, body.new_name)}
+    operations = [operation.model_dump() for operation in body.operations]
+    return await io.run("write", service.batch, operations, atomic=body.atomic)
 
 
 @router.delete("", response_model=DeletedDocumentResponse)
-def delete_document(
+async def delete_document(
     path: str,
     service: DocumentService = Depends(get_service),
+    io: BoundedIOExecutor = Depends(get_io),
 ) -> dict[str, Any]:
-    return {"success": True, **service.delete(path)}
+    return {"success": True, **await io.run("write", service.delete, path)}
 
 
-@router.get("/folders", response_model=FolderListResponse)
-def list_folders(service: DocumentService = Depends(get_service)) -> dict[str, Any]:
-    return service.folders()
+@router.get(
+    "/folders",
+    response_model=FolderListResponse,
+    responses={304: {"description": "Folder tree unchanged since the supplied ETag"}},
+)
+async def list_folders(
+    response: Response,
+    if_none_match: str | None = Header(default=None),
+    service: DocumentService = Depends(get_service),
+    io: BoundedIOExecutor = Depends(get_io),
+) -> Any:
+    result = await io.run("list", service.folders)
+    # Browsers may keep the tree but must revalidate it; the API default is no-store.
+    headers = {"ETag": f'"folders-{result["generation"]}"', "Cache-Control": "private, no-cache"}
+    if _etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return result
 
 
 @router.get("/changes", response_model=DocumentChangesResponse)
-def check_changes(
+async def check_changes(
     path: str = "",
     file: str = "",
     service: DocumentService = Depends(get_service),
+    io: BoundedIOExecutor = Depends(get_io),
 ) -> dict[str, Any]:
-    return service.check_updates(path, file)
+    return await io.run("list", service.check_updates, path, file)
 
 
 @router.get("/trash", response_model=TrashListResponse)
-def list_trash(service: DocumentService = Depends(get_service)) -> dict[str, Any]:
-    return service.list_trash()
+async def list_trash(
+    service: DocumentService = Depends(get_service),
+    io: BoundedIOExecutor = Depends(get_io),
+) -> dict[str, Any]:
+    return await io.run("list", service.list_trash)
 
 
 @router.post("/trash/restore", response_model=RestoredDocumentResponse)
-def restore_trash(
+async def restore_trash(
     body: RestoreTrash,
     service: DocumentService = Depends(get_service),
+    io: BoundedIOExecutor = Depends(get_io),
 ) -> dict[str, Any]:
-    return {"success": True, **service.restore(body.trash_id)}
+    return {"success": True, **await io.run("write", service.restore, body.trash_id)}
@@ -0,0 +1,241 @@
+"""Server-side coalescing of rapid successive saves of one document.
+
+Editor autosave can send several full-document saves per second. The first
+save of a document is written immediately; saves arriving within ``window``
+seconds of that write are acknowledged with the version of their content
+and held, each replacing the previous one, and only the newest is written
+when the window ends. The write delay is therefore bounded by the window no
+matter how long the user keeps typing.
+
+Optimistic concurrency stays exact: a save is held only while the document
+on disk still has the version the coalescer last wrote, and it must name the
+version most recently acknowledged for the path, otherwise it is rejected
+with the same conflict a direct save would raise. When the document changed
+behind the coalescer's back, the save is written directly and checked
+against the disk. A held save overtaken by such a change is dropped and
+logged; its client's next save then conflicts with the on-disk version.
+
+``flush`` writes what is held; the service calls it before reading or
+changing document contents so that reads, moves and deletes never act on
+stale content, agent tools call it before taking their locks, and the
+application calls it on shutdown.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any
+
+from markinote_api.modules.documents.errors import DocumentCapacityExceeded, DocumentConflict, DocumentError
+from markinote_api.modules.documents.storage import LocalDocumentStorage
+from markinote_api.platform.io import content_version
+from markinote_api.platform.metrics import DOCUMENT_SAVES
+from markinote_api.platform.paths import PathValidationError, normalize_relative_path
+
+LOGGER = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class _Slot:
+    filename: str
+    # Version on disk as last written by the coalescer.
+    written_version: str
+    written_at: float
+    # Newest acknowledged version, held or written.
+    version: str
+    content: bytes | None = None
+    deadline: float | None = None
+    writing: bool = False
+
+
+class SaveCoalescer:
+    def __init__(self, storage: LocalDocumentStorage, window: float) -> None:
+        self.storage = storage
+        self.window = max(0.0, float(window))
+        self._condition = threading.Condition()
+        self._slots: dict[str, _Slot] = {}
+        self._thread: threading.Thread | None = None
+        self._closed = False
+
+    def save(self, path: str, content: bytes, *, expected_version: str | None) -> dict[str, Any]:
+        """Write or hold one save of ``path`` and return its acknowledgement."""
+        try:
+            key = normalize_relative_path(path, allow_empty=False)
+        except PathValidationError:
+            key = None
+        if key is None or not self.window or self._closed:
+            return self._write_now(path, content, expected_version)
+        for _ in range(3):
+            with self._condition:
+                self._wait_idle(key)
+                slot = self._live_slot(key)
+                if slot is None:
+                    break
+                written_version = slot.written_version
+            # ``describe`` takes the path lock, which an agent tool may hold
+            # while it flushes this coalescer: read the disk version unlocked
+            # and check afterwards that the slot did not move meanwhile.
+            try:
+                current = self.storage.describe(key)["version"]
+            except DocumentError:
+                current = None
+            with self._condition:
+                self._wait_idle(key)
+                if self._live_slot(key) is not slot or slot.written_version != written_version:
+                    continue
+                held = self._hold(key, slot, current, content, expected_version)
+                if held is not None:
+                    return held
+                break
+        return self._write_now(path, content, expected_version)
+
+    def _live_slot(self, path: str) -> _Slot | None:
+        """Return ``path``'s slot, forgetting it once its window passed with nothing held."""
+        slot = self._slots.get(path)
+        if slot is not None and slot.content is None and time.monotonic() - slot.written_at >= self.window:
+            del self._slots[path]
+            return None
+        return slot
+
+    def _hold(
+        self, path: str, slot: _Slot, current: str | None, content: bytes, expected_version: str | None
+    ) -> dict[str, Any] | None:
+        """Hold ``content`` in ``slot``, or return ``None`` to write it directly.
+
+        ``current`` is the version on disk, read without the condition held.
+        """
+        if current != slot.written_version:
+            # Changed behind the coalescer's back: the direct save checks the
+            # client's version against the disk, and a held save is lost.
+            if slot.content is not None:
+                DOCUMENT_SAVES.labels(outcome="dropped").inc()
+                LOGGER.warning("coalesced document save dropped", extra={"document_version": slot.version})
+            del self._slots[path]
+            return None
+        if expected_version is not None and self.storage.normalize_version(expected_version) != slot.version:
+            raise DocumentConflict("文件已被其他操作修改，请刷新后重试", details={"current_version": slot.version})
+        if len(content) > self.storage.max_document_bytes:
+            raise DocumentCapacityExceeded("文件内容过大", details={"max_bytes": self.storage.max_document_bytes})
+        if slot.content is not None:
+            DOCUMENT_SAVES.labels(outcome="superseded").inc()
+        slot.content = content
+        slot.version = content_version(content)
+        if slot.deadline is None:
+            slot.deadline = slot.written_at + self.window
+            self._ensure_thread()
+            self._condition.notify_all()
+        DOCUMENT_SAVES.labels(outcome="held").inc()
+        return {"path": path, "filename": slot.filename, "size": len(content), "version": slot.version}
+
+    def _write_now(self, path: str, content: bytes, expected_version: str | None) -> dict[str, Any]:
+        result = self.storage.save(path, content, expected_version=expected_version)
+        DOCUMENT_SAVES.labels(outcome="written").inc()
+        if self.window and not self._closed:
+            with self._condition:
+                now = time.monotonic()
+                for idle in [
+                    key for key, slot in self._slots.items()
+                    if slot.content is None and not slot.writing and now - slot.written_at >= self.window
+                ]:
+                    del self._slots[idle]
+                existing = self._slots.get(result["path"])
+                # A save held meanwhile by a concurrent request keeps its slot;
+                # its base version no longer matches, so it will conflict.
+                if existing is None or existing.content is None:
+                    self._slots[result["path"]] = _Slot(
+                        filename=result["filename"],
+                        written_version=result["version"],
+                        written_at=now,
+                        version=result["version"],
+                    )
+        return result
+
+    def _wait_idle(self, path: str) -> None:
+        while (slot := self._slots.get(path)) is not None and slot.writing:
+            self._condition.wait()
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="markinote-save-coalescer", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        with self._condition:
+            while not self._closed:
+                deadlines = [slot.deadline for slot in self._slots.values() if slot.deadline is not None]
+                if not deadlines:
+                    self._condition.wait()
+                    continue
+                delay = min(deadlines) - time.monotonic()
+                if delay > 0:
+                    self._condition.wait(delay)
+                    continue
+                now = time.monotonic()
+                for path, slot in list(self._slots.items()):
+                    if slot.deadline is not None and slot.deadline <= now and not slot.writing:
+                        self._write_held(path, slot)
+
+    def _write_held(self, path: str, slot: _Slot) -> None:
+        """Write ``slot``'s held content; call with the condition held."""
+        content, slot.content, slot.deadline = slot.content, None, None
+        if content is None:
+            return
+        slot.writing = True
+        self._condition.release()
+        try:
+            result = self.storage.save(path, content, expected_version=slot.written_version)
+        except DocumentError as exc:
+            result = None
+            LOGGER.warning(
+                "coalesced document save dropped",
+                extra={"error_code": exc.code, "document_version": slot.version},
+            )
+        finally:
+            self._condition.acquire()
+            slot.writing = False
+            self._condition.notify_all()
+        if result is None:
+            DOCUMENT_SAVES.labels(outcome="dropped").inc()
+            self._slots.pop(path, None)
+            return
+        DOCUMENT_SAVES.labels(outcome="written").inc()
+        slot.written_version = result["version"]
+        slot.written_at = time.monotonic()
+
+    def flush(self, *paths: str, wait: bool = True) -> None:
+        """Write the saves held at or below ``paths``, or all of them.
+
+        With ``wait`` the call also waits for writes the committer already
+        started. Callers holding library path locks pass ``wait=False`` and
+        only their own locked paths: the committer may be blocked on exactly
+        those locks, while the held saves written here reuse them.
+        """
+        prefixes: list[str] = []
+        for path in paths:
+            try:
+                prefixes.append(normalize_relative_path(path))
+            except PathValidationError:
+                continue
+        if paths and not prefixes:
+            return
+        with self._condition:
+            for key in list(self._slots):
+                if prefixes and not any(
+                    not prefix or key == prefix or key.startswith(f"{prefix}/") for prefix in prefixes
+                ):
+                    continue
+                if wait:
+                    self._wait_idle(key)
+                slot = self._slots.get(key)
+                if slot is not None and slot.content is not None and not slot.writing:
+                    self._write_held(key, slot)
+
+    def close(self) -> None:
+        self.flush()
+        with self._condition:
+            self._closed = True
+            self._slots.clear()
+            self._condition.notify_all()
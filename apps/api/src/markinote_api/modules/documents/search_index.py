@@ -0,0 +1,292 @@
+"""Incrementally maintained name and path index for library search.
+
+The index mirrors the visible library tree: non-hidden folders and documents
+with an allowed extension, never following symbolic links. Names are stored
+NFC-normalized and casefolded, and every normalized name is decomposed into
+end-padded trigrams. A substring query of three or more characters intersects
+trigram postings; a shorter query is a prefix range over the sorted trigram
+keys. Ancestor matches expand through a sorted path list, so a query costs
+O(log N + matches) instead of a full library walk.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+from collections.abc import Iterator
+from dataclasses import dataclass
+from pathlib import Path, PurePosixPath
+
+from markinote_api.platform.files import allowed_file
+
+_GRAM = 3
+_PAD = "\x00" * (_GRAM - 1)
+
+
+def normalize_search_text(value: str) -> str:
+    return unicodedata.normalize("NFC", value).casefold()
+
+
+@dataclass(frozen=True, slots=True)
+class IndexedEntry:
+    """One visible library entry with its precomputed ranking fields."""
+
+    path: str
+    name: str
+    is_folder: bool
+    normalized_name: str
+    normalized_path: str
+    stem: str
+    depth: int
+
+
+def _grams(normalized_name: str) -> set[str]:
+    padded = normalized_name + _PAD
+    return {padded[index:index + _GRAM] for index in range(len(normalized_name))}
+
+
+def walk_visible(
+    directory: Path,
+    prefix: str,
+    allowed_extensions: frozenset[str],
+) -> Iterator[tuple[str, bool]]:
+    """Yield ``(relative_path, is_folder)`` for the visible tree below ``directory``.
+
+    Hidden names and symbolic links are skipped and never descended into;
+    files are reported only when their extension is allowed.
+    """
+    stack: list[tuple[Path, str]] = [(directory, prefix)]
+    while stack:
+        current, current_prefix = stack.pop()
+        try:
+            entries = os.scandir(current)
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue
+                try:
+                    if entry.is_symlink():
+                        continue
+                    is_directory = entry.is_dir(follow_symlinks=False)
+                    is_document = not is_directory and entry.is_file(follow_symlinks=False) and allowed_file(
+                        entry.name, allowed_extensions
+                    )
+                except OSError:
+                    continue
+                relative = f"{current_prefix}/{entry.name}" if current_prefix else entry.name
+                if is_directory:
+                    yield relative, True
+                    stack.append((Path(entry.path), relative))
+                elif is_document:
+                    yield relative, False
+
+
+class LibrarySearchIndex:
+    """Thread-safe in-memory index over one library root.
+
+    Callers report mutations by relative path through :meth:`refresh`; the
+    index re-reads only that subtree from disk. The first query builds the
+    index lazily when no startup rebuild has run yet.
+    """
+
+    def __init__(self, root: Path, allowed_extensions: frozenset[str]) -> None:
+        self.root = root
+        self.allowed_extensions = allowed_extensions
+        self._lock = threading.RLock()
+        self._built = False
+        self._entries: dict[str, IndexedEntry] = {}
+        self._paths: list[str] = []
+        self._postings: dict[str, set[str]] = {}
+        self._gram_keys: list[str] = []
+
+    @property
+    def built(self) -> bool:
+        return self._built
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def rebuild(self) -> int:
+        """Replace the index with a cold walk of the whole library."""
+        with self._lock:
+            self._entries.clear()
+            self._paths.clear()
+            self._postings.clear()
+            self._gram_keys.clear()
+            for relative, is_folder in walk_visible(self.root, "", self.allowed_extensions):
+                self._add(relative, is_folder, keep_sorted=False)
+            self._paths.sort()
+            self._gram_keys.sort()
+            self._built = True
+            return len(self._entries)
+
+    def ensure_built(self) -> None:
+        if not self._built:
+            with self._lock:
+                if not self._built:
+                    self.rebuild()
+
+    def invalidate(self) -> None:
+        """Drop all state; the next query performs a cold rebuild."""
+        with self._lock:
+            self._built = False
+            self._entries.clear()
+            self._paths.clear()
+            self._postings.clear()
+            self._gram_keys.clear()
+
+    def refresh(self, relative_path: str) -> None:
+        """Resynchronize one subtree after it was created, changed, or removed."""
+        with self._lock:
+            if not self._built:
+                return
+            if not relative_path:
+                self.rebuild()
+                return
+            self._discard_subtree(relative_path)
+            parts = relative_path.split("/")
+            if any(part.startswith(".") for part in parts):
+                return
+            # Parents may have been created implicitly, e.g. by folder upload.
+            for depth in range(1, len(parts)):
+                ancestor = "/".join(parts[:depth])
+                if ancestor in self._entries:
+                    continue
+                if not self._is_visible_folder(self.root / ancestor):
+                    return
+                self._add(ancestor, True)
+            candidate = self.root / relative_path
+            try:
+                if candidate.is_symlink():
+                    return
+                if candidate.is_dir():
+                    self._add(relative_path, True)
+                    # Appended and sorted once: Timsort keeps the sorted
+                    # remainder as one run, so a large subtree is not
+                    # inserted one bisection and list shift at a time.
+                    for relative, is_folder in walk_visible(candidate, relative_path, self.allowed_extensions):
+                        self._add(relative, is_folder, keep_sorted=False)
+                    self._paths.sort()
+                    self._gram_keys.sort()
+                elif candidate.is_file() and allowed_file(candidate.name, self.allowed_extensions):
+                    self._add(relative_path, False)
+            except OSError:
+                return
+
+    def discard(self, relative_path: str) -> None:
+        with self._lock:
+            if self._built:
+                self._discard_subtree(relative_path)
+
+    def match(self, needle: str) -> list[IndexedEntry]:
+        """Return every entry whose normalized relative path contains ``needle``."""
+        if not needle or "\x00" in needle:
+            return []
+        self.ensure_built()
+        with self._lock:
+            if "/" not in needle:
+                return self._expand(self._name_matches(needle), needle)
+            pieces = [piece for piece in needle.split("/") if piece]
+            if not pieces:
+                return list(self._entries.values())
+            # Any match contains the longest slash-free piece inside one path
+            # component: the entry's own name or one of its ancestors' names.
+            anchor = max(pieces, key=len)
+            return self._expand(self._name_matches(anchor), needle)
+
+    def _name_matches(self, needle: str) -> set[str]:
+        if len(needle) >= _GRAM:
+            postings = sorted(
+                (self._postings.get(needle[index:index + _GRAM], set()) for index in range(len(needle) - _GRAM + 1)),
+                key=len,
+            )
+            candidates = set(postings[0]).intersection(*postings[1:]) if postings else set()
+            return {path for path in candidates if needle in self._entries[path].normalized_name}
+        matches: set[str] = set()
+        index = bisect_left(self._gram_keys, needle)
+        while index < len(self._gram_keys) and self._gram_keys[index].startswith(needle):
+            matches.update(self._postings[self._gram_keys[index]])
+            index += 1
+        return matches
+
+    def _expand(self, name_matches: set[str], needle: str) -> list[IndexedEntry]:
+        seen: set[str] = set()
+        results: list[IndexedEntry] = []
+        for path in name_matches:
+            entry = self._entries[path]
+            for candidate in (entry, *self._descendants(path)) if entry.is_folder else (entry,):
+                if candidate.path in seen or needle not in candidate.normalized_path:
+                    continue
+                seen.add(candidate.path)
+                results.append(candidate)
+        return results
+
+    def _descendants(self, relative_path: str) -> Iterator[IndexedEntry]:
+        prefix = relative_path + "/"
+        index = bisect_left(self._paths, prefix)
+        while index < len(self._paths) and self._paths[index].startswith(prefix):
+            yield self._entries[self._paths[index]]
+            index += 1
+
+    def _add(self, relative_path: str, is_folder: bool, *, keep_sorted: bool = True) -> None:
+        if relative_path in self._entries:
+            return
+        name = PurePosixPath(relative_path).name
+        normalized_name = normalize_search_text(name)
+        entry = IndexedEntry(
+            path=relative_path,
+            name=name,
+            is_folder=is_folder,
+            normalized_name=normalized_name,
+            normalized_path=normalize_search_text(relative_path),
+            stem=Path(name).stem.casefold(),
+            depth=relative_path.count("/"),
+        )
+        self._entries[relative_path] = entry
+        if keep_sorted:
+            insort(self._paths, relative_path)
+        else:
+            self._paths.append(relative_path)
+        for gram in _grams(normalized_name):
+            postings = self._postings.get(gram)
+            if postings is None:
+                postings = self._postings[gram] = set()
+                if keep_sorted:
+                    insort(self._gram_keys, gram)
+                else:
+                    self._gram_keys.append(gram)
+            postings.add(relative_path)
+
+    def _remove(self, relative_path: str) -> None:
+        entry = self._entries.pop(relative_path, None)
+        if entry is None:
+            return
+        index = bisect_left(self._paths, relative_path)
+        if index < len(self._paths) and self._paths[index] == relative_path:
+            del self._paths[index]
+        for gram in _grams(entry.normalized_name):
+            postings = self._postings.get(gram)
+            if postings is None:
+                continue
+            postings.discard(relative_path)
+            if not postings:
+                del self._postings[gram]
+                key_index = bisect_left(self._gram_keys, gram)
+                if key_index < len(self._gram_keys) and self._gram_keys[key_index] == gram:
+                    del self._gram_keys[key_index]
+
+    def _discard_subtree(self, relative_path: str) -> None:
+        for entry in list(self._descendants(relative_path)):
+            self._remove(entry.path)
+        self._remove(relative_path)
+
+    @staticmethod
+    def _is_visible_folder(path: Path) -> bool:
+        try:
+            return path.is_dir() and not path.is_symlink()
+        except OSError:
+            return False
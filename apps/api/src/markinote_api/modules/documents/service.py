@@ -2,17 +2,44 @@
 
 from __future__ import annotations
 
-from typing import Any
+from collections.abc import Callable
+from typing import Any, BinaryIO
 
-from .errors import DocumentValidationError
+from .errors import DocumentConflict, DocumentValidationError
+from .save_coalescer import SaveCoalescer
 from .storage import LocalDocumentStorage
 
 
 class DocumentService:
-    """Application facade with JSON-friendly transport-neutral results."""
+    """Application facade with JSON-friendly transport-neutral results.
 
-    def __init__(self, storage: LocalDocumentStorage):
+    Saves made with ``coalesce`` may be held for ``save_coalesce_seconds``.
+    Reads write everything held first. Mutations write the held saves of
+    the paths they touch without waiting for the committer, because agent
+    tools call them while holding those paths' locks. ``close`` writes
+    whatever is still held.
+
+    ``on_saved`` is called with the version of the content stored by
+    ``save``, ``create_file`` and ``upload`` and a callable returning that
+    content as text, which may raise ``DocumentError`` once it is gone.
+    """
+
+    def __init__(
+        self,
+        storage: LocalDocumentStorage,
+        *,
+        save_coalesce_seconds: float = 0.0,
+        on_saved: Callable[[str, Callable[[], str]], None] | None = None,
+    ):
         self.storage = storage
+        self._saves = SaveCoalescer(storage, save_coalesce_seconds)
+        self._on_saved = on_saved
+
+    def flush_saves(self) -> None:
+        self._saves.flush()
+
+    def close(self) -> None:
+        self._saves.close()
 
     @staticmethod
     def _text(value: Any, field: str, *, allow_empty: bool = True) -> str:
@@ -22,9 +49,22 @@ class DocumentService:
             raise DocumentValidationError(f"{field} 不能为空")
         return value
 
-    def list(self, path: str = "") -> dict[str, Any]:
-        items, normalized = self.storage.list_directory(self._text(path, "path"))
-        return {"items": items, "current_path": normalized}
+    def list(
+        self,
+        path: str = "",
+        *,
+        sort: str = "name",
+        order: str = "asc",
+        limit: int | None = None,
+        cursor: str | None = None,
+    ) -> dict[str, Any]:
+        return self.storage.list_directory(
+            self._text(path, "path"),
+            sort=sort,
+            order=order,
+            limit=None if limit is None else max(1, min(int(limit), 1000)),
+            cursor=None if cursor is None else self._text(cursor, "cursor", allow_empty=False),
+        )
 
     def search(self, query: str, *, limit: int = 80) -> dict[str, Any]:
         clean_query = self._text(query, "query", allow_empty=False).strip()
@@ -32,25 +72,50 @@ class DocumentService:
             raise DocumentValidationError("搜索关键词不能为空")
         return self.storage.search(clean_query, limit=max(1, min(int(limit), 200)))
 
+    def search_content(self, query: str, *, path: str = "", limit: int = 20) -> dict[str, Any]:
+        clean_query = self._text(query, "query", allow_empty=False).strip()
+        if not clean_query:
+            raise DocumentValidationError("搜索关键词不能为空")
+        self._saves.flush()
+        return self.storage.search_content(
+            clean_query,
+            path=self._text(path, "path"),
+            limit=max(1, min(int(limit), 200)),
+        )
+
     def read(self, path: str) -> dict[str, Any]:
+        self._saves.flush()
         return self.storage.read(self._text(path, "path", allow_empty=False))
 
+    def describe(self, path: str) -> dict[str, Any]:
+        self._saves.flush()
+        return self.storage.describe(self._text(path, "path", allow_empty=False))
+
     def save(
         self,
         path: str,
         content: str,
         *,
         expected_version: str | None = None,
+        coalesce: bool = False,
     ) -> dict[str, Any]:
         clean_path = self._text(path, "path", allow_empty=False)
         clean_content = self._text(content, "content")
         if expected_version is not None:
             expected_version = self._text(expected_version, "expected_version", allow_empty=False)
-        return self.storage.save(
-            clean_path,
-            clean_content.encode("utf-8"),
-            expected_version=expected_version,
-        )
+        if coalesce:
+            result = self._saves.save(
+                clean_path, clean_content.encode("utf-8"), expected_version=expected_version
+            )
+        else:
+            self._saves.flush(clean_path, wait=False)
+            result = self.storage.save(
+                clean_path,
+                clean_content.encode("utf-8"),
+                expected_version=expected_version,
+            )
+        self._saved(result, lambda: clean_content)
+        return result
 
     def create_folder(self, path: str, name: str) -> dict[str, Any]:
         return self.storage.create_folder(
@@ -63,50 +128,131 @@ class DocumentService:
         if content is None:
             content = f"# {clean_name.rsplit('.', 1)[0]}\n\n"
         clean_content = self._text(content, "content")
-        return self.storage.create_file(
+        result = self.storage.create_file(
             self._text(path, "path"), clean_name, clean_content.encode("utf-8")
         )
+        self._saved(result, lambda: clean_content)
+        return result
 
-    def upload(self, path: str, filename: str, content: bytes) -> dict[str, Any]:
-        if not isinstance(content, bytes):
+    def upload(self, path: str, filename: str, content: bytes | BinaryIO) -> dict[str, Any]:
+        if not isinstance(content, bytes) and not callable(getattr(content, "read", None)):
             raise DocumentValidationError("上传内容必须为字节数据")
-        return self.storage.upload(
+        result = self.storage.upload(
             self._text(path, "path"),
             self._text(filename, "filename", allow_empty=False),
             content,
         )
+        # A streamed upload is read back from the library when it is rendered.
+        self._saved(result, lambda: self._stored_text(result["path"], result["version"]))
+        return result
+
+    def _saved(self, result: dict[str, Any], load: Callable[[], str]) -> None:
+        if self._on_saved is not None and result.get("version"):
+            self._on_saved(result["version"], load)
+
+    def _stored_text(self, path: str, version: str) -> str:
+        stored = self.storage.read(path)
+        if stored["version"] != version:
+            raise DocumentConflict("文件已被其他操作修改", details={"current_version": stored["version"]})
+        return stored["content"]
 
     def move(self, source: str, target: str) -> dict[str, Any]:
+        clean_source = self._text(source, "source", allow_empty=False)
+        self._saves.flush(clean_source, wait=False)
         return self.storage.move(
-            self._text(source, "source", allow_empty=False),
+            clean_source,
             self._text(target, "target"),
         )
 
     def rename(self, old_path: str, new_name: str) -> dict[str, Any]:
+        clean_path = self._text(old_path, "old_path", allow_empty=False)
+        self._saves.flush(clean_path, wait=False)
         return self.storage.rename(
-            self._text(old_path, "old_path", allow_empty=False),
+            clean_path,
             self._text(new_name, "new_name", allow_empty=False),
         )
 
     def relocate(self, source: str, destination: str) -> dict[str, Any]:
+        clean_source = self._text(source, "source", allow_empty=False)
+        self._saves.flush(clean_source, wait=False)
         return self.storage.relocate(
-            self._text(source, "source", allow_empty=False),
+            clean_source,
             self._text(destination, "destination", allow_empty=False),
         )
 
     def delete(self, path: str) -> dict[str, Any]:
-        return self.storage.delete(self._text(path, "path", allow_empty=False))
+        clean_path = self._text(path, "path", allow_empty=False)
+        self._saves.flush(clean_path, wait=False)
+        return self.storage.delete(clean_path)
 
     def delete_with_external_snapshot(self, path: str) -> dict[str, Any]:
-        return self.storage.delete_with_external_snapshot(
-            self._text(path, "path", allow_empty=False)
-        )
+        clean_path = self._text(path, "path", allow_empty=False)
+        self._saves.flush(clean_path, wait=False)
+        return self.storage.delete_with_external_snapshot(clean_path)
+
+    def batch(self, operations: Any, *, atomic: bool = False) -> dict[str, Any]:
+        if not isinstance(operations, list) or not operations:
+            raise DocumentValidationError("批量操作列表不能为空")
+        normalized: list[dict[str, Any]] = []
+        for index, operation in enumerate(operations):
+            if not isinstance(operation, dict):
+                raise DocumentValidationError("批量操作格式非法", details={"index": index})
+            kind = operation.get("op")
+            try:
+                normalized.append({"op": kind, **self._batch_arguments(kind, operation)})
+            except DocumentValidationError as exc:
+                raise DocumentValidationError(
+                    exc.message, details={**exc.details, "index": index}
+                ) from exc
+        self._saves.flush(wait=False)
+        return self.storage.batch(normalized, atomic=bool(atomic))
+
+    def _batch_arguments(self, kind: Any, operation: dict[str, Any]) -> dict[str, Any]:
+        if kind == "create_folder":
+            return {
+                "path": self._text(operation.get("path", ""), "path"),
+                "name": self._text(operation.get("name"), "name", allow_empty=False),
+            }
+        if kind == "create_file":
+            name = self._text(operation.get("name"), "name", allow_empty=False)
+            content = operation.get("content")
+            if content is None:
+                content = f"# {name.rsplit('.', 1)[0]}\n\n"
+            return {
+                "path": self._text(operation.get("path", ""), "path"),
+                "name": name,
+                "content": self._text(content, "content").encode("utf-8"),
+            }
+        if kind == "save":
+            expected = operation.get("expected_version")
+            if expected is not None:
+                expected = self._text(expected, "expected_version", allow_empty=False)
+            return {
+                "path": self._text(operation.get("path"), "path", allow_empty=False),
+                "content": self._text(operation.get("content"), "content").encode("utf-8"),
+                "expected_version": expected,
+            }
+        if kind == "move":
+            return {
+                "source": self._text(operation.get("source"), "source", allow_empty=False),
+                "target": self._text(operation.get("target", ""), "target"),
+            }
+        if kind == "rename":
+            return {
+                "old_path": self._text(operation.get("old_path"), "old_path", allow_empty=False),
+                "new_name": self._text(operation.get("new_name"), "new_name", allow_empty=False),
+            }
+        if kind == "delete":
+            return {"path": self._text(operation.get("path"), "path", allow_empty=False)}
+        raise DocumentValidationError("不支持的批量操作")
 
     def check_updates(self, path: str = "", file: str = "") -> dict[str, Any]:
+        self._saves.flush()
         return self.storage.check_updates(self._text(path, "path"), self._text(file, "file"))
 
     def folders(self) -> dict[str, Any]:
-        return {"folders": self.storage.folders()}
+        folders, generation = self.storage.folder_tree()
+        return {"folders": folders, "generation": generation}
 
     def list_trash(self) -> dict[str, Any]:
         return {"items": self.storage.list_trash()}
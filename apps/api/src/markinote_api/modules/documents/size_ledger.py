@@ -0,0 +1,146 @@
+"""Library size ledger shared by API worker processes.
+
+A single worker keeps the library's byte count and the growth reserved by
+in-flight writes in memory. Several workers write the same library, so with
+the file lock backend the count lives in a small JSON file in the trash root
+instead. Each quota check, reservation and accounted delta reads and rewrites
+that file while holding an exclusive ``flock`` on it, so two workers can never
+both spend the same free bytes.
+
+Reservations are recorded per process id. Those of a process that no longer
+exists are dropped when the file is read, so a worker that crashed mid-write
+does not shrink the quota for good. A missing or unreadable file means the
+size is unknown and the next quota check walks the library once.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows; the file lock backend is POSIX only
+    fcntl = None  # type: ignore[assignment]
+
+LEDGER_NAME = ".library-size.json"
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class SharedSizeLedger:
+    def __init__(self, trash_root: Path, measure: Callable[[], int]) -> None:
+        self.path = trash_root / LEDGER_NAME
+        self._measure = measure
+        # Threads of one process are excluded here; flock excludes processes.
+        self._lock = threading.Lock()
+
+    def reserve(self, growth: int, check: Callable[[int], None]) -> None:
+        """Pass the size plus every live reservation to ``check``, then reserve ``growth``.
+
+        ``check`` raises to refuse the write.
+        """
+        with self._locked() as state:
+            if state["bytes"] is None:
+                state["bytes"] = self._measure()
+            check(state["bytes"] + sum(state["reserved"].values()))
+            pid = str(os.getpid())
+            state["reserved"][pid] = state["reserved"].get(pid, 0) + growth
+
+    def release(self, growth: int) -> None:
+        with self._locked() as state:
+            pid = str(os.getpid())
+            remaining = state["reserved"].get(pid, 0) - growth
+            if remaining > 0:
+                state["reserved"][pid] = remaining
+            else:
+                state["reserved"].pop(pid, None)
+
+    def account(self, delta: int) -> int | None:
+        """Apply a committed byte delta and return the new size, if known."""
+        with self._locked() as state:
+            state["generation"] += 1
+            if state["bytes"] is not None:
+                state["bytes"] = max(0, state["bytes"] + delta)
+            return state["bytes"]
+
+    def invalidate(self) -> None:
+        with self._locked() as state:
+            state["generation"] += 1
+            state["bytes"] = None
+
+    def generation(self) -> int:
+        with self._locked(write=False) as state:
+            return state["generation"]
+
+    def reconcile(self, generation: int, measured: int) -> int | None:
+        """Store ``measured`` and return the drift, or ``None`` if it is stale.
+
+        A measurement is stale when any delta was accounted since
+        ``generation`` was read or when a write still holds a reservation.
+        """
+        with self._locked() as state:
+            if state["generation"] != generation or state["reserved"]:
+                return None
+            drift = 0 if state["bytes"] is None else measured - state["bytes"]
+            state["bytes"] = measured
+            return drift
+
+    @contextmanager
+    def _locked(self, *, write: bool = True) -> Iterator[dict[str, Any]]:
+        """Yield the state with the ledger locked and write it back if ``write``.
+
+        The file is its own ``flock`` target instead of a lock stripe: callers
+        hold path-lock stripes, which the ledger's stripe could coincide with.
+        """
+        with self._lock:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT | getattr(os, "O_CLOEXEC", 0), 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                state = self._read(fd)
+                yield state
+                if write:
+                    self._write(fd, state)
+            finally:
+                # Closing the descriptor releases the flock.
+                os.close(fd)
+
+    @staticmethod
+    def _read(fd: int) -> dict[str, Any]:
+        state: dict[str, Any] = {"bytes": None, "generation": 0, "reserved": {}}
+        try:
+            raw = json.loads(os.pread(fd, 1 << 20, 0) or b"{}")
+            size = raw.get("bytes")
+            state["bytes"] = size if isinstance(size, int) and size >= 0 else None
+            generation = raw.get("generation")
+            state["generation"] = generation if isinstance(generation, int) else 0
+            reserved = raw.get("reserved")
+            if isinstance(reserved, dict):
+                state["reserved"] = {
+                    pid: growth for pid, growth in reserved.items()
+                    if pid.isdigit() and isinstance(growth, int) and growth > 0 and _alive(int(pid))
+                }
+        except (ValueError, AttributeError):
+            pass
+        return state
+
+    @staticmethod
+    def _write(fd: int, state: dict[str, Any]) -> None:
+        # Rewritten in place: a torn write after a crash reads as unknown and
+        # is measured again, so the count needs no temp file or fsync.
+        content = json.dumps(state, separators=(",", ":")).encode("utf-8")
+        os.pwrite(fd, content, 0)
+        os.ftruncate(fd, len(content))
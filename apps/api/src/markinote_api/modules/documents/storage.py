@@ -1,8 +1,13 @@
 """Local-filesystem adapter for the documents application module.
 
-All user-controlled paths pass through one canonical resolver. Mutations are
-serialized per library, writes use same-directory atomic replacement, and
-deletes are moved into a quota-managed recoverable trash area.
+All user-controlled paths pass through one canonical resolver. Operations
+lock only the subtrees they touch through hierarchical path locks, writes use
+same-directory atomic replacement, and
+deletes are moved into a quota-managed recoverable trash area. Every mutation
+reports its affected subtree to the in-memory name and content indexes, so
+queries never walk the library, and its byte delta to a library-size ledger,
+so quota checks never walk it either. With the file lock backend the ledger
+is kept in the trash root and shared by every worker process.
 """
 
 from __future__ import annotations
@@ -11,57 +16,82 @@ import heapq
 import json
 import logging
 import os
+import posixpath
 import shutil
+import stat
+import threading
 import time
 import unicodedata
 import uuid
-from dataclasses import dataclass
+from collections.abc import Callable, Iterable, Iterator, Mapping, Sequence
+from contextlib import contextmanager, suppress
 from datetime import UTC, datetime
+from functools import partial
+from io import BytesIO
 from pathlib import Path
-from typing import Any
+from typing import Any, BinaryIO
 
+from markinote_api.modules.documents.content_index import LibraryContentIndex
 from markinote_api.modules.documents.errors import (
     DocumentAlreadyExists,
     DocumentCapacityExceeded,
     DocumentConflict,
+    DocumentError,
     DocumentNotFound,
     DocumentPathError,
     DocumentPermissionDenied,
     DocumentValidationError,
 )
+from markinote_api.modules.documents.listing import (
+    SORT_FIELDS,
+    DirectoryListingCache,
+    InvalidCursor,
+    ListedEntry,
+    directory_identity,
+    page,
+)
+from markinote_api.modules.documents.search_index import (
+    IndexedEntry,
+    LibrarySearchIndex,
+    normalize_search_text,
+)
+from markinote_api.modules.documents.size_ledger import SharedSizeLedger
+from markinote_api.modules.documents.trash_ledger import TrashEntry, TrashLedger
+from markinote_api.platform.file_locks import active_file_locks
 from markinote_api.platform.files import allowed_file, safe_filename
 from markinote_api.platform.io import (
+    StagedWrite,
     atomic_write_bytes,
     atomic_write_json,
+    cached_file_version,
     content_version,
     file_version,
+    remember_file_version,
     resource_lock,
+    stat_key,
+)
+from markinote_api.platform.metrics import (
+    LIBRARY_SIZE_DRIFT,
+    LIBRARY_SIZE_LEDGER,
+    LIBRARY_SIZE_RECONCILIATIONS,
 )
+from markinote_api.platform.path_locks import path_locks
 from markinote_api.platform.paths import (
     PathValidationError,
     relative_to_root,
     resolve_under_root,
     validate_storage_id,
 )
+from markinote_api.platform.watcher import LibraryChange
 
 LOGGER = logging.getLogger(__name__)
+_UPLOAD_CHUNK_BYTES = 256 * 1024
 
 
 def _utc_now() -> datetime:
     return datetime.now(UTC)
 
 
-@dataclass(slots=True)
-class _SearchCandidate:
-    """Reverse-ordered heap item so the least relevant retained result is first."""
-
-    sort_key: tuple[int, int, str, str]
-    payload: dict[str, Any]
-
-    def __lt__(self, other: _SearchCandidate) -> bool:
-        return self.sort_key > other.sort_key
-
-
 class LocalDocumentStorage:
     """Safe LocalFS implementation of the document storage port."""
 
@@ -84,12 +114,108 @@ class LocalDocumentStorage:
         self.trash_max_items = max(0, int(trash_max_items))
         self.trash_max_bytes = max(0, int(trash_max_bytes))
         self._trash_sequence = time.time_ns()
+        self._search_index = LibrarySearchIndex(self.root, self.allowed_extensions)
+        self._content_index = LibraryContentIndex(
+            self.root,
+            self.allowed_extensions,
+            max_document_bytes=self.max_document_bytes,
+        )
+        # Bytes of every regular file below the root, as counted by
+        # _path_size. None means unknown; the next capacity check walks once.
+        self._library_bytes: int | None = None
+        self._library_generation = 0
+        # Seeded from the clock like the trash sequence, so a restarted
+        # process never reuses a generation that a client cached.
+        self._folder_generation = time.time_ns()
+        self._folder_tree: list[dict[str, Any]] | None = None
+        # Readers share the root lock, so the lazy rebuild needs its own guard.
+        self._folder_tree_lock = threading.Lock()
+        self._listings = DirectoryListingCache()
+        # Writers in disjoint subtrees run concurrently, so the ledger and the
+        # growth reserved by in-flight writes need their own guard.
+        self._ledger_lock = threading.Lock()
+        self._reserved_bytes = 0
+        # Set while this thread runs a batch that reserved its growth up front.
+        self._batch_state = threading.local()
 
         if self.root == self.trash_root or self._is_below(self.trash_root, self.root):
             raise ValueError("TRASH_FOLDER must be outside LIBRARY_FOLDER")
 
         self.root.mkdir(parents=True, exist_ok=True)
         self.trash_root.mkdir(parents=True, exist_ok=True)
+        self._trash_ledger = TrashLedger(self.trash_root, self._path_size)
+        # Used instead of the in-memory ledger while the file lock backend is
+        # active, because other worker processes write the library too.
+        self._shared_ledger = SharedSizeLedger(self.trash_root, partial(self._path_size, self.root))
+        self._locks = path_locks(self.root)
+
+    def rebuild_search_index(self) -> int:
+        """Cold-build the name and content indexes, normally once at startup."""
+        with self._locks.shared(""):
+            self._content_index.rebuild()
+            return self._search_index.rebuild()
+
+    def refresh_indexes(self, relative_path: str = "") -> None:
+        """Resynchronize derived state after a subtree changed outside this adapter.
+
+        Backup rollbacks and other library writers that bypass the storage
+        methods call this with the library-relative path they touched; an
+        empty path refreshes the whole library.
+        """
+        try:
+            _, normalized = resolve_under_root(self.root, relative_path, allow_root=True)
+        except (PathValidationError, ValueError):
+            normalized = ""
+        with self._locks.exclusive(normalized):
+            self._indexed(normalized)
+            # The caller cannot report a byte delta, so the next capacity
+            # check measures the library again.
+            self.invalidate_library_size()
+            self._folders_changed()
+
+    def apply_library_changes(self, changes: Iterable[LibraryChange]) -> None:
+        """Fold filesystem watcher notifications into the derived indexes.
+
+        Changes caused by this adapter's own writes arrive here as well; the
+        indexes recognize unchanged entries, so replaying them is cheap. The
+        size ledger is left to the periodic reconciliation.
+        """
+        changes = list(changes)
+        paths = [change.path for change in changes]
+        paths.extend(change.source_path for change in changes if change.source_path is not None)
+        with self._locks.exclusive(*paths):
+            for change in changes:
+                if change.kind == "moved" and change.source_path is not None:
+                    self._relocated(change.source_path, change.path)
+                    self._content_index.refresh(change.path)
+                else:
+                    self._indexed(change.path)
+                if change.is_directory or not change.path:
+                    self._folders_changed()
+
+    def _indexed(self, *relative_paths: str) -> None:
+        for relative_path in relative_paths:
+            self._search_index.refresh(relative_path)
+            self._content_index.refresh(relative_path)
+        self._listing_changed(*relative_paths)
+
+    def _listing_changed(self, *relative_paths: str) -> None:
+        for relative_path in relative_paths:
+            self._listings.invalidate_below(relative_path)
+            if relative_path:
+                self._listings.invalidate(posixpath.dirname(relative_path))
+
+    def _folders_changed(self) -> None:
+        with self._folder_tree_lock:
+            self._folder_generation += 1
+            self._folder_tree = None
+
+    def _relocated(self, source_path: str, destination_path: str) -> None:
+        self._search_index.refresh(source_path)
+        self._search_index.refresh(destination_path)
+        # Renames keep their bytes, so postings are re-keyed instead of reread.
+        self._content_index.move(source_path, destination_path)
+        self._listing_changed(source_path, destination_path)
 
     @staticmethod
     def _is_below(path: Path, parent: Path) -> bool:
@@ -133,8 +259,8 @@ class LocalDocumentStorage:
         if path.is_symlink():
             raise DocumentPathError("禁止访问符号链接路径")
 
-    def _check_payload_size(self, content: bytes) -> None:
-        if len(content) > self.max_document_bytes:
+    def _check_payload_size(self, size: int) -> None:
+        if size > self.max_document_bytes:
             raise DocumentCapacityExceeded(
                 "文件内容过大",
                 details={"max_bytes": self.max_document_bytes},
@@ -168,12 +294,116 @@ class LocalDocumentStorage:
         return total
 
     def _library_size(self) -> int:
-        return self._path_size(self.root)
+        """Return the ledger, measuring it first if unknown; hold the ledger lock."""
+        if self._library_bytes is None:
+            self._library_bytes = self._path_size(self.root)
+            LIBRARY_SIZE_LEDGER.set(self._library_bytes)
+        return self._library_bytes
+
+    def _account(self, delta: int) -> None:
+        """Apply a committed mutation's byte delta; call with its path locks held."""
+        if active_file_locks() is not None:
+            size = self._shared_ledger.account(delta)
+            if size is not None:
+                LIBRARY_SIZE_LEDGER.set(size)
+            return
+        with self._ledger_lock:
+            self._library_generation += 1
+            if self._library_bytes is not None:
+                self._library_bytes = max(0, self._library_bytes + delta)
+                LIBRARY_SIZE_LEDGER.set(self._library_bytes)
+
+    def invalidate_library_size(self) -> None:
+        """Forget the library size; the next capacity check measures it again.
+
+        With the file lock backend this clears the ledger every worker shares.
+        """
+        if active_file_locks() is not None:
+            self._shared_ledger.invalidate()
+            return
+        with self._ledger_lock:
+            self._library_generation += 1
+            self._library_bytes = None
+
+    def reconcile_library_size(self) -> int:
+        """Compare the ledger with a real walk and correct it; return the drift.
+
+        The walk runs without path locks so writers are never blocked by it.
+        The result is compared under a shared root lock, which waits for
+        in-flight writers to account for their bytes; if any mutation
+        committed meanwhile, the measurement is discarded and the ledger is
+        left for the next reconciliation. The shared ledger of several workers
+        is also left while another worker's write holds a reservation, since
+        the root lock does not wait for other processes.
+        """
+        shared = active_file_locks() is not None
+        if shared:
+            generation = self._shared_ledger.generation()
+        else:
+            with self._ledger_lock:
+                generation = self._library_generation
+        measured = self._path_size(self.root)
+        with self._locks.shared(""):
+            if shared:
+                drift = self._shared_ledger.reconcile(generation, measured)
+            else:
+                with self._ledger_lock:
+                    drift = None
+                    if generation == self._library_generation:
+                        drift = 0 if self._library_bytes is None else measured - self._library_bytes
+                        self._library_bytes = measured
+        if drift is None:
+            LIBRARY_SIZE_RECONCILIATIONS.labels(outcome="skipped").inc()
+            return 0
+        LIBRARY_SIZE_LEDGER.set(measured)
+        LIBRARY_SIZE_DRIFT.set(drift)
+        LIBRARY_SIZE_RECONCILIATIONS.labels(outcome="corrected" if drift else "in_sync").inc()
+        if drift:
+            LOGGER.warning("library size ledger drift corrected", extra={"drift_bytes": drift})
+        return drift
+
+    @contextmanager
+    def _capacity_reserved(self, incoming_bytes: int, replaced_bytes: int = 0) -> Iterator[None]:
+        """Check the quota and reserve the growth until the caller accounts for it.
+
+        Without the reservation two writers in different subtrees could both
+        pass the check and together exceed the quota. Inside a batch the
+        batch's own reservation already covers the write.
+        """
+        if getattr(self._batch_state, "reserved", False):
+            yield
+            return
+        growth = max(0, incoming_bytes - replaced_bytes)
+        self._reserve_capacity(incoming_bytes, replaced_bytes, growth)
+        try:
+            yield
+        finally:
+            self._release_capacity(growth)
+
+    def _reserve_capacity(self, incoming_bytes: int, replaced_bytes: int, growth: int) -> None:
+        """Refuse a write that would exceed the quota, otherwise reserve ``growth``."""
+        if not self.max_library_bytes:
+            return
+        check = partial(self._ensure_library_capacity, incoming_bytes, replaced_bytes)
+        if active_file_locks() is not None:
+            self._shared_ledger.reserve(growth, check)
+            return
+        with self._ledger_lock:
+            check(self._library_size() + self._reserved_bytes)
+            self._reserved_bytes += growth
 
-    def _ensure_library_capacity(self, incoming_bytes: int, replaced_bytes: int = 0) -> None:
+    def _release_capacity(self, growth: int) -> None:
         if not self.max_library_bytes:
             return
-        projected = self._library_size() - replaced_bytes + incoming_bytes
+        if active_file_locks() is not None:
+            self._shared_ledger.release(growth)
+            return
+        with self._ledger_lock:
+            self._reserved_bytes -= growth
+
+    def _ensure_library_capacity(self, incoming_bytes: int, replaced_bytes: int, used_bytes: int) -> None:
+        """Refuse the write unless ``used_bytes``, reservations included, leave room for it."""
+        projected = used_bytes - replaced_bytes + incoming_bytes
         if projected > self.max_library_bytes:
             raise DocumentCapacityExceeded(
                 "文档库容量不足",
@@ -208,111 +438,205 @@ class LocalDocumentStorage:
             return None
         return None
 
-    def list_directory(self, relative_path: str = "") -> tuple[list[dict[str, Any]], str]:
-        directory, normalized = self._resolve(relative_path, allow_root=True)
-        with resource_lock(self.root):
-            if not directory.exists():
-                raise DocumentNotFound("文件夹不存在")
-            if not directory.is_dir():
-                raise DocumentValidationError("路径不是文件夹")
+    def _indexed_payload(self, entry: IndexedEntry) -> dict[str, Any] | None:
+        try:
+            stat_info = os.stat(self.root / entry.path, follow_symlinks=False)
+        except OSError:
+            return None
+        modified = datetime.fromtimestamp(stat_info.st_mtime).isoformat()
+        if entry.is_folder and stat.S_ISDIR(stat_info.st_mode):
+            return {"name": entry.name, "type": "folder", "path": entry.path, "modified": modified}
+        if not entry.is_folder and stat.S_ISREG(stat_info.st_mode):
+            return {
+                "name": entry.name,
+                "type": "file",
+                "path": entry.path,
+                "size": stat_info.st_size,
+                "modified": modified,
+            }
+        return None
 
-            items: list[dict[str, Any]] = []
+    def list_directory(
+        self,
+        relative_path: str = "",
+        *,
+        sort: str = "name",
+        order: str = "asc",
+        limit: int | None = None,
+        cursor: str | None = None,
+    ) -> dict[str, Any]:
+        """List one folder, optionally one keyset-paginated page at a time.
+
+        The folder is scanned into a cached snapshot that is reused until its
+        stat identity changes or a mutation below it invalidates it, so each
+        further page costs one ``stat`` and a binary search.
+        """
+        if sort not in SORT_FIELDS or order not in {"asc", "desc"}:
+            raise DocumentValidationError("不支持的排序方式")
+        directory, normalized = self._resolve(relative_path, allow_root=True)
+        with self._locks.shared(normalized):
             try:
-                with os.scandir(directory) as entries:
-                    for entry in entries:
-                        if entry.name.startswith("."):
-                            continue
-                        rel = f"{normalized}/{entry.name}" if normalized else entry.name
-                        payload = self._entry_payload(entry, rel.replace("\\", "/"))
-                        if payload is None:
-                            continue
-                        if payload["type"] == "file" and not allowed_file(
-                            entry.name, self.allowed_extensions
-                        ):
-                            continue
-                        items.append(payload)
+                stat_info = directory.stat()
+            except FileNotFoundError as exc:
+                raise DocumentNotFound("文件夹不存在") from exc
             except PermissionError as exc:
                 raise DocumentPermissionDenied("权限不足，无法读取文件夹") from exc
+            if not stat.S_ISDIR(stat_info.st_mode):
+                raise DocumentValidationError("路径不是文件夹")
+            entries, keys = self._listings.view(
+                normalized,
+                directory_identity(stat_info),
+                lambda: self._scan_directory(directory, normalized),
+                sort,
+                order,
+            )
+        try:
+            selected, next_cursor = page(
+                entries, keys, sort=sort, order=order, limit=limit, cursor=cursor
+            )
+        except InvalidCursor as exc:
+            raise DocumentValidationError("分页游标无效") from exc
+        return {
+            "items": [dict(entry.payload) for entry in selected],
+            "current_path": normalized,
+            "next_cursor": next_cursor,
+            "total": len(entries),
+        }
 
-        items.sort(key=lambda item: (item["type"] != "folder", item["name"].casefold()))
-        return items, normalized
+    def _scan_directory(self, directory: Path, normalized: str) -> list[ListedEntry]:
+        listed: list[ListedEntry] = []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.name.startswith("."):
+                        continue
+                    rel = f"{normalized}/{entry.name}" if normalized else entry.name
+                    payload = self._entry_payload(entry, rel.replace("\\", "/"))
+                    if payload is None:
+                        continue
+                    is_folder = payload["type"] == "folder"
+                    if not is_folder and not allowed_file(entry.name, self.allowed_extensions):
+                        continue
+                    try:
+                        modified_ns = entry.stat(follow_symlinks=False).st_mtime_ns
+                    except OSError:
+                        continue
+                    listed.append(
+                        ListedEntry(
+                            payload=payload,
+                            is_folder=is_folder,
+                            folded_name=entry.name.casefold(),
+                            modified_ns=modified_ns,
+                            size=payload.get("size", 0),
+                        )
+                    )
+        except PermissionError as exc:
+            raise DocumentPermissionDenied("权限不足，无法读取文件夹") from exc
+        return listed
 
     def search(self, query: str, *, limit: int) -> dict[str, Any]:
         """Search names and relative paths without loading document contents.
 
-        A bounded heap retains only the best ``limit`` matches. The scan is
-        O(N log K) for N visible filesystem entries and K returned results,
-        while auxiliary memory remains O(D + K) for the directory stack and
-        result heap.
+        Matching is answered by the name index in O(log N + M) for M matches.
+        ``heapq.nsmallest`` retains only the best ``limit`` of them, and only
+        those K results are stat'ed for their size and modification time.
         """
         normalized_query = unicodedata.normalize("NFC", query.strip())
         if not normalized_query:
             raise DocumentValidationError("搜索关键词不能为空")
-        needle = normalized_query.casefold()
+        needle = normalize_search_text(normalized_query)
         result_limit = max(1, int(limit))
-        candidates: list[_SearchCandidate] = []
-        total = 0
 
-        with resource_lock(self.root):
-            stack: list[tuple[Path, str]] = [(self.root, "")]
-            while stack:
-                directory, prefix = stack.pop()
-                try:
-                    entries = os.scandir(directory)
-                except (OSError, PermissionError):
-                    continue
+        def rank(entry: IndexedEntry) -> tuple[int, int, str, str]:
+            name = entry.normalized_name
+            relevance = (
+                0 if name == needle
+                else 1 if entry.stem == needle
+                else 2 if name.startswith(needle)
+                else 3 if needle in name
+                else 4
+            )
+            return relevance, entry.depth, name, entry.normalized_path
+
+        with self._locks.shared(""):
+            for attempt in range(3):
+                matches = self._search_index.match(needle)
+                items: list[dict[str, Any]] = []
+                vanished: list[str] = []
+                for entry in heapq.nsmallest(result_limit, matches, key=rank):
+                    payload = self._indexed_payload(entry)
+                    if payload is None:
+                        vanished.append(entry.path)
+                    else:
+                        items.append(payload)
+                if not vanished:
+                    break
+                # The entry changed outside the API since it was indexed.
+                # Resynchronize it once; drop it if it still cannot be read.
+                for path in vanished:
+                    if attempt:
+                        self._search_index.discard(path)
+                    else:
+                        self._search_index.refresh(path)
 
+        return {
+            "items": items,
+            "query": normalized_query,
+            "total": len(matches),
+            "truncated": len(matches) > result_limit,
+        }
+
+    def search_content(
+        self,
+        query: str,
+        *,
+        path: str = "",
+        limit: int,
+        max_lines: int = 5,
+    ) -> dict[str, Any]:
+        """Rank documents by BM25 over their contents using the inverted index.
+
+        Only the returned documents are read again, and only to quote the
+        lines that the postings already identified as matches.
+        """
+        normalized_query = unicodedata.normalize("NFC", query.strip())
+        if not normalized_query:
+            raise DocumentValidationError("搜索关键词不能为空")
+        directory, prefix = self._resolve(path, allow_root=True)
+        result_limit = max(1, int(limit))
+
+        items: list[dict[str, Any]] = []
+        with self._locks.shared(prefix):
+            if prefix and not directory.is_dir():
+                raise DocumentNotFound("文件夹不存在")
+            hits, total = self._content_index.search(normalized_query, prefix=prefix, limit=result_limit)
+            for hit in hits:
+                wanted = hit.line_numbers[: max(0, max_lines)]
+                lines: list[dict[str, Any]] = []
                 try:
-                    for entry in entries:
-                        if entry.name.startswith(".") or entry.is_symlink():
-                            continue
-                        relative = f"{prefix}/{entry.name}" if prefix else entry.name
-                        relative = relative.replace("\\", "/")
-                        try:
-                            is_directory = entry.is_dir(follow_symlinks=False)
-                            is_document = entry.is_file(follow_symlinks=False) and allowed_file(
-                                entry.name, self.allowed_extensions
-                            )
-                        except OSError:
-                            continue
-                        if is_directory:
-                            stack.append((Path(entry.path), relative))
-                        elif not is_document:
-                            continue
-
-                        normalized_name = unicodedata.normalize("NFC", entry.name).casefold()
-                        normalized_path = unicodedata.normalize("NFC", relative).casefold()
-                        if needle not in normalized_name and needle not in normalized_path:
-                            continue
-                        payload = self._entry_payload(entry, relative)
-                        if payload is None:
-                            continue
-
-                        total += 1
-                        stem = Path(entry.name).stem.casefold()
-                        relevance = (
-                            0 if normalized_name == needle
-                            else 1 if stem == needle
-                            else 2 if normalized_name.startswith(needle)
-                            else 3 if needle in normalized_name
-                            else 4
-                        )
-                        candidate = _SearchCandidate(
-                            (relevance, relative.count("/"), normalized_name, normalized_path),
-                            payload,
-                        )
-                        if len(candidates) < result_limit:
-                            heapq.heappush(candidates, candidate)
-                        elif candidate.sort_key < candidates[0].sort_key:
-                            heapq.heapreplace(candidates, candidate)
-                except (OSError, PermissionError):
+                    with open(self.root / hit.path, encoding="utf-8", errors="ignore") as stream:
+                        for line_number, line in enumerate(stream, 1):
+                            if len(lines) == len(wanted):
+                                break
+                            if line_number == wanted[len(lines)]:
+                                lines.append({"line": line_number, "text": line.rstrip("\r\n")[:200]})
+                except OSError:
                     continue
-                finally:
-                    entries.close()
+                items.append(
+                    {
+                        "name": hit.path.rsplit("/", 1)[-1],
+                        "type": "file",
+                        "path": hit.path,
+                        "size": hit.size,
+                        "modified": datetime.fromtimestamp(hit.mtime).isoformat(),
+                        "score": round(hit.score, 6),
+                        "match_count": len(hit.line_numbers),
+                        "matches": lines,
+                    }
+                )
 
-        ordered = [candidate.payload for candidate in sorted(candidates, key=lambda item: item.sort_key)]
         return {
-            "items": ordered,
+            "items": items,
             "query": normalized_query,
             "total": total,
             "truncated": total > result_limit,
@@ -320,18 +644,23 @@ class LocalDocumentStorage:
 
     def read(self, relative_path: str) -> dict[str, Any]:
         path, normalized = self._resolve(relative_path, allow_root=False)
-        with resource_lock(self.root):
+        with self._locks.shared(normalized):
             self._require_document(path, normalized)
             try:
                 with open(path, "rb") as stream:
+                    opened = os.fstat(stream.fileno())
                     raw = stream.read(self.max_document_bytes + 1)
-                self._check_payload_size(raw)
+                    stat_info = os.fstat(stream.fileno())
+                self._check_payload_size(len(raw))
                 content = raw.decode("utf-8")
-                stat_info = path.stat()
             except UnicodeDecodeError as exc:
                 raise DocumentValidationError("文件不是有效的 UTF-8 文本") from exc
             except PermissionError as exc:
                 raise DocumentPermissionDenied("权限不足，无法读取文件") from exc
+            version = content_version(raw)
+            # Seed the version cache so the editor's first poll is a hit.
+            if stat_key(opened) == stat_key(stat_info):
+                remember_file_version(stat_info, version)
 
         return {
             "path": normalized,
@@ -339,11 +668,38 @@ class LocalDocumentStorage:
             "content": content,
             "size": len(raw),
             "modified": datetime.fromtimestamp(stat_info.st_mtime).isoformat(),
-            "version": content_version(raw),
+            "version": version,
+        }
+
+    def describe(self, relative_path: str) -> dict[str, Any]:
+        """Return a document's metadata and version without reading its content.
+
+        The version comes from the stat-keyed cache, so revalidating an
+        unchanged document costs one ``stat``. ``location`` is the absolute
+        file path for callers that stream the bytes themselves.
+        """
+        path, normalized = self._resolve(relative_path, allow_root=False)
+        with self._locks.shared(normalized):
+            self._require_document(path, normalized)
+            try:
+                stat_info = path.stat()
+                self._check_payload_size(stat_info.st_size)
+                version = cached_file_version(path, stat_info)
+            except PermissionError as exc:
+                raise DocumentPermissionDenied("权限不足，无法读取文件") from exc
+
+        return {
+            "path": normalized,
+            "filename": path.name,
+            "size": stat_info.st_size,
+            "modified": datetime.fromtimestamp(stat_info.st_mtime).isoformat(),
+            "version": version,
+            "location": path,
         }
 
     @staticmethod
-    def _normalize_version(value: str | None) -> str | None:
+    def normalize_version(value: str | None) -> str | None:
+        """Strip ETag quoting and weak prefixes from a client-supplied version."""
         if value is None:
             return None
         normalized = value.strip()
@@ -360,31 +716,43 @@ class LocalDocumentStorage:
         *,
         expected_version: str | None = None,
     ) -> dict[str, Any]:
-        self._check_payload_size(content)
+        self._check_payload_size(len(content))
         path, normalized = self._resolve(relative_path, allow_root=False)
-        expected = self._normalize_version(expected_version)
+        expected = self.normalize_version(expected_version)
 
-        with resource_lock(self.root):
+        with self._locks.exclusive(normalized):
             self._require_document(path, normalized)
             try:
-                current_size = path.stat().st_size
+                current = path.stat()
+                current_size = current.st_size
                 if expected is not None:
-                    current_version = file_version(path)
+                    current_version = cached_file_version(path, current)
                     if expected != current_version:
                         raise DocumentConflict(
                             "文件已被其他操作修改，请刷新后重试",
                             details={"current_version": current_version},
                         )
-                self._ensure_library_capacity(len(content), current_size)
-                atomic_write_bytes(path, content)
+                with self._capacity_reserved(len(content), current_size):
+                    atomic_write_bytes(path, content, durability="strict")
+                    self._account(len(content) - current_size)
             except PermissionError as exc:
                 raise DocumentPermissionDenied("权限不足，无法保存文件") from exc
+            version = content_version(content)
+            try:
+                written = path.stat()
+            except OSError:
+                pass
+            else:
+                if written.st_size == len(content):
+                    remember_file_version(written, version)
+            self._content_index.put(normalized, content)
+            self._listing_changed(normalized)
 
         return {
             "path": normalized,
             "filename": path.name,
             "size": len(content),
-            "version": content_version(content),
+            "version": version,
         }
 
     @staticmethod
@@ -404,7 +772,7 @@ class LocalDocumentStorage:
         destination_rel = f"{parent_normalized}/{folder_name}" if parent_normalized else folder_name
         destination, destination_rel = self._resolve(destination_rel, allow_root=False)
 
-        with resource_lock(self.root):
+        with self._locks.exclusive(destination_rel):
             if not parent.exists():
                 raise DocumentNotFound("父目录不存在")
             if not parent.is_dir():
@@ -415,29 +783,33 @@ class LocalDocumentStorage:
                 destination.mkdir()
             except PermissionError as exc:
                 raise DocumentPermissionDenied("权限不足，无法创建文件夹") from exc
+            self._folders_changed()
+            self._indexed(destination_rel)
 
         return {"folder_name": folder_name, "path": destination_rel}
 
     def create_file(self, parent_path: str, name: str, content: bytes) -> dict[str, Any]:
         filename = self._validated_name(name)
         self._require_allowed_extension(filename)
-        self._check_payload_size(content)
+        self._check_payload_size(len(content))
         parent, parent_normalized = self._resolve(parent_path, allow_root=True)
         destination_rel = f"{parent_normalized}/{filename}" if parent_normalized else filename
         destination, destination_rel = self._resolve(destination_rel, allow_root=False)
 
-        with resource_lock(self.root):
+        with self._locks.exclusive(destination_rel):
             if not parent.exists():
                 raise DocumentNotFound("父目录不存在")
             if not parent.is_dir():
                 raise DocumentValidationError("父路径不是文件夹")
             if destination.exists():
                 raise DocumentAlreadyExists("文件已存在")
-            self._ensure_library_capacity(len(content))
             try:
-                atomic_write_bytes(destination, content)
+                with self._capacity_reserved(len(content)):
+                    atomic_write_bytes(destination, content, durability="strict")
+                    self._account(len(content))
             except PermissionError as exc:
                 raise DocumentPermissionDenied("权限不足，无法创建文件") from exc
+            self._indexed(destination_rel)
 
         return {
             "file_name": filename,
@@ -460,38 +832,142 @@ class LocalDocumentStorage:
             counter += 1
         return candidate
 
-    def upload(self, target_path: str, filename: str, content: bytes) -> dict[str, Any]:
+    def upload(
+        self,
+        target_path: str,
+        filename: str,
+        content: bytes | BinaryIO,
+    ) -> dict[str, Any]:
+        """Store an uploaded document without holding it in memory.
+
+        ``content`` may be a binary stream. It is copied in fixed-size chunks
+        into a temporary file beside the destination, hashed and counted on
+        the way, aborted as soon as it passes the document limit, and renamed
+        into place only after the quota check.
+        """
         clean_name = self._validated_name(filename)
         self._require_allowed_extension(clean_name)
-        self._check_payload_size(content)
-        target, _ = self._resolve(target_path, allow_root=True)
-
-        with resource_lock(self.root):
+        if isinstance(content, bytes):
+            self._check_payload_size(len(content))
+            content = BytesIO(content)
+        target, target_normalized = self._resolve(target_path, allow_root=True)
+
+        # The whole target folder is locked because the collision-free name
+        # is chosen by probing its entries.
+        with self._locks.exclusive(target_normalized):
+            missing = [path for path in (target, *target.parents) if not path.exists()]
             try:
                 # Folder upload relies on this behavior: safe missing
                 # target directories are created as part of the upload.
                 target.mkdir(parents=True, exist_ok=True)
                 if not target.is_dir():
                     raise DocumentValidationError("目标路径不是文件夹")
-                self._ensure_library_capacity(len(content))
                 destination = self._unique_destination(target, clean_name)
-                atomic_write_bytes(destination, content)
-            except PermissionError as exc:
-                raise DocumentPermissionDenied("权限不足，无法上传文件") from exc
+                with StagedWrite(destination, durability="strict") as staged:
+                    for chunk in iter(lambda: content.read(_UPLOAD_CHUNK_BYTES), b""):
+                        staged.write(chunk)
+                        self._check_payload_size(staged.size)
+                    with self._capacity_reserved(staged.size):
+                        staged.commit()
+                        self._account(staged.size)
+            except BaseException as exc:
+                # A rejected upload must not leave the folders it created.
+                for created in missing:
+                    with suppress(OSError):
+                        created.rmdir()
+                if isinstance(exc, PermissionError):
+                    raise DocumentPermissionDenied("权限不足，无法上传文件") from exc
+                raise
+            if missing:
+                self._folders_changed()
+            normalized = relative_to_root(self.root, destination)
+            self._indexed(normalized)
 
-        normalized = relative_to_root(self.root, destination)
         return {
             "filename": destination.name,
             "path": normalized,
-            "size": len(content),
-            "version": content_version(content),
+            "size": staged.size,
+            "version": staged.version,
+        }
+
+    def import_file(
+        self,
+        relative_path: str,
+        source: str | os.PathLike[str],
+        *,
+        overwrite: bool = False,
+    ) -> dict[str, Any]:
+        """Copy one local file to ``relative_path`` for a bulk import.
+
+        Unlike ``upload`` the destination name is kept, an existing document
+        with the same content is left untouched, and the derived indexes are
+        not refreshed: the API that serves the library learns of imported
+        files from its library watcher. ``status`` is ``created``,
+        ``replaced``, ``unchanged`` or ``conflict``; a differing document is
+        replaced only with ``overwrite``.
+        """
+        destination, normalized = self._resolve(relative_path, allow_root=False)
+        self._require_allowed_extension(destination.name)
+        source = Path(source)
+        try:
+            self._check_payload_size(source.stat().st_size)
+        except FileNotFoundError as exc:
+            raise DocumentNotFound("源文件不存在") from exc
+
+        with self._locks.exclusive(normalized):
+            status, replaced_bytes = "created", 0
+            if destination.exists() or destination.is_symlink():
+                self._require_document(destination, normalized)
+                current = destination.stat()
+                current_version = cached_file_version(destination, current)
+                if current.st_size == source.stat().st_size and current_version == file_version(source):
+                    return {
+                        "path": normalized,
+                        "status": "unchanged",
+                        "size": current.st_size,
+                        "version": current_version,
+                    }
+                if not overwrite:
+                    return {
+                        "path": normalized,
+                        "status": "conflict",
+                        "size": current.st_size,
+                        "version": current_version,
+                    }
+                status, replaced_bytes = "replaced", current.st_size
+            missing = [path for path in destination.parents if not path.exists()]
+            try:
+                with open(source, "rb") as stream, StagedWrite(destination, durability="strict") as staged:
+                    for chunk in iter(lambda: stream.read(_UPLOAD_CHUNK_BYTES), b""):
+                        staged.write(chunk)
+                        self._check_payload_size(staged.size)
+                    with self._capacity_reserved(staged.size, replaced_bytes):
+                        staged.commit()
+                        self._account(staged.size - replaced_bytes)
+            except BaseException as exc:
+                for created in missing:
+                    with suppress(OSError):
+                        created.rmdir()
+                if isinstance(exc, PermissionError):
+                    raise DocumentPermissionDenied("权限不足，无法导入文件") from exc
+                raise
+            with suppress(OSError):
+                written = destination.stat()
+                if written.st_size == staged.size:
+                    remember_file_version(written, staged.version)
+
+        return {
+            "path": normalized,
+            "status": status,
+            "size": staged.size,
+            "version": staged.version,
         }
 
     def move(self, source_path: str, target_path: str) -> dict[str, Any]:
         source, source_normalized = self._resolve(source_path, allow_root=False)
-        target, _ = self._resolve(target_path, allow_root=True)
+        target, target_normalized = self._resolve(target_path, allow_root=True)
 
-        with resource_lock(self.root):
+        with self._locks.exclusive(source_normalized, target_normalized):
             if not source.exists():
                 raise DocumentNotFound("源文件不存在")
             if source.is_symlink():
@@ -508,31 +984,39 @@ class LocalDocumentStorage:
                 shutil.move(os.fspath(source), os.fspath(destination))
             except PermissionError as exc:
                 raise DocumentPermissionDenied("权限不足，无法移动文件") from exc
+            new_path = relative_to_root(self.root, destination)
+            self._folders_changed()
+            self._relocated(source_normalized, new_path)
 
         return {
             "source_path": source_normalized,
-            "new_path": relative_to_root(self.root, destination),
+            "new_path": new_path,
             "filename": destination.name,
         }
 
     def rename(self, old_path: str, new_name: str) -> dict[str, Any]:
         source, old_normalized = self._resolve(old_path, allow_root=False)
         clean_name = self._validated_name(new_name)
+        parent_rel = old_normalized.rpartition("/")[0]
+        destination, destination_rel = self._resolve(
+            f"{parent_rel}/{clean_name}" if parent_rel else clean_name,
+            allow_root=False,
+        )
 
-        with resource_lock(self.root):
+        with self._locks.exclusive(old_normalized, destination_rel):
             if not source.exists():
                 raise DocumentNotFound("文件或文件夹不存在")
             if source.is_file():
                 self._require_allowed_extension(clean_name)
-            destination = source.parent / clean_name
-            destination_rel = relative_to_root(self.root, destination)
-            destination, destination_rel = self._resolve(destination_rel, allow_root=False)
             if destination.exists():
                 raise DocumentAlreadyExists(f'名称"{clean_name}"已被使用')
             try:
                 os.replace(source, destination)
             except PermissionError as exc:
                 raise DocumentPermissionDenied("权限不足，无法重命名") from exc
+            if destination.is_dir():
+                self._folders_changed()
+            self._relocated(old_normalized, destination_rel)
 
         return {
             "old_path": old_normalized,
@@ -553,7 +1037,7 @@ class LocalDocumentStorage:
             allow_root=False,
         )
 
-        with resource_lock(self.root):
+        with self._locks.exclusive(source_normalized, destination_normalized):
             if not source.exists():
                 raise DocumentNotFound("source does not exist")
             if source.is_symlink():
@@ -570,6 +1054,9 @@ class LocalDocumentStorage:
                 shutil.move(os.fspath(source), os.fspath(destination))
             except PermissionError as exc:
                 raise DocumentPermissionDenied("insufficient permission to move item") from exc
+            if destination.is_dir():
+                self._folders_changed()
+            self._relocated(source_normalized, destination_normalized)
 
         return {
             "source_path": source_normalized,
@@ -577,22 +1064,6 @@ class LocalDocumentStorage:
             "filename": destination.name,
         }
 
-    def _trash_records(self) -> list[tuple[Path, int, float]]:
-        records: list[tuple[Path, int, float]] = []
-        try:
-            entries = list(self.trash_root.iterdir())
-        except FileNotFoundError:
-            return records
-        for record in entries:
-            if record.is_symlink() or not record.is_dir():
-                continue
-            try:
-                records.append((record, self._path_size(record / "payload"), record.stat().st_mtime))
-            except OSError:
-                continue
-        records.sort(key=lambda item: (item[2], item[0].name))
-        return records
-
     def _remove_trash_record(self, record: Path) -> None:
         try:
             record.resolve(strict=False).relative_to(self.trash_root)
@@ -609,21 +1080,23 @@ class LocalDocumentStorage:
                 "项目超过回收站单项容量，未执行删除",
                 details={"max_bytes": self.trash_max_bytes},
             )
+
     def _prune_trash_capacity(self) -> None:
-        records = self._trash_records()
-        total_bytes = sum(record[1] for record in records)
-        while records and (
-            (self.trash_max_items and len(records) > self.trash_max_items)
-            or (self.trash_max_bytes and total_bytes > self.trash_max_bytes)
-        ):
-            oldest, size, _ = records.pop(0)
-            self._remove_trash_record(oldest)
-            total_bytes -= size
-
-    def delete(self, relative_path: str) -> dict[str, Any]:
+        self._trash_ledger.prune(
+            max_items=self.trash_max_items,
+            max_bytes=self.trash_max_bytes,
+            discard=lambda record_id: self._remove_trash_record(self.trash_root / record_id),
+        )
+
+    def delete(self, relative_path: str, *, prune: bool = True) -> dict[str, Any]:
+        """Move an item to the trash and prune the trash to its limits.
+
+        ``batch`` passes ``prune=False`` and prunes once at the end, so a
+        later delete cannot discard the record an earlier one restores from.
+        """
         source, normalized = self._resolve(relative_path, allow_root=False)
 
-        with resource_lock(self.root), resource_lock(self.trash_root):
+        with self._locks.exclusive(normalized), resource_lock(self.trash_root):
             if not source.exists():
                 raise DocumentNotFound("文件或文件夹不存在")
             if source.is_symlink():
@@ -673,16 +1146,25 @@ class LocalDocumentStorage:
                 if record.exists() and not any(record.iterdir()):
                     record.rmdir()
                 raise
+            self._trash_ledger.add(TrashEntry(trash_id, size, deleted_at.timestamp(), metadata))
+            self._account(-size)
+            if item_type == "folder":
+                self._folders_changed()
+            self._indexed(normalized)
 
-            try:
-                self._prune_trash_capacity()
-            except OSError:
-                # The delete is already committed. Retention can be retried;
-                # returning an error would falsely invite a second delete.
-                LOGGER.warning("trash retention cleanup failed")
+            if prune:
+                self._try_prune_trash()
 
         return metadata
 
+    def _try_prune_trash(self) -> None:
+        try:
+            self._prune_trash_capacity()
+        except OSError:
+            # The delete is already committed. Retention can be retried;
+            # returning an error would falsely invite a second delete.
+            LOGGER.warning("trash retention cleanup failed")
+
     def delete_with_external_snapshot(self, relative_path: str) -> dict[str, Any]:
         """Delete after a caller has durably captured its own recovery snapshot.
 
@@ -691,11 +1173,12 @@ class LocalDocumentStorage:
         restore record that conflicts after an agent rollback.
         """
         source, normalized = self._resolve(relative_path, allow_root=False)
-        with resource_lock(self.root):
+        with self._locks.exclusive(normalized):
             if not source.exists():
                 raise DocumentNotFound("document or folder does not exist")
             if source.is_symlink():
                 raise DocumentPathError("symbolic links cannot be deleted")
+            size = self._path_size(source)
             if source.is_file():
                 source.unlink()
                 item_type = "file"
@@ -704,24 +1187,16 @@ class LocalDocumentStorage:
                 item_type = "folder"
             else:
                 raise DocumentValidationError("unsupported document type")
+            self._account(-size)
+            if item_type == "folder":
+                self._folders_changed()
+            self._indexed(normalized)
         return {"path": normalized, "item_type": item_type}
 
     def list_trash(self) -> list[dict[str, Any]]:
-        records: list[dict[str, Any]] = []
-        with resource_lock(self.trash_root):
-            for record, _, _ in reversed(self._trash_records()):
-                metadata_path = record / "metadata.json"
-                payload = record / "payload"
-                if not metadata_path.is_file() or not payload.exists():
-                    continue
-                try:
-                    with open(metadata_path, encoding="utf-8") as stream:
-                        value = json.load(stream)
-                    if isinstance(value, dict):
-                        records.append(value)
-                except (OSError, ValueError):
-                    continue
-        return records
+        with resource_lock(self.trash_root, shared=True):
+            entries = self._trash_ledger.newest()
+        return [dict(entry.metadata) for entry in entries if entry.metadata is not None]
 
     def restore(self, trash_id: str) -> dict[str, Any]:
         try:
@@ -732,35 +1207,38 @@ class LocalDocumentStorage:
         except (PathValidationError, FileNotFoundError) as exc:
             raise DocumentNotFound("回收站项目不存在") from exc
 
-        with resource_lock(self.root), resource_lock(self.trash_root):
-            metadata_path = record / "metadata.json"
+        # Library locks precede the trash lock, so the destination is read
+        # once to know what to lock and then confirmed under both locks.
+        with resource_lock(self.trash_root, shared=True):
+            _, _, locked_path = self._trash_destination(record)
+        with self._locks.exclusive(locked_path), resource_lock(self.trash_root):
+            metadata, destination, normalized = self._trash_destination(record)
+            if normalized != locked_path:
+                raise DocumentNotFound("回收站项目不存在")
             payload = record / "payload"
-            try:
-                with open(metadata_path, encoding="utf-8") as stream:
-                    metadata = json.load(stream)
-                original = metadata["original_path"]
-                if not isinstance(original, str):
-                    raise ValueError("invalid original path")
-                destination, normalized = self._resolve(original, allow_root=False)
-            except (OSError, ValueError, KeyError, TypeError) as exc:
-                raise DocumentValidationError("回收站元数据损坏") from exc
-
             if not payload.exists():
+                self._trash_ledger.remove(clean_id)
                 raise DocumentNotFound("回收站项目不存在")
             if destination.exists():
                 raise DocumentAlreadyExists("原位置已有同名项目")
-            self._ensure_library_capacity(self._path_size(payload))
+            size = self._path_size(payload)
             try:
-                destination.parent.mkdir(parents=True, exist_ok=True)
-                shutil.move(os.fspath(payload), os.fspath(destination))
+                with self._capacity_reserved(size):
+                    destination.parent.mkdir(parents=True, exist_ok=True)
+                    shutil.move(os.fspath(payload), os.fspath(destination))
+                    self._account(size)
             except PermissionError as exc:
                 raise DocumentPermissionDenied("权限不足，无法恢复项目") from exc
+            self._trash_ledger.remove(clean_id)
+            # Restoring may recreate missing parents as well as the item.
+            self._folders_changed()
+            self._indexed(normalized)
 
             # Moving the payload into the library is the restore commit point.
             # A later metadata cleanup error must not turn a successful restore
             # into a false failure that encourages a conflicting retry.
             try:
-                metadata_path.unlink(missing_ok=True)
+                (record / "metadata.json").unlink(missing_ok=True)
                 record.rmdir()
             except OSError:
                 LOGGER.warning(
@@ -775,52 +1253,249 @@ class LocalDocumentStorage:
             "item_type": metadata.get("item_type", "file"),
         }
 
-    def folders(self) -> list[dict[str, Any]]:
-        folders: list[dict[str, Any]] = [{"path": "", "name": "📁 根目录", "level": 0}]
-        with resource_lock(self.root):
-            stack: list[tuple[Path, str]] = [(self.root, "")]
-            while stack:
-                directory, prefix = stack.pop()
+    def _trash_destination(self, record: Path) -> tuple[dict[str, Any], Path, str]:
+        try:
+            with open(record / "metadata.json", encoding="utf-8") as stream:
+                metadata = json.load(stream)
+            original = metadata["original_path"]
+            if not isinstance(original, str):
+                raise ValueError("invalid original path")
+            destination, normalized = self._resolve(original, allow_root=False)
+        except FileNotFoundError as exc:
+            raise DocumentNotFound("回收站项目不存在") from exc
+        except (OSError, ValueError, KeyError, TypeError) as exc:
+            raise DocumentValidationError("回收站元数据损坏") from exc
+        return metadata, destination, normalized
+
+    def batch(
+        self,
+        operations: Sequence[Mapping[str, Any]],
+        *,
+        atomic: bool = False,
+    ) -> dict[str, Any]:
+        """Apply an ordered list of mutations under one path-lock acquisition.
+
+        Every operation is validated and its lock set computed before anything
+        runs; an invalid operation rejects the whole batch with its ``index``
+        in the error details. The union of the lock sets is held for the whole
+        batch, so each operation's own locking is a reentrant no-op, and the
+        batch's net growth is checked against the quota and reserved once for
+        the whole batch instead of by each operation.
+
+        Without ``atomic`` a failed operation is reported and the rest still
+        run. With ``atomic`` the first failure stops the batch and the applied
+        operations are compensated in reverse order. The trash is pruned once
+        the batch has committed or rolled back, never between operations.
+        """
+        handlers = {
+            "create_folder": lambda op: self.create_folder(op["path"], op["name"]),
+            "create_file": lambda op: self.create_file(op["path"], op["name"], op["content"]),
+            "save": lambda op: self.save(
+                op["path"], op["content"], expected_version=op.get("expected_version")
+            ),
+            "move": lambda op: self.move(op["source"], op["target"]),
+            "rename": lambda op: self.rename(op["old_path"], op["new_name"]),
+            "delete": lambda op: self.delete(op["path"], prune=False),
+        }
+        locked: list[str] = []
+        for index, operation in enumerate(operations):
+            try:
+                if operation.get("op") not in handlers:
+                    raise DocumentValidationError("不支持的批量操作")
+                locked.extend(self._batch_lock_paths(operation))
+            except DocumentError as exc:
+                raise type(exc)(exc.message, details={**exc.details, "index": index}) from exc
+
+        results: list[dict[str, Any]] = []
+        compensations: list[tuple[dict[str, Any], Callable[[], Any]]] = []
+        failed = False
+        with self._locks.exclusive(*locked), self._batch_reserved(*self._batch_growth(operations)):
+            for index, operation in enumerate(operations):
+                entry: dict[str, Any] = {"index": index, "op": operation["op"]}
+                results.append(entry)
+                if failed and atomic:
+                    entry["status"] = "skipped"
+                    continue
                 try:
-                    with os.scandir(directory) as scan:
-                        entries = sorted(
-                            (
-                                entry
-                                for entry in scan
-                                if not entry.name.startswith(".")
-                                and entry.is_dir(follow_symlinks=False)
-                                and not entry.is_symlink()
-                            ),
-                            key=lambda entry: entry.name.casefold(),
-                            reverse=True,
-                        )
-                except (OSError, PermissionError):
+                    undo = self._batch_compensation(operation) if atomic else None
+                    result = handlers[operation["op"]](operation)
+                except DocumentError as exc:
+                    failed = True
+                    entry.update(
+                        status="failed",
+                        error={"code": exc.code, "message": exc.message, "details": exc.details},
+                    )
                     continue
-                for entry in entries:
-                    relative = f"{prefix}/{entry.name}" if prefix else entry.name
-                    folders.append(
-                        {
-                            "path": relative,
-                            "name": entry.name,
-                            "level": len(relative.split("/")),
-                        }
+                except BaseException:
+                    if atomic:
+                        self._compensate(compensations)
+                    raise
+                entry.update(status="applied", result=result)
+                if undo is not None:
+                    compensations.append((entry, partial(undo, result)))
+            if failed and atomic:
+                self._compensate(compensations)
+            if any(entry["op"] == "delete" and "result" in entry for entry in results):
+                with resource_lock(self.trash_root):
+                    self._try_prune_trash()
+
+        return {"committed": not failed, "results": results}
+
+    @contextmanager
+    def _batch_reserved(self, incoming_bytes: int, replaced_bytes: int) -> Iterator[None]:
+        """Reserve a batch's net growth once and skip its operations' own checks."""
+        with self._capacity_reserved(incoming_bytes, replaced_bytes):
+            self._batch_state.reserved = True
+            try:
+                yield
+            finally:
+                self._batch_state.reserved = False
+
+    def _batch_lock_paths(self, operation: Mapping[str, Any]) -> list[str]:
+        """Return the paths the operation's own method locks exclusively."""
+        kind = operation["op"]
+        if kind in {"create_folder", "create_file"}:
+            name = self._validated_name(operation["name"])
+            if kind == "create_file":
+                self._require_allowed_extension(name)
+                self._check_payload_size(len(operation["content"]))
+            _, parent = self._resolve(operation["path"], allow_root=True)
+            return [self._resolve(f"{parent}/{name}" if parent else name, allow_root=False)[1]]
+        if kind == "save":
+            self._check_payload_size(len(operation["content"]))
+            return [self._resolve(operation["path"], allow_root=False)[1]]
+        if kind == "move":
+            return [
+                self._resolve(operation["source"], allow_root=False)[1],
+                self._resolve(operation["target"], allow_root=True)[1],
+            ]
+        if kind == "rename":
+            _, old = self._resolve(operation["old_path"], allow_root=False)
+            name = self._validated_name(operation["new_name"])
+            parent = old.rpartition("/")[0]
+            return [old, self._resolve(f"{parent}/{name}" if parent else name, allow_root=False)[1]]
+        return [self._resolve(operation["path"], allow_root=False)[1]]
+
+    def _batch_growth(self, operations: Sequence[Mapping[str, Any]]) -> tuple[int, int]:
+        incoming = replaced = 0
+        for operation in operations:
+            if operation["op"] == "create_file":
+                incoming += len(operation["content"])
+            elif operation["op"] == "save":
+                incoming += len(operation["content"])
+                path, _ = self._resolve(operation["path"], allow_root=False)
+                with suppress(OSError):
+                    replaced += path.stat().st_size if path.is_file() else 0
+        return incoming, replaced
+
+    def _batch_compensation(
+        self,
+        operation: Mapping[str, Any],
+    ) -> Callable[[dict[str, Any]], Any]:
+        """Capture what is needed to undo ``operation`` before it runs."""
+        kind = operation["op"]
+        if kind in {"create_folder", "create_file"}:
+            return lambda result: self._discard_created(result["path"])
+        if kind == "save":
+            path, _ = self._resolve(operation["path"], allow_root=False)
+            try:
+                previous = path.read_bytes()
+            except OSError:
+                # The save itself will fail on the same path.
+                previous = b""
+            return lambda result: self.save(result["path"], previous)
+        if kind == "move":
+            return lambda result: self.relocate(result["new_path"], result["source_path"])
+        if kind == "rename":
+            return lambda result: self.relocate(result["new_path"], result["old_path"])
+        return lambda result: self.restore(result["id"])
+
+    def _discard_created(self, relative_path: str) -> None:
+        path, normalized = self._resolve(relative_path, allow_root=False)
+        if path.is_dir():
+            path.rmdir()
+            self._folders_changed()
+        else:
+            size = path.stat().st_size
+            path.unlink()
+            self._account(-size)
+        self._indexed(normalized)
+
+    @staticmethod
+    def _compensate(compensations: list[tuple[dict[str, Any], Callable[[], Any]]]) -> None:
+        for entry, undo in reversed(compensations):
+            try:
+                undo()
+            except Exception:
+                LOGGER.exception(
+                    "batch compensation failed",
+                    extra={"index": entry["index"], "op": entry["op"]},
+                )
+                entry["status"] = "rollback_failed"
+            else:
+                entry["status"] = "rolled_back"
+
+    def folders(self) -> list[dict[str, Any]]:
+        return self.folder_tree()[0]
+
+    def folder_tree(self) -> tuple[list[dict[str, Any]], int]:
+        """Return the sorted folder tree and the generation it belongs to.
+
+        The tree is rebuilt only after a mutation that can add, remove, or
+        rename a folder; the generation changes exactly when it may differ.
+        """
+        with self._locks.shared(""), self._folder_tree_lock:
+            if self._folder_tree is None:
+                self._folder_tree = self._scan_folders()
+            return list(self._folder_tree), self._folder_generation
+
+    def _scan_folders(self) -> list[dict[str, Any]]:
+        folders: list[dict[str, Any]] = [{"path": "", "name": "📁 根目录", "level": 0}]
+        stack: list[tuple[Path, str]] = [(self.root, "")]
+        while stack:
+            directory, prefix = stack.pop()
+            try:
+                with os.scandir(directory) as scan:
+                    entries = sorted(
+                        (
+                            entry
+                            for entry in scan
+                            if not entry.name.startswith(".")
+                            and entry.is_dir(follow_symlinks=False)
+                            and not entry.is_symlink()
+                        ),
+                        key=lambda entry: entry.name.casefold(),
+                        reverse=True,
                     )
-                    stack.append((Path(entry.path), relative))
+            except (OSError, PermissionError):
+                continue
+            for entry in entries:
+                relative = f"{prefix}/{entry.name}" if prefix else entry.name
+                folders.append(
+                    {
+                        "path": relative,
+                        "name": entry.name,
+                        "level": len(relative.split("/")),
+                    }
+                )
+                stack.append((Path(entry.path), relative))
 
         root = folders[0]
         remainder = sorted(folders[1:], key=lambda item: item["path"].casefold())
         return [root, *remainder]
 
     def check_updates(self, directory_path: str = "", file_path: str = "") -> dict[str, Any]:
-        directory, _ = self._resolve(directory_path, allow_root=True)
+        directory, directory_normalized = self._resolve(directory_path, allow_root=True)
+        locked = [directory_normalized]
         file_candidate: Path | None = None
         if file_path:
-            file_candidate, _ = self._resolve(file_path, allow_root=False)
+            file_candidate, file_normalized = self._resolve(file_path, allow_root=False)
+            locked.append(file_normalized)
 
         dir_mtime = 0.0
         file_mtime = 0.0
         version: str | None = None
-        with resource_lock(self.root):
+        with self._locks.shared(*locked):
             if directory.is_dir():
                 try:
                     dir_mtime = directory.stat().st_mtime
@@ -839,8 +1514,9 @@ class LocalDocumentStorage:
             if file_candidate is not None and file_candidate.is_file():
                 self._require_document(file_candidate, relative_to_root(self.root, file_candidate))
                 try:
-                    file_mtime = file_candidate.stat().st_mtime
-                    version = file_version(file_candidate)
+                    stat_info = file_candidate.stat()
+                    file_mtime = stat_info.st_mtime
+                    version = cached_file_version(file_candidate, stat_info)
                 except OSError:
                     pass
 
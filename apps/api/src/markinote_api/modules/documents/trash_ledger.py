@@ -0,0 +1,275 @@
+"""Append-only ledger of trash records.
+
+Retention and listing used to walk every trash record, sizing each payload
+and opening each ``metadata.json``. The ledger keeps one JSON line per event
+in the trash root instead: ``add`` lines carry a record's id, payload size,
+mtime and listing metadata, ``remove`` lines retire an id. Pruning and
+listing then work from memory and touch only the records they return or
+delete.
+
+The file is compacted to its live ``add`` lines once retired lines outnumber
+them. When it is missing or unreadable it is rebuilt from the record
+directories. On first load the record names on disk are compared with the
+ledger once, so a crash between moving a payload and appending its line
+cannot leave a record that retention never sees. Callers hold the trash
+resource lock; other worker processes' appends are picked up by reading the
+file's new tail, and their compactions by reloading the replaced file.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from collections.abc import Callable
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from markinote_api.platform.io import atomic_write_bytes
+from markinote_api.platform.paths import PathValidationError, validate_storage_id
+
+LOGGER = logging.getLogger(__name__)
+
+LEDGER_NAME = ".ledger.jsonl"
+_MIN_GARBAGE = 64
+
+
+@dataclass(frozen=True, slots=True)
+class TrashEntry:
+    """One trash record as the ledger knows it.
+
+    ``metadata`` is the record's ``metadata.json`` content, or ``None`` when
+    it was unreadable at rebuild time; such records still count towards
+    retention but are not listed.
+    """
+
+    id: str
+    size: int
+    mtime: float
+    metadata: dict[str, Any] | None
+
+    def line(self) -> bytes:
+        value = {"op": "add", "id": self.id, "size": self.size, "mtime": self.mtime,
+                 "metadata": self.metadata}
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+class TrashLedger:
+    def __init__(self, trash_root: Path, measure: Callable[[Path], int]) -> None:
+        self.trash_root = trash_root
+        self.path = trash_root / LEDGER_NAME
+        self._measure = measure
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, TrashEntry] = OrderedDict()
+        self._total_bytes = 0
+        self._garbage = 0
+        self._identity: tuple[int, int] | None = None
+        self._offset = 0
+        self._loaded = False
+
+    def newest(self) -> list[TrashEntry]:
+        """Return the live records, newest first."""
+        with self._lock:
+            self._sync()
+            return list(reversed(self._entries.values()))
+
+    def prune(
+        self,
+        *,
+        max_items: int,
+        max_bytes: int,
+        discard: Callable[[str], None],
+    ) -> None:
+        """Discard the oldest records until both limits hold; zero disables one.
+
+        ``discard`` deletes a record's directory. Only the records removed are
+        visited, so a delete within the limits costs nothing here.
+        """
+        with self._lock:
+            self._sync()
+            while self._entries and (
+                (max_items and len(self._entries) > max_items)
+                or (max_bytes and self._total_bytes > max_bytes)
+            ):
+                oldest = next(iter(self._entries))
+                discard(oldest)
+                self._retire(oldest)
+            if self._garbage >= max(_MIN_GARBAGE, len(self._entries)):
+                self._compact()
+
+    def add(self, entry: TrashEntry) -> None:
+        with self._lock:
+            self._sync()
+            self._apply({"op": "add", "id": entry.id, "size": entry.size,
+                         "mtime": entry.mtime, "metadata": entry.metadata})
+            self._append(entry.line())
+
+    def remove(self, record_id: str) -> None:
+        with self._lock:
+            self._sync()
+            if record_id not in self._entries:
+                return
+            self._retire(record_id)
+            if self._garbage >= max(_MIN_GARBAGE, len(self._entries)):
+                self._compact()
+
+    def rebuild(self) -> None:
+        """Discard the ledger and rebuild it from the record directories."""
+        with self._lock:
+            self._rebuild()
+
+    def _retire(self, record_id: str) -> None:
+        self._apply({"op": "remove", "id": record_id})
+        self._append(json.dumps({"op": "remove", "id": record_id}).encode("utf-8") + b"\n")
+
+    def _apply(self, event: dict[str, Any]) -> None:
+        record_id = event["id"]
+        previous = self._entries.pop(record_id, None)
+        if previous is not None:
+            self._total_bytes -= previous.size
+            self._garbage += 1
+        if event["op"] == "add":
+            metadata = event.get("metadata")
+            entry = TrashEntry(
+                record_id,
+                int(event["size"]),
+                float(event["mtime"]),
+                metadata if isinstance(metadata, dict) else None,
+            )
+            self._entries[record_id] = entry
+            self._total_bytes += entry.size
+        else:
+            self._garbage += 1
+
+    def _append(self, line: bytes) -> None:
+        try:
+            with open(self.path, "ab") as stream:
+                stream.write(line)
+                stream.flush()
+                os.fsync(stream.fileno())
+                self._offset = stream.tell()
+        except OSError:
+            # The in-memory state already includes the event; forcing a
+            # reload makes the next caller rebuild from disk instead of
+            # trusting a file that may be missing it.
+            LOGGER.warning("trash ledger append failed", exc_info=True)
+            self._loaded = False
+
+    def _sync(self) -> None:
+        try:
+            stat_info = self.path.stat()
+        except FileNotFoundError:
+            self._rebuild()
+            return
+        identity = (stat_info.st_dev, stat_info.st_ino)
+        if not self._loaded or identity != self._identity or stat_info.st_size < self._offset:
+            self._load(check_disk=not self._loaded)
+        elif stat_info.st_size > self._offset:
+            try:
+                self._read_from(self._offset)
+            except (OSError, ValueError, KeyError, TypeError):
+                self._load(check_disk=True)
+
+    def _load(self, *, check_disk: bool) -> None:
+        self._entries.clear()
+        self._total_bytes = 0
+        self._garbage = 0
+        try:
+            stat_info = self.path.stat()
+            self._identity = (stat_info.st_dev, stat_info.st_ino)
+            self._read_from(0)
+        except (OSError, ValueError, KeyError, TypeError):
+            LOGGER.warning("trash ledger unreadable; rebuilding from disk", exc_info=True)
+            self._rebuild()
+            return
+        self._loaded = True
+        if check_disk:
+            self._reconcile()
+
+    def _read_from(self, offset: int) -> None:
+        with open(self.path, "rb") as stream:
+            stream.seek(offset)
+            data = stream.read()
+        # A torn final line is left for the next read once it is complete.
+        complete = data.rfind(b"\n") + 1
+        for line in data[:complete].splitlines():
+            if line.strip():
+                event = json.loads(line)
+                if event.get("op") not in {"add", "remove"} or not isinstance(event.get("id"), str):
+                    raise ValueError("invalid trash ledger event")
+                self._apply(event)
+        self._offset = offset + complete
+
+    def _reconcile(self) -> None:
+        """Fold record directories the ledger missed, and drop vanished ones."""
+        on_disk = set(self._record_names())
+        missing = on_disk.difference(self._entries)
+        vanished = set(self._entries).difference(on_disk)
+        if not missing and not vanished:
+            return
+        for record_id in vanished:
+            self._apply({"op": "remove", "id": record_id})
+        scanned = [entry for entry in map(self._scan_record, missing) if entry is not None]
+        for entry in sorted(scanned, key=lambda item: (item.mtime, item.id)):
+            self._apply({"op": "add", "id": entry.id, "size": entry.size,
+                         "mtime": entry.mtime, "metadata": entry.metadata})
+        self._compact()
+
+    def _rebuild(self) -> None:
+        self._entries.clear()
+        self._total_bytes = 0
+        self._garbage = 0
+        scanned = [entry for entry in map(self._scan_record, self._record_names()) if entry is not None]
+        for entry in sorted(scanned, key=lambda item: (item.mtime, item.id)):
+            self._entries[entry.id] = entry
+            self._total_bytes += entry.size
+        self._compact()
+
+    def _compact(self) -> None:
+        content = b"".join(entry.line() for entry in self._entries.values())
+        try:
+            atomic_write_bytes(self.path, content)
+            stat_info = self.path.stat()
+        except OSError:
+            LOGGER.warning("trash ledger compaction failed", exc_info=True)
+            self._loaded = False
+            return
+        self._identity = (stat_info.st_dev, stat_info.st_ino)
+        self._offset = len(content)
+        self._garbage = 0
+        self._loaded = True
+
+    def _record_names(self) -> list[str]:
+        try:
+            entries = list(os.scandir(self.trash_root))
+        except FileNotFoundError:
+            return []
+        names = []
+        for entry in entries:
+            try:
+                validate_storage_id(entry.name)
+            except PathValidationError:
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                names.append(entry.name)
+        return names
+
+    def _scan_record(self, record_id: str) -> TrashEntry | None:
+        record = self.trash_root / record_id
+        try:
+            size = self._measure(record / "payload")
+            mtime = record.stat().st_mtime
+        except OSError:
+            return None
+        metadata: dict[str, Any] | None = None
+        try:
+            with open(record / "metadata.json", encoding="utf-8") as stream:
+                value = json.load(stream)
+            if isinstance(value, dict) and (record / "payload").exists():
+                metadata = value
+        except (OSError, ValueError):
+            pass
+        return TrashEntry(record_id, size, mtime, metadata)
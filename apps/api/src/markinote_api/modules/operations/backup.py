@@ -13,6 +13,7 @@ from datetime import UTC, datetime, timedelta
 from pathlib import Path
 
 from markinote_api.platform.io import atomic_write_json, resource_lock
+from markinote_api.platform.path_locks import path_locks
 from markinote_api.platform.paths import resolve_under_root, validate_storage_id
 
 LOGGER = logging.getLogger(__name__)
@@ -43,6 +44,7 @@ class BackupManager:
         *,
         active_lease_seconds=10 * 60,
         now: Callable[[], datetime] | None = None,
+        on_library_change: Callable[[str], None] | None = None,
     ):
         self.backup_dir = Path(backup_dir).resolve()
         self.library_dir = Path(library_dir).resolve()
@@ -51,6 +53,9 @@ class BackupManager:
         self.active_lease = timedelta(seconds=max(1, int(active_lease_seconds)))
         self._now = now or (lambda: datetime.now(UTC))
         self.owner_id = f'owner_{uuid.uuid4().hex}'
+        # Rollbacks write the library directly. The document adapter uses this
+        # hook to resynchronize its derived indexes for the touched paths.
+        self._on_library_change = on_library_change
         self.backup_dir.mkdir(parents=True, exist_ok=True)
         # Startup retention also recovers expired active groups left behind by
         # a terminated worker. Live groups from other workers remain leased.
@@ -212,11 +217,15 @@ class BackupManager:
         """Restore the before-image when a mutation cannot be finalized.
 
         This is intentionally allowed only while the group is active and is
-        called under the same library lock as the mutation. If compensation
+        called while the mutation still holds its path locks. If compensation
         itself fails, the manifest retains a verifiable recovery reference.
         """
         group_dir = self._group_dir(group_id)
-        with resource_lock(self.library_dir), resource_lock(group_dir):
+        # Library path locks precede the group lock, so the operation's paths
+        # are read first; a recorded operation never changes its paths.
+        with resource_lock(group_dir):
+            paths = self._operation_paths(group_dir, operation_index)
+        with path_locks(self.library_dir).exclusive(*paths), resource_lock(group_dir):
             if not group_dir.is_dir():
                 return False, 'backup group does not exist'
             manifest = self._load_manifest(group_dir)
@@ -232,7 +241,10 @@ class BackupManager:
             try:
                 if require_after_match:
                     self._assert_after_state_unchanged(group_dir, operation)
-                self._restore_before_state(group_dir, operation)
+                try:
+                    self._restore_before_state(group_dir, operation)
+                finally:
+                    self._library_changed(operation)
             except (OSError, ValueError, KeyError):
                 LOGGER.error(
                     "active mutation compensation failed",
@@ -264,6 +276,18 @@ class BackupManager:
             self._save_manifest(group_dir, manifest)
             return True, 'mutation was compensated from its before-image'
 
+    def _operation_paths(self, group_dir: Path, operation_index) -> list[str]:
+        if not group_dir.is_dir():
+            return []
+        for operation in self._load_manifest(group_dir).get('operations', []):
+            if isinstance(operation, dict) and operation.get('index') == operation_index:
+                return [
+                    value
+                    for value in (operation.get('path'), operation.get('target_path'))
+                    if isinstance(value, str)
+                ]
+        return []
+
     def prepare_command(self, group_id, operation_index, command_id):
         """Durably bind a command id before applying its filesystem mutation."""
         if not isinstance(command_id, str) or not command_id or len(command_id) > 128:
@@ -397,6 +421,18 @@ class BackupManager:
         if source.exists():
             operation['after_fingerprint'] = BackupManager._path_fingerprint(source)
 
+    def _library_changed(self, operation: dict) -> None:
+        if self._on_library_change is None:
+            return
+        for key in ('path', 'target_path'):
+            rel_path = operation.get(key)
+            if not isinstance(rel_path, str):
+                continue
+            try:
+                self._on_library_change(rel_path)
+            except Exception:
+                LOGGER.warning('library change listener failed', exc_info=True)
+
     def _restore_before_state(self, group_dir: Path, operation: dict):
         operation_type = operation.get('type')
         target = self._library_path(operation['path'])
@@ -430,7 +466,7 @@ class BackupManager:
             if manifest.get('state') == 'active':
                 return False, 'backup group is still active; rollback refused'
 
-        with resource_lock(self.library_dir), resource_lock(group_dir):
+        with path_locks(self.library_dir).exclusive(''), resource_lock(group_dir):
             # Cleanup takes this same per-group lock. The directory can vanish
             # between the optimistic check above and acquiring the lock.
             if not group_dir.is_dir():
@@ -450,7 +486,10 @@ class BackupManager:
                 if operation.get('rolled_back_at'):
                     continue
                 try:
-                    self._rollback_one(group_dir, operation)
+                    try:
+                        self._rollback_one(group_dir, operation)
+                    finally:
+                        self._library_changed(operation)
                     operation['rolled_back_at'] = self._utc_now().isoformat()
                     changed += 1
                 except RollbackRefusedError as error:
@@ -0,0 +1,158 @@
+"""Content-addressed cache of rendered Markdown previews.
+
+Entries are keyed by the SHA-256 of the normalized source together with a
+fingerprint of the renderer configuration, so identical documents share one
+entry across users and a renderer upgrade never serves stale HTML. The
+memory tier is an LRU bounded by the UTF-8 size of the cached HTML; the
+optional disk tier keeps entries across restarts, stored with relaxed
+durability because every entry can be rendered again.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from markinote_api.platform.io import atomic_write_bytes
+from markinote_api.platform.metrics import RENDER_CACHE, RENDER_CACHE_BYTES
+
+LOGGER = logging.getLogger(__name__)
+
+# Pruning the disk tier walks it, so it frees a margin below the budget.
+_DISK_PRUNE_RATIO = 0.9
+
+
+class RenderCache:
+    def __init__(
+        self,
+        max_bytes: int,
+        *,
+        fingerprint: str = "",
+        tier: str = "memory",
+        directory: str | os.PathLike[str] | None = None,
+        max_disk_bytes: int = 0,
+    ) -> None:
+        self.max_bytes = max(0, int(max_bytes))
+        self.fingerprint = fingerprint
+        # Metric label of the memory tier, so several caches report apart.
+        self.tier = tier
+        self.directory = Path(directory) if directory is not None and max_disk_bytes > 0 else None
+        self.max_disk_bytes = max(0, int(max_disk_bytes))
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[str, int]] = OrderedDict()
+        self._bytes = 0
+        self._disk_lock = threading.Lock()
+        self._disk_bytes: int | None = None
+
+    def key(self, source: str, *, kind: str = "markdown") -> str:
+        """Key ``source``; entries of different kinds never share a key."""
+        digest = hashlib.sha256(self.fingerprint.encode("utf-8"))
+        digest.update(f"\0{kind}\0".encode())
+        digest.update(source.encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key: str, *, memory_only: bool = False) -> str | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is not None:
+            RENDER_CACHE.labels(tier=self.tier, outcome="hit").inc()
+            return entry[0]
+        RENDER_CACHE.labels(tier=self.tier, outcome="miss").inc()
+        if self.directory is None or memory_only:
+            return None
+        path = self._disk_path(key)
+        try:
+            rendered = path.read_bytes().decode("utf-8")
+            # The file mtime is the disk tier's recency.
+            os.utime(path)
+        except (OSError, UnicodeDecodeError):
+            RENDER_CACHE.labels(tier="disk", outcome="miss").inc()
+            return None
+        RENDER_CACHE.labels(tier="disk", outcome="hit").inc()
+        self._remember(key, rendered, len(rendered.encode("utf-8")))
+        return rendered
+
+    def put(self, key: str, rendered: str, *, memory_only: bool = False) -> None:
+        encoded = rendered.encode("utf-8")
+        self._remember(key, rendered, len(encoded))
+        if self.directory is not None and not memory_only and len(encoded) <= self.max_disk_bytes:
+            self._store(key, encoded)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        RENDER_CACHE_BYTES.labels(tier=self.tier).set(0)
+
+    def _remember(self, key: str, rendered: str, size: int) -> None:
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (rendered, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+                RENDER_CACHE.labels(tier=self.tier, outcome="eviction").inc()
+            total = self._bytes
+        RENDER_CACHE_BYTES.labels(tier=self.tier).set(total)
+
+    def _disk_path(self, key: str) -> Path:
+        assert self.directory is not None
+        return self.directory / key[:2] / f"{key}.html"
+
+    def _store(self, key: str, encoded: bytes) -> None:
+        path = self._disk_path(key)
+        try:
+            existed = path.exists()
+            atomic_write_bytes(path, encoded, durability="relaxed")
+        except OSError:
+            LOGGER.warning("render cache write failed", exc_info=True)
+            return
+        with self._disk_lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(size for _, size, _ in self._disk_files())
+            elif not existed:
+                self._disk_bytes += len(encoded)
+            if self._disk_bytes > self.max_disk_bytes:
+                self._prune_disk()
+            RENDER_CACHE_BYTES.labels(tier="disk").set(self._disk_bytes)
+
+    def _disk_files(self) -> list[tuple[float, int, Path]]:
+        assert self.directory is not None
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if not name.endswith(".html"):
+                    continue
+                path = Path(root) / name
+                try:
+                    stat_info = path.stat()
+                except OSError:
+                    continue
+                files.append((stat_info.st_mtime, stat_info.st_size, path))
+        return files
+
+    def _prune_disk(self) -> None:
+        """Delete the least recently used files; hold the disk lock."""
+        files = sorted(self._disk_files())
+        total = sum(size for _, size, _ in files)
+        target = int(self.max_disk_bytes * _DISK_PRUNE_RATIO)
+        for _, size, path in files:
+            if total <= target:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+            RENDER_CACHE.labels(tier="disk", outcome="eviction").inc()
+        self._disk_bytes = total
@@ -0,0 +1,56 @@
+"""Memoized Pygments highlighting for Markdown code blocks.
+
+Lexing dominates the cost of highlighting, and guessing the language of an
+unlabeled fence tries every Pygments lexer. Identical code blocks recur across
+documents and across re-renders of an edited document, so the highlighted
+HTML is cached under a hash of the code and every option that shapes it.
+
+Python-Markdown's ``codehilite`` and ``fenced_code`` extensions construct
+``CodeHilite`` from their module globals; ``install`` points both at the
+memoizing subclass. The rendering service is the only Markdown user in the
+process.
+"""
+from __future__ import annotations
+
+from markdown.extensions import codehilite, fenced_code
+
+from markinote_api.modules.rendering.cache import RenderCache
+
+_cache: RenderCache | None = None
+
+
+class _MemoizedCodeHilite(codehilite.CodeHilite):
+    def hilite(self, shebang: bool = True) -> str:
+        cache = _cache
+        if cache is None:
+            return super().hilite(shebang)
+        key = cache.key(
+            repr(
+                (
+                    self.lang,
+                    self.guess_lang,
+                    self.use_pygments,
+                    self.lang_prefix,
+                    self.pygments_formatter,
+                    sorted(self.options.items()),
+                    shebang,
+                    self.src,
+                )
+            )
+        )
+        highlighted = cache.get(key, memory_only=True)
+        if highlighted is None:
+            highlighted = super().hilite(shebang)
+            cache.put(key, highlighted, memory_only=True)
+        return highlighted
+
+
+def configure_highlight_cache(cache: RenderCache | None) -> None:
+    """Use ``cache`` for highlighted code blocks; ``None`` disables the memo."""
+    global _cache
+    _cache = cache
+
+
+def install() -> None:
+    codehilite.CodeHilite = _MemoizedCodeHilite  # type: ignore[misc]
+    fenced_code.CodeHilite = _MemoizedCodeHilite  # type: ignore[attr-defined]
@@ -0,0 +1,368 @@
+"""Single-pass post-processing of rendered Markdown HTML.
+
+The renderer used to parse its output twice: BeautifulSoup prefixed heading
+IDs and rewrote local anchors, and bleach parsed the result again with
+html5lib to enforce the allowlist. ``postprocess_html`` does both in one
+``html.parser`` pass and reproduces that pipeline's output byte for byte:
+BeautifulSoup's tree repair and whitespace handling, the ``md-`` ID mapping,
+bleach's URI checks, attribute ordering and escaping, including its quirks.
+
+html5lib also restructures some markup while building its tree: blocks
+opened inside paragraphs, misplaced table parts, nested links, raw-text
+elements and declarations. Markdown never produces them, and user HTML
+rarely does; when the input contains any of them the function returns
+``None`` and the caller runs the two-parser pipeline instead. The same goes
+for comments that are not closed by the first ``-->`` (``<!-->``, ``--!>``,
+unterminated ones), where the two parsers disagree on what is hidden, and
+for form feeds, which html.parser and html5lib normalize differently.
+"""
+from __future__ import annotations
+
+import re
+from collections.abc import Callable, Collection
+from html.entities import html5 as _HTML5_ENTITIES
+from html.parser import HTMLParser
+
+# BeautifulSoup's empty-element tags; they never hold content.
+_VOID_ELEMENTS = frozenset({
+    'area', 'base', 'basefont', 'bgsound', 'br', 'col', 'command', 'embed', 'frame',
+    'hr', 'image', 'img', 'input', 'isindex', 'keygen', 'link', 'menuitem', 'meta',
+    'nextid', 'param', 'source', 'spacer', 'track', 'wbr',
+})
+# Elements whose content html.parser, BeautifulSoup or html5lib treat as
+# something other than ordinary markup.
+_SPECIAL_CONTENT_ELEMENTS = frozenset({
+    'iframe', 'noembed', 'noframes', 'noscript', 'plaintext', 'rp', 'rt', 'script',
+    'style', 'template', 'textarea', 'title', 'xmp',
+})
+# Stripped start tags of these become a newline, as in bleach.
+_BLOCK_LEVEL = frozenset({
+    'address', 'article', 'aside', 'blockquote', 'details', 'dialog', 'dd', 'div', 'dl',
+    'dt', 'fieldset', 'figcaption', 'figure', 'footer', 'form', 'h1', 'h2', 'h3', 'h4',
+    'h5', 'h6', 'header', 'hgroup', 'hr', 'li', 'main', 'nav', 'ol', 'p', 'pre',
+    'section', 'table', 'ul',
+})
+_HEADINGS = frozenset({'h1', 'h2', 'h3', 'h4', 'h5', 'h6'})
+# Start tags that make html5lib close an open paragraph.
+_CLOSES_PARAGRAPH = _HEADINGS | {
+    'blockquote', 'dd', 'details', 'div', 'dl', 'dt', 'hr', 'li', 'ol', 'p', 'pre',
+    'summary', 'table', 'ul',
+}
+_TABLE_CHILDREN = {
+    'table': frozenset({'caption', 'thead', 'tbody', 'tfoot'}),
+    'thead': frozenset({'tr'}),
+    'tbody': frozenset({'tr'}),
+    'tfoot': frozenset({'tr'}),
+    'tr': frozenset({'td', 'th'}),
+}
+_REQUIRED_PARENTS = {
+    'caption': frozenset({'table'}),
+    'thead': frozenset({'table'}),
+    'tbody': frozenset({'table'}),
+    'tfoot': frozenset({'table'}),
+    'tr': frozenset({'thead', 'tbody', 'tfoot'}),
+    'td': frozenset({'tr'}),
+    'th': frozenset({'tr'}),
+    'li': frozenset({'ol', 'ul'}),
+    'dd': frozenset({'dl'}),
+    'dt': frozenset({'dl'}),
+}
+_URI_ATTRIBUTES = frozenset({'href', 'src'})
+_ASCII_SPACES = frozenset(' \n\t\x0c\r')
+_ENTITIES = {name.removesuffix(';'): value for name, value in _HTML5_ENTITIES.items()}
+_NAME_RE = re.compile(r'[a-z][a-z0-9_.:-]*\Z')
+_UNSUPPORTED_CHARACTERS_RE = re.compile('[\x00\x0c\r\ud800-\udfff]')
+_INVISIBLE_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+_URI_IGNORED_RE = re.compile(r'[`\000-\040\177-\240\s]+')
+_NON_ASCII_RE = re.compile(r'[^\x00-\x7f]')
+_SCHEME_CHARACTERS = frozenset('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789+-.')
+
+
+class _NeedsTreeRepair(Exception):
+    pass
+
+
+def _comments_well_formed(rendered: str) -> bool:
+    """Whether every ``<!`` opens a comment that both parsers end at the first ``-->``."""
+    start = rendered.find('<!')
+    while start != -1:
+        if not rendered.startswith('<!--', start):
+            return False
+        end = rendered.find('-->', start + 4)
+        if end == -1:
+            return False
+        body = rendered[start + 4:end]
+        if body.startswith(('>', '->')) or '--!>' in body:
+            return False
+        start = rendered.find('<!', end + 3)
+    return True
+
+
+def _escape(value: str) -> str:
+    return value.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def _attribute(name: str, value: str) -> str:
+    escaped = _escape(value)
+    if '"' not in value:
+        return f' {name}="{escaped}"'
+    if "'" in value:
+        return f' {name}="{escaped.replace(chr(34), "&quot;")}"'
+    # bleach re-escapes the ampersands of values it single-quotes.
+    return f" {name}='{escaped.replace('&', '&amp;')}'"
+
+
+def _uri_allowed(value: str, protocols: Collection[str]) -> bool:
+    """bleach's URI check, with the URL splitting of its vendored urllib."""
+    uri = _NON_ASCII_RE.sub('', _URI_IGNORED_RE.sub('', value)).lower()
+    scheme = ''
+    rest = uri
+    colon = uri.find(':')
+    if colon > 0 and all(character in _SCHEME_CHARACTERS for character in uri[:colon]):
+        remainder = uri[colon + 1:]
+        if not remainder or any(character not in '0123456789' for character in remainder):
+            scheme, rest = uri[:colon], remainder
+    if rest[:2] == '//':
+        netloc = re.split(r'[/?#]', rest[2:], maxsplit=1)[0]
+        if ('[' in netloc) != (']' in netloc):
+            return False
+    if scheme:
+        return scheme in protocols
+    if uri.startswith('#'):
+        return True
+    if ':' in uri and uri.split(':')[0] in protocols:
+        return True
+    return 'http' in protocols or 'https' in protocols
+
+
+class _PostProcessor(HTMLParser):
+    def __init__(
+        self,
+        tags: Collection[str],
+        attribute_filter: Callable[[str, str, str], bool],
+        protocols: Collection[str],
+    ) -> None:
+        super().__init__(convert_charrefs=False)
+        self.tags = tags
+        self.attribute_filter = attribute_filter
+        self.protocols = protocols
+        self.parts: list[str] = []
+        # Local links are resolved once every ID in the document is known.
+        self.anchors: list[tuple[int, list[tuple[str, str]]]] = []
+        self.ids: dict[str, str] = {}
+        self.used_ids: set[str] = set()
+        self.text: list[str] = []
+        # Open elements as BeautifulSoup nests them, and the allowed subset
+        # that html5lib builds its tree from.
+        self.open: list[str] = []
+        self.allowed_open: list[str] = []
+        self.closed_void: list[str] = []
+        self.emitted_tag = False
+        self.pre_pending = False
+
+    def handle_data(self, data: str) -> None:
+        self.text.append(data)
+
+    def handle_entityref(self, name: str) -> None:
+        self.text.append(_ENTITIES.get(name, f'&{name}'))
+
+    def handle_charref(self, name: str) -> None:
+        try:
+            codepoint = int(name[1:], 16) if name[:1] in ('x', 'X') else int(name)
+        except ValueError:
+            raise _NeedsTreeRepair from None
+        if (
+            not 0 < codepoint <= 0x10FFFF
+            or codepoint == 0x0D
+            or 0x80 <= codepoint <= 0x9F
+            or 0xD800 <= codepoint <= 0xDFFF
+        ):
+            raise _NeedsTreeRepair
+        self.text.append(chr(codepoint))
+
+    def handle_comment(self, data: str) -> None:
+        self._flush_text()
+        if self.pre_pending:
+            raise _NeedsTreeRepair
+
+    def handle_decl(self, decl: str) -> None:
+        raise _NeedsTreeRepair
+
+    def unknown_decl(self, data: str) -> None:
+        raise _NeedsTreeRepair
+
+    def handle_pi(self, data: str) -> None:
+        raise _NeedsTreeRepair
+
+    def handle_startendtag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        self._start(tag, attrs, close_void=False)
+        if tag not in _VOID_ELEMENTS:
+            self._end(tag)
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        self._start(tag, attrs, close_void=True)
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag in self.closed_void:
+            self.closed_void.remove(tag)
+            return
+        self._end(tag)
+
+    def finish(self) -> str:
+        self.close()
+        self._flush_text()
+        while self.open:
+            self._close(self.open.pop())
+        for index, attributes in self.anchors:
+            self.parts[index] = self._render_attributes(
+                [
+                    (name, '#' + self.ids[value[1:]] if name == 'href' and value[1:] in self.ids else value)
+                    for name, value in attributes
+                ]
+            )
+        return ''.join(self.parts)
+
+    def _flush_text(self) -> None:
+        if not self.text:
+            return
+        data = ''.join(self.text)
+        self.text.clear()
+        if 'pre' not in self.open and all(character in _ASCII_SPACES for character in data):
+            data = '\n' if '\n' in data else ' '
+        self._emit_text(data)
+
+    def _emit_text(self, data: str) -> None:
+        top = self.allowed_open[-1] if self.allowed_open else None
+        if top in _TABLE_CHILDREN and data.strip(' \n\t\x0c'):
+            raise _NeedsTreeRepair
+        if self.pre_pending:
+            self.pre_pending = False
+            if data.startswith('\n'):
+                data = data[1:]
+        self.parts.append(_INVISIBLE_RE.sub('?', _escape(data)))
+
+    def _start(self, tag: str, attrs: list[tuple[str, str | None]], *, close_void: bool) -> None:
+        self._flush_text()
+        if tag in _SPECIAL_CONTENT_ELEMENTS or not _NAME_RE.match(tag):
+            raise _NeedsTreeRepair
+        attributes: dict[str, str] = {}
+        for name, value in attrs:
+            if not _NAME_RE.match(name):
+                raise _NeedsTreeRepair
+            attributes[name] = '' if value is None else value
+        for name in ('class', 'rel') if tag == 'a' else ('class',):
+            if name in attributes:
+                attributes[name] = ' '.join(attributes[name].split())
+        self._prefix_id(attributes)
+        if tag == 'a' and 'href' in attributes and attributes.get('target') == '_blank':
+            attributes['rel'] = 'noopener noreferrer'
+
+        if tag not in _VOID_ELEMENTS:
+            self.open.append(tag)
+        elif close_void:
+            self.closed_void.append(tag)
+
+        emitted, self.emitted_tag = self.emitted_tag, True
+        if tag not in self.tags:
+            if self.pre_pending:
+                raise _NeedsTreeRepair
+            if emitted and tag in _BLOCK_LEVEL:
+                self._emit_text('\n')
+            return
+        self._check_structure(tag)
+        self.pre_pending = tag == 'pre'
+        if tag not in _VOID_ELEMENTS:
+            self.allowed_open.append(tag)
+
+        kept = []
+        for name, value in attributes.items():
+            if not self.attribute_filter(tag, name, _escape(value)):
+                continue
+            if name in _URI_ATTRIBUTES and not _uri_allowed(value, self.protocols):
+                continue
+            kept.append((name, value))
+        kept.sort()
+        self.parts.append(f'<{tag}')
+        if tag == 'a' and attributes.get('href', '').startswith('#'):
+            self.anchors.append((len(self.parts), kept))
+            self.parts.append('')
+        else:
+            self.parts.append(self._render_attributes(kept))
+        self.parts.append('>')
+
+    def _prefix_id(self, attributes: dict[str, str]) -> None:
+        old = attributes.get('id')
+        if not old:
+            return
+        base = 'md-' + re.sub(r'[^A-Za-z0-9_-]+', '-', old).strip('-')[:110]
+        if base == 'md-':
+            del attributes['id']
+            return
+        new = base
+        suffix = 2
+        while new in self.used_ids:
+            new = f'{base}-{suffix}'
+            suffix += 1
+        self.used_ids.add(new)
+        self.ids.setdefault(old, new)
+        attributes['id'] = new
+
+    def _check_structure(self, tag: str) -> None:
+        """Refuse markup that html5lib would not nest as written."""
+        top = self.allowed_open[-1] if self.allowed_open else None
+        if top in _TABLE_CHILDREN and tag not in _TABLE_CHILDREN[top]:
+            raise _NeedsTreeRepair
+        if tag in _REQUIRED_PARENTS and top not in _REQUIRED_PARENTS[tag]:
+            raise _NeedsTreeRepair
+        if tag in _CLOSES_PARAGRAPH and 'p' in self.allowed_open:
+            raise _NeedsTreeRepair
+        if tag in _HEADINGS and top in _HEADINGS:
+            raise _NeedsTreeRepair
+        if tag == 'a' and 'a' in self.allowed_open:
+            raise _NeedsTreeRepair
+        if self.pre_pending:
+            self.pre_pending = False
+
+    def _end(self, tag: str) -> None:
+        self._flush_text()
+        if tag in _VOID_ELEMENTS or tag not in self.open:
+            return
+        while True:
+            name = self.open.pop()
+            self._close(name)
+            if name == tag:
+                return
+
+    def _close(self, tag: str) -> None:
+        self.emitted_tag = True
+        if tag not in self.tags:
+            return
+        self.allowed_open.pop()
+        if tag == 'pre':
+            self.pre_pending = False
+        self.parts.append(f'</{tag}>')
+
+    @staticmethod
+    def _render_attributes(attributes: list[tuple[str, str]]) -> str:
+        return ''.join(_attribute(name, value) for name, value in attributes)
+
+
+def postprocess_html(
+    rendered: str,
+    *,
+    tags: Collection[str],
+    attribute_filter: Callable[[str, str, str], bool],
+    protocols: Collection[str],
+) -> str | None:
+    """Prefix IDs, resolve local anchors and sanitize ``rendered``.
+
+    Returns ``None`` for markup that needs HTML5 tree repair.
+    """
+    if _UNSUPPORTED_CHARACTERS_RE.search(rendered) or not _comments_well_formed(rendered):
+        return None
+    processor = _PostProcessor(tags, attribute_filter, protocols)
+    try:
+        processor.feed(rendered)
+        return processor.finish()
+    except _NeedsTreeRepair:
+        return None
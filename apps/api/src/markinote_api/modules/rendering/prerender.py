@@ -0,0 +1,85 @@
+"""Background rendering of saved documents.
+
+Document saves, creations and uploads schedule a render of the new content
+so that viewers of the saved document get HTML that is already stored under
+its content version. Rendering runs on one background thread, or in the
+render worker pool when that backend is configured. A version already
+rendered or already queued is skipped, and so is everything scheduled while
+``max_pending`` renders are waiting: the rendered-document endpoint renders
+a missing version on demand.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+
+from markinote_api.modules.documents.errors import DocumentError
+from markinote_api.modules.rendering.service import render_document, rendered_document
+from markinote_api.modules.rendering.workers import RenderProcessPool, RenderTimeout
+from markinote_api.platform.metrics import DOCUMENT_PRERENDERS
+
+LOGGER = logging.getLogger(__name__)
+
+
+class DocumentPrerenderer:
+    def __init__(
+        self,
+        *,
+        max_bytes: int,
+        pool: RenderProcessPool | None = None,
+        max_pending: int = 64,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.pool = pool
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="markinote-prerender")
+        self._lock = threading.Lock()
+        self._pending: set[str] = set()
+        self._closed = False
+
+    def schedule(self, version: str, load: Callable[[], str]) -> None:
+        """Render the content ``load`` returns and store it under ``version``.
+
+        ``load`` runs on the background thread; uploads pass one that reads
+        the stored document back.
+        """
+        with self._lock:
+            if self._closed or version in self._pending:
+                return
+            if len(self._pending) >= self.max_pending:
+                DOCUMENT_PRERENDERS.labels(outcome="dropped").inc()
+                return
+            self._pending.add(version)
+            self._executor.submit(self._prerender, version, load)
+
+    def _prerender(self, version: str, load: Callable[[], str]) -> None:
+        outcome = "failed"
+        try:
+            if rendered_document(version) is not None:
+                outcome = "cached"
+                return
+            content = load()
+            if len(content.encode("utf-8")) > self.max_bytes:
+                outcome = "skipped"
+                return
+            render_document(version, content, pool=self.pool)
+            outcome = "rendered"
+        except (DocumentError, UnicodeDecodeError):
+            # Removed, replaced or not text by the time it was loaded.
+            outcome = "skipped"
+        except RenderTimeout:
+            # The worker was replaced; a viewer gets the timeout on demand.
+            pass
+        except Exception:
+            LOGGER.warning("document pre-render failed", exc_info=True)
+        finally:
+            with self._lock:
+                self._pending.discard(version)
+            DOCUMENT_PRERENDERS.labels(outcome=outcome).inc()
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+        self._executor.shutdown(wait=True, cancel_futures=True)
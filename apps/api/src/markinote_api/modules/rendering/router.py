@@ -5,6 +5,8 @@ from fastapi import APIRouter, Request
 from pydantic import BaseModel, Field
 
 from markinote_api.modules.rendering.service import process_markdown
+from markinote_api.modules.rendering.workers import RenderTimeout
+from markinote_api.platform.errors import Problem
 
 router = APIRouter(prefix="/api/v1/rendering", tags=["rendering"])
 
@@ -21,12 +23,19 @@ class RenderMarkdownResponse(BaseModel):
 def render_markdown(body: RenderMarkdownRequest, request: Request) -> RenderMarkdownResponse:
     size = len(body.markdown.encode("utf-8"))
     if size > request.app.state.settings.max_preview_bytes:
-        from markinote_api.platform.errors import Problem
-
         raise Problem(
             413,
             "document_too_large",
             "Document too large",
             "The Markdown preview exceeds the configured limit.",
         )
-    return RenderMarkdownResponse(html=process_markdown(body.markdown))
+    try:
+        html = process_markdown(body.markdown, pool=request.app.state.render_pool)
+    except RenderTimeout:
+        raise Problem(
+            503,
+            "render_timeout",
+            "Preview timed out",
+            "The Markdown preview took longer than the configured render timeout.",
+        ) from None
+    return RenderMarkdownResponse(html=html)
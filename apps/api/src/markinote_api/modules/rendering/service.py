@@ -1,16 +1,27 @@
 """Markdown rendering with protected extensions and an HTML allowlist."""
 from __future__ import annotations
 
+import hashlib
 import html
+import os
 import re
+import threading
 import uuid
+import zlib
 from functools import lru_cache
+from importlib.metadata import PackageNotFoundError, version
+from pathlib import Path
 from re import Match
 
 import bleach
 import markdown
 from bs4 import BeautifulSoup
 
+from markinote_api.modules.rendering import highlight
+from markinote_api.modules.rendering.cache import RenderCache
+from markinote_api.modules.rendering.postprocess import postprocess_html
+from markinote_api.modules.rendering.workers import RenderProcessPool
+
 _FENCE_RE = re.compile(
     r'(?ms)^(?P<indent>[ ]{0,3})(?P<fence>`{3,}|~{3,})'
     r'(?P<lang>[^\n]*)\n(?P<code>.*?)^(?P=indent)(?P=fence)[ \t]*$',
@@ -24,6 +35,30 @@ _INLINE_MATH_PATTERNS = (
     re.compile(r'(?<!\\)(?<!\$)\$(?!\$)([^\n$]+?)\$(?!\$)'),
 )
 _INLINE_CODE_RE = re.compile(r'(?<!`)`(?!`)([^`\n]+)`(?!`)')
+_STRIKE_RE = re.compile(r'~~([^~\n]+?)~~')
+# Protected spans are restored by one substitution over the text instead of
+# one replace per span, which made documents with many spans quadratic.
+_SOURCE_PLACEHOLDER_RE = re.compile(r'(MN[0-9A-F]{32})(FENCE|INLINECODE)([0-9]+)END')
+_RENDERED_PLACEHOLDER_RE = re.compile(
+    r'(<p>)?(MN[0-9A-F]{32})(STRIKE|MERMAID|MATH|INLINECODE)([0-9]+)END(</p>)?'
+)
+
+# Constructs whose meaning depends on the whole document: reference and
+# footnote definitions, abbreviations, the TOC marker, raw HTML blocks,
+# which Python-Markdown lets span blank lines, and attribute lists with an
+# explicit ID, which the sanitizer deduplicates differently from the TOC.
+_DOCUMENT_GLOBAL_RE = re.compile(
+    r'(?m)^ {0,3}(?:\*?\[[^\]\n]+\]:|\[TOC\][ \t]*$|<[A-Za-z!/?])|\{[^}\n]*#[^}\n]*\}'
+)
+# Lines that continue the preceding block across a blank line: indented
+# content, list items, blockquotes and definitions.
+_CONTINUATION_RE = re.compile(r'[ \t]|[*+>-]|\d+[.)]|:[ \t]')
+_BLOCK_MIN_CHARS = 2 * 1024
+_BLOCK_MAX_CHARS = 32 * 1024
+_BLOCK_BOUNDARY_MODULUS = 4
+_ID_ATTRIBUTE_RE = re.compile(r' id="(md-[A-Za-z0-9_-]+)"')
+_LOCAL_HREF_RE = re.compile(r' href="#([^"]*)"')
+_ID_COUNT_RE = re.compile(r'^(.*)_([0-9]+)$')
 
 _ALLOWED_TAGS = {
     'a', 'abbr', 'b', 'blockquote', 'br', 'caption', 'code', 'dd', 'del', 'details',
@@ -47,20 +82,35 @@ _SAFE_CLASSES = {
 }
 
 
+_PROTOCOLS = frozenset({'http', 'https', 'mailto'})
+_GLOBAL_ATTRIBUTES = frozenset(_ALLOWED_ATTRIBUTES['*'])
+_ATTRIBUTES_BY_TAG = {
+    tag: _GLOBAL_ATTRIBUTES | frozenset(_ALLOWED_ATTRIBUTES.get(tag, ())) for tag in _ALLOWED_TAGS
+}
+_ID_VALUE_RE = re.compile(r'md-[A-Za-z0-9_-]{1,120}')
+_LANGUAGE_CLASS_RE = re.compile(r'language-[A-Za-z0-9_+-]{1,40}')
+_TOKEN_CLASS_RE = re.compile(r'[a-z][a-z0-9]{0,3}')
+
+
+@lru_cache(maxsize=4096)
+def _allow_class(tag: str, value: str) -> bool:
+    # Highlighted code repeats a few dozen token classes on every span.
+    classes = value.split()
+    return bool(classes) and all(
+        css_class in _SAFE_CLASSES
+        or (css_class.startswith('language-') and _LANGUAGE_CLASS_RE.fullmatch(css_class) is not None)
+        or (tag == 'span' and _TOKEN_CLASS_RE.fullmatch(css_class) is not None)
+        for css_class in classes
+    )
+
+
 def _allow_attribute(tag: str, name: str, value: str) -> bool:
-    allowed = set(_ALLOWED_ATTRIBUTES.get('*', ())) | set(_ALLOWED_ATTRIBUTES.get(tag, ()))
-    if name not in allowed:
+    if name not in _ATTRIBUTES_BY_TAG.get(tag, _GLOBAL_ATTRIBUTES):
         return False
     if name == 'id':
-        return value.startswith('md-') and bool(re.fullmatch(r'md-[A-Za-z0-9_-]{1,120}', value))
+        return _ID_VALUE_RE.fullmatch(value) is not None
     if name == 'class':
-        classes = value.split()
-        return bool(classes) and all(
-            css_class in _SAFE_CLASSES
-            or (css_class.startswith('language-') and bool(re.fullmatch(r'language-[A-Za-z0-9_+-]{1,40}', css_class)))
-            or (tag == 'span' and bool(re.fullmatch(r'[a-z][a-z0-9]{0,3}', css_class)))
-            for css_class in classes
-        )
+        return _allow_class(tag, value)
     if name in {'width', 'height'}:
         return value.isdigit() and 1 <= int(value) <= 10000
     if name == 'target':
@@ -70,11 +120,6 @@ def _allow_attribute(tag: str, name: str, value: str) -> bool:
     return True
 
 
-def _replace_wrapped_placeholder(rendered: str, placeholder: str, replacement: str) -> str:
-    rendered = rendered.replace(f'<p>{placeholder}</p>', replacement)
-    return rendered.replace(placeholder, replacement)
-
-
 def _prefix_document_ids(rendered: str) -> str:
     """Keep generated heading IDs useful without allowing DOM clobbering."""
     soup = BeautifulSoup(rendered, 'html.parser')
@@ -105,8 +150,24 @@ def _prefix_document_ids(rendered: str) -> str:
     return str(soup)
 
 
-@lru_cache(maxsize=16)
-def _render_cached(md_content: str) -> str:
+def _markdown_engine() -> markdown.Markdown:
+    """Return this thread's Markdown instance, reset for a new document.
+
+    Building an instance loads and configures every extension, which costs
+    more than converting a short document.
+    """
+    engine = getattr(_engines, 'markdown', None)
+    if engine is None:
+        engine = _engines.markdown = markdown.Markdown(
+            extensions=['extra', 'codehilite', 'sane_lists', 'nl2br', 'toc'],
+            extension_configs={'codehilite': {'css_class': 'highlight', 'linenums': False}},
+        )
+    else:
+        engine.reset()
+    return engine
+
+
+def _render(md_content: str) -> str:
     namespace = 'MN' + uuid.uuid4().hex.upper()
     fences: list[tuple[str, str, str]] = []
     inline_codes: list[str] = []
@@ -130,10 +191,19 @@ def _render_cached(md_content: str) -> str:
 
     protected = _INLINE_CODE_RE.sub(save_inline_code, protected)
 
+    def restore_source(match: Match[str]) -> str:
+        if match.group(1) != namespace:
+            return match.group(0)
+        index = int(match.group(3))
+        if match.group(2) == 'INLINECODE':
+            return inline_codes[index]
+        return fences[index][2]
+
     def save_math(kind: str):
         def replace(match: Match[str]) -> str:
             index = len(math_blocks)
-            math_blocks.append((kind, match.group(0)))
+            # A formula keeps the code spans and fences it encloses as source.
+            math_blocks.append((kind, _SOURCE_PLACEHOLDER_RE.sub(restore_source, match.group(0))))
             return f'{namespace}MATH{index}END'
         return replace
 
@@ -147,65 +217,263 @@ def _render_cached(md_content: str) -> str:
         strike_blocks.append(match.group(1))
         return f'{namespace}STRIKE{index}END'
 
-    protected = re.sub(r'~~([^~\n]+?)~~', save_strike, protected)
+    protected = _STRIKE_RE.sub(save_strike, protected)
 
-    for index, inline_code in enumerate(inline_codes):
-        protected = protected.replace(f'{namespace}INLINECODE{index}END', inline_code)
-
-    for index, (lang, code, original) in enumerate(fences):
-        placeholder = f'{namespace}FENCE{index}END'
+    def restore_fence_or_code(match: Match[str]) -> str:
+        if match.group(1) != namespace or match.group(2) == 'INLINECODE':
+            return restore_source(match)
+        lang, code, original = fences[int(match.group(3))]
         if lang.casefold().split()[0:1] == ['mermaid']:
-            mermaid_index = len(mermaid_blocks)
             mermaid_blocks.append(code)
-            protected = protected.replace(placeholder, f'{namespace}MERMAID{mermaid_index}END')
+            return f'{namespace}MERMAID{len(mermaid_blocks) - 1}END'
+        return original
+
+    protected = _SOURCE_PLACEHOLDER_RE.sub(restore_fence_or_code, protected)
+
+    rendered = _markdown_engine().convert(protected)
+
+    def restore_rendered(match: Match[str]) -> str:
+        opening, placeholder_namespace, kind, index, closing = match.groups()
+        if placeholder_namespace != namespace:
+            return match.group(0)
+        if kind == 'STRIKE':
+            # Struck text may enclose code spans and formulas.
+            text = _RENDERED_PLACEHOLDER_RE.sub(restore_rendered, html.escape(strike_blocks[int(index)]))
+            replacement = f'<del>{text}</del>'
+        elif kind == 'MERMAID':
+            code = mermaid_blocks[int(index)]
+            replacement = f'<pre><code class="language-mermaid">{html.escape(code.strip())}</code></pre>'
+        elif kind == 'MATH':
+            block, formula = math_blocks[int(index)]
+            tag, css_class = ('div', 'math-block') if block == 'block' else ('span', 'math-inline')
+            replacement = f'<{tag} class="{css_class}">{html.escape(formula)}</{tag}>'
         else:
-            protected = protected.replace(placeholder, original)
+            code = inline_codes[int(index)][1:-1].strip()
+            replacement = f'<code>{html.escape(code, quote=False)}</code>'
+        # A placeholder that markdown wrapped in a paragraph of its own replaces it.
+        if opening and closing:
+            return replacement
+        return (opening or '') + replacement + (closing or '')
 
-    rendered = markdown.markdown(
-        protected,
-        extensions=['extra', 'codehilite', 'sane_lists', 'nl2br', 'toc'],
-        extension_configs={'codehilite': {'css_class': 'highlight', 'linenums': False}},
-    )
+    rendered = _RENDERED_PLACEHOLDER_RE.sub(restore_rendered, rendered)
 
-    for index, text in enumerate(strike_blocks):
-        rendered = _replace_wrapped_placeholder(
-            rendered,
-            f'{namespace}STRIKE{index}END',
-            f'<del>{html.escape(text)}</del>',
-        )
+    return _sanitize(rendered)
 
-    for index, code in enumerate(mermaid_blocks):
-        rendered = _replace_wrapped_placeholder(
-            rendered,
-            f'{namespace}MERMAID{index}END',
-            f'<pre><code class="language-mermaid">{html.escape(code.strip())}</code></pre>',
-        )
 
-    for index, (kind, formula) in enumerate(math_blocks):
-        tag = 'div' if kind == 'block' else 'span'
-        css_class = 'math-block' if kind == 'block' else 'math-inline'
-        rendered = _replace_wrapped_placeholder(
-            rendered,
-            f'{namespace}MATH{index}END',
-            f'<{tag} class="{css_class}">{html.escape(formula)}</{tag}>',
-        )
+def _sanitize(rendered: str) -> str:
+    processed = postprocess_html(
+        rendered, tags=_ALLOWED_TAGS, attribute_filter=_allow_attribute, protocols=_PROTOCOLS
+    )
+    if processed is None:
+        processed = _sanitize_with_tree_repair(rendered)
+    return processed
 
-    rendered = _prefix_document_ids(rendered)
+
+def _sanitize_with_tree_repair(rendered: str) -> str:
+    """The two-parser pipeline, for markup html5lib has to restructure."""
     return bleach.clean(
-        rendered,
+        _prefix_document_ids(rendered),
         tags=_ALLOWED_TAGS,
         attributes=_allow_attribute,
-        protocols={'http', 'https', 'mailto'},
+        protocols=_PROTOCOLS,
         strip=True,
         strip_comments=True,
     )
 
 
-def process_markdown(md_content):
+def _mask(pattern: re.Pattern[str], text: str, spans: list[tuple[int, int]]) -> str:
+    """Blank out matches of ``pattern``, keeping offsets, and record their spans."""
+    def blank(match: Match[str]) -> str:
+        spans.append(match.span())
+        return ' ' * len(match.group(0))
+    return pattern.sub(blank, text)
+
+
+def _split_blocks(md_content: str) -> list[str]:
+    """Split a document into blocks that render the same on their own.
+
+    Boundaries are blank lines outside fences and block math, before a line
+    that cannot continue the previous block. Whether a boundary is used
+    depends on the line after it, so an edit only moves the boundaries next
+    to it and the other blocks keep their cache entries. Documents with
+    document-global constructs are returned as a single block.
+    """
+    if len(md_content) < 2 * _BLOCK_MIN_CHARS:
+        return [md_content]
+    spans: list[tuple[int, int]] = []
+    masked = _mask(_FENCE_RE, md_content, spans)
+    masked = _mask(_INLINE_CODE_RE, masked, [])
+    for pattern in _BLOCK_MATH_PATTERNS:
+        masked = _mask(pattern, masked, spans)
+    if _DOCUMENT_GLOBAL_RE.search(masked):
+        return [md_content]
+    spans.sort()
+    blocks: list[str] = []
+    start = 0
+    span_index = 0
+    offset = 0
+    previous_blank = False
+    for line in md_content.splitlines(keepends=True):
+        line_start, offset = offset, offset + len(line)
+        blank = not line.strip()
+        candidate = previous_blank and not blank and not _CONTINUATION_RE.match(line)
+        previous_blank = blank
+        if not candidate:
+            continue
+        while span_index < len(spans) and spans[span_index][1] <= line_start:
+            span_index += 1
+        if span_index < len(spans) and spans[span_index][0] < line_start:
+            continue
+        size = line_start - start
+        if size >= _BLOCK_MAX_CHARS or (
+            size >= _BLOCK_MIN_CHARS
+            and zlib.crc32(line.encode('utf-8')) % _BLOCK_BOUNDARY_MODULUS == 0
+        ):
+            blocks.append(md_content[start:line_start])
+            start = line_start
+    blocks.append(md_content[start:])
+    return blocks
+
+
+def _stitch_blocks(parts: list[str]) -> str:
+    """Join rendered blocks and make heading IDs and anchors document-wide.
+
+    Each block deduplicates its own IDs; a repeated ID from a later block
+    gets the next ``_1``, ``_2`` suffix, as the TOC extension would assign
+    it, and local links left unresolved by their block are pointed at the
+    first heading with the matching ID.
+    """
+    used: set[str] = set()
+
+    def unique(match: Match[str]) -> str:
+        value = match.group(1)
+        while value in used:
+            counted = _ID_COUNT_RE.match(value)
+            value = f'{counted.group(1)}_{int(counted.group(2)) + 1}' if counted else f'{value}_1'
+        used.add(value)
+        return f' id="{value}"'
+
+    rendered = _ID_ATTRIBUTE_RE.sub(unique, '\n'.join(parts))
+
+    def resolve(match: Match[str]) -> str:
+        target = match.group(1)
+        if target.startswith('md-'):
+            return match.group(0)
+        candidate = 'md-' + re.sub(r'[^A-Za-z0-9_-]+', '-', target).strip('-')[:110]
+        return f' href="#{candidate}"' if candidate in used else match.group(0)
+
+    return _LOCAL_HREF_RE.sub(resolve, rendered)
+
+
+def _render_blocks(md_content: str, cache: RenderCache) -> str:
+    blocks = _split_blocks(md_content)
+    if len(blocks) == 1:
+        return _render(md_content)
+    parts = []
+    for block in blocks:
+        # Blocks are rendered exactly as a document with that text would be,
+        # so they share the document key space, in memory only.
+        key = cache.key(block)
+        rendered = cache.get(key, memory_only=True)
+        if rendered is None:
+            rendered = _render(block)
+            cache.put(key, rendered, memory_only=True)
+        parts.append(rendered)
+    return _stitch_blocks(parts)
+
+
+def _renderer_fingerprint() -> str:
+    """Identify everything besides the source that shapes the rendered HTML."""
+    parts = [repr((sorted(_ALLOWED_TAGS), sorted(_ALLOWED_ATTRIBUTES.items()), sorted(_SAFE_CLASSES)))]
+    for package in ('markdown', 'Pygments', 'bleach', 'beautifulsoup4'):
+        try:
+            parts.append(f'{package}=={version(package)}')
+        except PackageNotFoundError:
+            parts.append(f'{package}==unknown')
+    for module in sorted(Path(__file__).parent.glob('*.py')):
+        parts.append(f'{module.name}:{hashlib.sha256(module.read_bytes()).hexdigest()}')
+    return hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()
+
+
+RENDERER_FINGERPRINT = _renderer_fingerprint()
+_engines = threading.local()
+highlight.install()
+
+
+def configure_render_cache(
+    max_bytes: int,
+    *,
+    directory: str | os.PathLike[str] | None = None,
+    max_disk_bytes: int = 0,
+    highlight_bytes: int = 8 * 1024 * 1024,
+) -> RenderCache:
+    """Replace the process-wide render and code-highlight caches.
+
+    A zero disk budget keeps rendered previews in memory only.
+    """
+    global _cache
+    _cache = RenderCache(
+        max_bytes,
+        fingerprint=RENDERER_FINGERPRINT,
+        directory=directory,
+        max_disk_bytes=max_disk_bytes,
+    )
+    highlight.configure_highlight_cache(
+        RenderCache(highlight_bytes, fingerprint=RENDERER_FINGERPRINT, tier='highlight')
+    )
+    return _cache
+
+
+_cache = configure_render_cache(32 * 1024 * 1024)
+
+
+def render_cache() -> RenderCache:
+    return _cache
+
+
+def _normalize(md_content: object) -> str:
     if not isinstance(md_content, str):
         raise TypeError('Markdown 内容必须为字符串')
     # Storage preserves authored line endings. Parsing a normalized copy makes
     # CRLF, CR, and LF documents equivalent while keeping the saved source byte
     # for byte and sharing one cache entry across line-ending variants.
-    normalized = md_content.replace('\r\n', '\n').replace('\r', '\n')
-    return _render_cached(normalized)
+    return md_content.replace('\r\n', '\n').replace('\r', '\n')
+
+
+def _render_normalized(normalized: str, cache: RenderCache, pool: RenderProcessPool | None) -> str:
+    return _render_blocks(normalized, cache) if pool is None else pool.render(normalized)
+
+
+def process_markdown(md_content, *, pool: RenderProcessPool | None = None):
+    """Render ``md_content`` to sanitized HTML through the render cache.
+
+    Cache misses are rendered in ``pool`` when one is given, which raises
+    ``RenderTimeout`` for a render that exceeds its timeout.
+    """
+    normalized = _normalize(md_content)
+    cache = _cache
+    key = cache.key(normalized)
+    rendered = cache.get(key)
+    if rendered is None:
+        rendered = _render_normalized(normalized, cache, pool)
+        cache.put(key, rendered)
+    return rendered
+
+
+def rendered_document(version: str) -> str | None:
+    """Return the stored HTML of the saved document content ``version``."""
+    cache = _cache
+    return cache.get(cache.key(version, kind='document'))
+
+
+def render_document(version: str, md_content: str, *, pool: RenderProcessPool | None = None) -> str:
+    """Render saved document content and store the HTML under its ``version``.
+
+    The version is the content hash storage reports, so viewers can look the
+    HTML up from a stat-cached version without reading the document.
+    """
+    normalized = _normalize(md_content)
+    cache = _cache
+    rendered = _render_normalized(normalized, cache, pool)
+    cache.put(cache.key(version, kind='document'), rendered)
+    return rendered
@@ -0,0 +1,179 @@
+"""Render Markdown in a pool of warm worker processes.
+
+Rendering is pure Python and holds the GIL; a pathological document can
+stall every other request of the API process for seconds. With
+``MARKINOTE_RENDER_BACKEND=process`` cache misses are rendered by worker
+processes instead, so heavy previews use other cores and the API keeps
+serving.
+
+Each worker owns one pipe and renders one document at a time. A render
+that exceeds the wall-clock timeout cannot be interrupted inside the
+worker, so that worker is killed and replaced; the other workers and the
+renders they are running are unaffected. ``ProcessPoolExecutor`` cannot
+stop a single task, which is why the pool manages its processes itself.
+Workers import the renderer when they start and keep their own memory
+caches for blocks and highlighted code.
+"""
+from __future__ import annotations
+
+import logging
+import multiprocessing
+import queue
+import signal
+import threading
+import time
+from multiprocessing.connection import Connection
+from typing import Any
+
+from markinote_api.platform.metrics import RENDER_QUEUE_DEPTH, RENDER_QUEUE_WAIT, RENDER_WORKER_RESTARTS
+
+LOGGER = logging.getLogger(__name__)
+
+# Spawned workers import the renderer and its dependencies before their
+# first render; that start-up is not charged to the render timeout.
+_STARTUP_TIMEOUT = 60.0
+
+
+class RenderTimeout(Exception):
+    """A render exceeded the configured wall-clock timeout."""
+
+
+def _serve(connection: Connection, cache_bytes: int, highlight_bytes: int) -> None:
+    # The API process handles Ctrl-C and closes the pool.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    from markinote_api.modules.rendering import service
+
+    cache = service.configure_render_cache(cache_bytes, highlight_bytes=highlight_bytes)
+    connection.send(None)
+    while True:
+        try:
+            source = connection.recv()
+        except (EOFError, OSError):
+            return
+        try:
+            connection.send(("ok", service._render_blocks(source, cache)))
+        except Exception as exc:
+            connection.send(("error", f"{type(exc).__name__}: {exc}"))
+
+
+class _Worker:
+    def __init__(self, context: Any, cache_bytes: int, highlight_bytes: int) -> None:
+        self.connection, child = context.Pipe()
+        self.process = context.Process(
+            target=_serve,
+            args=(child, cache_bytes, highlight_bytes),
+            name="markinote-render",
+            daemon=True,
+        )
+        self.process.start()
+        child.close()
+        self.ready = False
+
+    def wait_ready(self) -> None:
+        if self.ready:
+            return
+        if not self.connection.poll(_STARTUP_TIMEOUT):
+            raise TimeoutError("render worker did not start")
+        self.connection.recv()
+        self.ready = True
+
+    def stop(self) -> None:
+        self.connection.close()
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(5)
+
+
+class RenderProcessPool:
+    def __init__(
+        self,
+        workers: int,
+        *,
+        timeout: float,
+        cache_bytes: int = 32 * 1024 * 1024,
+        highlight_bytes: int = 8 * 1024 * 1024,
+    ) -> None:
+        if workers < 1:
+            raise ValueError("workers must be positive")
+        self.workers = workers
+        self.timeout = timeout
+        self.cache_bytes = cache_bytes
+        self.highlight_bytes = highlight_bytes
+        # Forking a threaded server is unsafe; spawned workers start clean.
+        self._context = multiprocessing.get_context("spawn")
+        self._idle: queue.Queue[_Worker] = queue.Queue()
+        self._all: set[_Worker] = set()
+        self._lock = threading.Lock()
+        self._depth = 0
+        self._closed = False
+
+    def start(self) -> None:
+        """Start every worker and wait until each has imported the renderer."""
+        with self._lock:
+            missing = self.workers - len(self._all)
+            started = [self._spawn() for _ in range(missing)]
+        for worker in started:
+            worker.wait_ready()
+            self._idle.put(worker)
+
+    def render(self, source: str) -> str:
+        queued = time.perf_counter()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("render pool is closed")
+            RENDER_QUEUE_DEPTH.observe(self._depth)
+            self._depth += 1
+            if not self._all:
+                for _ in range(self.workers):
+                    self._idle.put(self._spawn())
+        try:
+            worker = self._idle.get()
+            RENDER_QUEUE_WAIT.observe(time.perf_counter() - queued)
+            if not worker.process.is_alive():
+                # Died while idle; its replacement takes this render.
+                worker = self._replace(worker, "exited")
+            try:
+                return self._run(worker, source)
+            except RenderTimeout:
+                worker = self._replace(worker, "timeout")
+                raise
+            except (EOFError, OSError):
+                worker = self._replace(worker, "exited")
+                raise RuntimeError("render worker exited") from None
+            finally:
+                self._idle.put(worker)
+        finally:
+            with self._lock:
+                self._depth -= 1
+
+    def _run(self, worker: _Worker, source: str) -> str:
+        worker.wait_ready()
+        worker.connection.send(source)
+        if not worker.connection.poll(self.timeout):
+            raise RenderTimeout
+        status, value = worker.connection.recv()
+        if status != "ok":
+            raise RuntimeError(value)
+        return value
+
+    def _spawn(self) -> _Worker:
+        worker = _Worker(self._context, self.cache_bytes, self.highlight_bytes)
+        self._all.add(worker)
+        return worker
+
+    def _replace(self, worker: _Worker, reason: str) -> _Worker:
+        RENDER_WORKER_RESTARTS.labels(reason=reason).inc()
+        LOGGER.warning("render worker replaced", extra={"error_code": f"render_worker_{reason}"})
+        worker.stop()
+        with self._lock:
+            self._all.discard(worker)
+            if self._closed:
+                return worker
+            return self._spawn()
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            workers, self._all = self._all, set()
+        for worker in workers:
+            worker.stop()
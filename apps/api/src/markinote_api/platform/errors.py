@@ -11,6 +11,7 @@ from pydantic import BaseModel, ConfigDict
 from starlette.exceptions import HTTPException as StarletteHTTPException
 
 from markinote_api.modules.documents.errors import DocumentError
+from markinote_api.platform.file_locks import ResourceLockTimeout
 
 
 class ProblemDetails(BaseModel):
@@ -64,6 +65,20 @@ def install_exception_handlers(app: FastAPI) -> None:
     async def handle_problem(request: Request, error: Problem) -> JSONResponse:
         return JSONResponse(problem_payload(request, error), status_code=error.status)
 
+    @app.exception_handler(ResourceLockTimeout)
+    async def handle_lock_timeout(request: Request, error: ResourceLockTimeout) -> JSONResponse:
+        problem = Problem(
+            status=503,
+            code="resource_busy",
+            title="Resource busy",
+            detail="Another worker is holding the resource; retry shortly.",
+        )
+        return JSONResponse(
+            problem_payload(request, problem),
+            status_code=503,
+            headers={"Retry-After": "1"},
+        )
+
     @app.exception_handler(RequestValidationError)
     async def handle_validation(request: Request, error: RequestValidationError) -> JSONResponse:
         errors = []
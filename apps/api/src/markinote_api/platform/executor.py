@@ -0,0 +1,91 @@
+"""Dedicated, bounded thread pool for blocking library I/O.
+
+Sync routes normally run on the ASGI server's shared threadpool, which long
+agent streams occupy as well. Document endpoints instead submit their
+service calls here: a private pool sized by configuration, with a
+concurrency cap per operation kind so one slow kind (for example searches
+against a stalled network filesystem) cannot take every worker. Requests
+over a cap wait in the event loop, not in a thread.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import threading
+import time
+import weakref
+from collections import Counter
+from collections.abc import Callable, Mapping
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, TypeVar
+
+from markinote_api.platform.metrics import IO_EXECUTOR_QUEUE_DEPTH, IO_EXECUTOR_WAIT
+
+T = TypeVar("T")
+
+
+class BoundedIOExecutor:
+    """Run blocking callables on a private pool with per-kind caps.
+
+    ``limits`` maps an operation kind to its maximum number of concurrently
+    running calls; kinds without an entry are bounded by the pool alone.
+    Every call records the number of calls of its kind already queued or
+    running, and the time until it starts on a worker.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        limits: Mapping[str, int] | None = None,
+        *,
+        name: str = "markinote-io",
+    ) -> None:
+        if workers < 1:
+            raise ValueError("workers must be positive")
+        self.workers = workers
+        self.limits = {kind: max(1, int(limit)) for kind, limit in (limits or {}).items()}
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._depth: Counter[str] = Counter()
+        # asyncio semaphores belong to one event loop; test clients and
+        # embedded servers may drive the application from several.
+        self._semaphores: weakref.WeakKeyDictionary[
+            asyncio.AbstractEventLoop, dict[str, asyncio.Semaphore]
+        ] = weakref.WeakKeyDictionary()
+
+    async def run(self, kind: str, function: Callable[..., T], /, *args: Any, **kwargs: Any) -> T:
+        loop = asyncio.get_running_loop()
+        queued = time.perf_counter()
+        with self._lock:
+            IO_EXECUTOR_QUEUE_DEPTH.labels(operation=kind).observe(self._depth[kind])
+            self._depth[kind] += 1
+        context = contextvars.copy_context()
+
+        def call() -> T:
+            IO_EXECUTOR_WAIT.labels(operation=kind).observe(time.perf_counter() - queued)
+            return context.run(partial(function, *args, **kwargs))
+
+        try:
+            semaphore = self._semaphore(loop, kind)
+            if semaphore is None:
+                return await loop.run_in_executor(self._pool, call)
+            async with semaphore:
+                return await loop.run_in_executor(self._pool, call)
+        finally:
+            with self._lock:
+                self._depth[kind] -= 1
+
+    def _semaphore(self, loop: asyncio.AbstractEventLoop, kind: str) -> asyncio.Semaphore | None:
+        limit = self.limits.get(kind)
+        if limit is None:
+            return None
+        with self._lock:
+            semaphores = self._semaphores.setdefault(loop, {})
+            semaphore = semaphores.get(kind)
+            if semaphore is None:
+                semaphore = semaphores[kind] = asyncio.Semaphore(limit)
+            return semaphore
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
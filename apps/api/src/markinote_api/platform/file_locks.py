@@ -0,0 +1,193 @@
+"""Cross-process advisory locks on a fixed set of striped lock files.
+
+Lock keys are hashed onto ``stripes`` files in one directory, so the number of
+open descriptors stays bounded however many paths are locked. Each process
+keeps one ``flock`` per stripe and lets its own threads share it: exclusion
+between threads of one process is the job of the process-local locks, which
+are always taken first. Across processes a stripe is held shared or
+exclusive, and waiting is bounded by a timeout because striping can map
+unrelated nested locks onto a cycle that no in-process ordering prevents.
+
+Keys are striped within a group, and each group has its own lock files.
+Library path locks use a group of their own: every writer holds the
+library's root stripe shared, and a resource lock taken inside a path lock,
+such as the trash lock, could otherwise land on that stripe and need an
+upgrade that ``flock`` cannot make safely.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import time
+from collections import Counter
+from collections.abc import Iterator, Mapping
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None  # type: ignore[assignment]
+
+
+class ResourceLockTimeout(TimeoutError):
+    """A cross-process lock could not be acquired within the configured timeout."""
+
+
+class _Stripe:
+    __slots__ = ("condition", "exclusive", "fd", "holders")
+
+    def __init__(self, fd: int) -> None:
+        self.condition = threading.Condition()
+        self.fd = fd
+        self.exclusive = False
+        self.holders: Counter[int] = Counter()
+
+
+class StripedFileLocks:
+    """Shared/exclusive ``flock`` locks keyed by string, striped over files."""
+
+    def __init__(self, directory: Path, *, stripes: int = 64, timeout: float = 30.0) -> None:
+        if fcntl is None:
+            raise RuntimeError("file locks require a POSIX platform")
+        if stripes < 1:
+            raise ValueError("stripes must be positive")
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.stripes = stripes
+        self.timeout = timeout
+        self._guard = threading.Lock()
+        self._open: dict[tuple[str, int], _Stripe] = {}
+
+    def stripe(self, key: str) -> int:
+        digest = hashlib.blake2b(key.encode("utf-8", "surrogatepass"), digest_size=8).digest()
+        return int.from_bytes(digest, "big") % self.stripes
+
+    @contextmanager
+    def hold(self, requests: Mapping[str, bool], *, group: str = "") -> Iterator[None]:
+        """Hold every key's stripe in ``group``, exclusively where the mapped value is true.
+
+        Stripes are acquired in ascending order, so requests made in one step
+        cannot deadlock each other across processes.
+        """
+        stripes: dict[tuple[str, int], bool] = {}
+        for key, exclusive in requests.items():
+            index = (group, self.stripe(key))
+            stripes[index] = stripes.get(index, False) or exclusive
+        deadline = time.monotonic() + self.timeout
+        acquired: list[tuple[str, int]] = []
+        try:
+            for index in sorted(stripes):
+                self._acquire(index, stripes[index], deadline)
+                acquired.append(index)
+            yield
+        finally:
+            for index in reversed(acquired):
+                self._release(index)
+
+    def _stripe(self, index: tuple[str, int]) -> _Stripe:
+        with self._guard:
+            stripe = self._open.get(index)
+            if stripe is None:
+                group, number = index
+                path = self.directory / (f"{group}-{number:04d}.lock" if group else f"{number:04d}.lock")
+                fd = os.open(path, os.O_RDWR | os.O_CREAT | getattr(os, "O_CLOEXEC", 0), 0o600)
+                stripe = self._open[index] = _Stripe(fd)
+            return stripe
+
+    def _acquire(self, index: tuple[str, int], exclusive: bool, deadline: float) -> None:
+        me = threading.get_ident()
+        stripe = self._stripe(index)
+        with stripe.condition:
+            while True:
+                held = sum(stripe.holders.values())
+                if not held:
+                    self._flock(stripe.fd, exclusive, deadline)
+                    stripe.exclusive = exclusive
+                    break
+                if stripe.exclusive or not exclusive:
+                    break
+                if stripe.holders[me]:
+                    # flock converts by unlocking first, so a failed upgrade
+                    # would silently lose the shared lock; refuse it instead.
+                    raise RuntimeError("持有共享锁时不能升级为独占锁")
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise ResourceLockTimeout("等待跨进程锁超时")
+                stripe.condition.wait(remaining)
+            stripe.holders[me] += 1
+
+    def _release(self, index: tuple[str, int]) -> None:
+        me = threading.get_ident()
+        stripe = self._open[index]
+        with stripe.condition:
+            stripe.holders[me] -= 1
+            if not stripe.holders[me]:
+                del stripe.holders[me]
+            if not stripe.holders:
+                fcntl.flock(stripe.fd, fcntl.LOCK_UN)
+                stripe.exclusive = False
+                stripe.condition.notify_all()
+
+    @staticmethod
+    def _flock(fd: int, exclusive: bool, deadline: float) -> None:
+        operation = (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) | fcntl.LOCK_NB
+        delay = 0.001
+        while True:
+            try:
+                fcntl.flock(fd, operation)
+                return
+            except BlockingIOError:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise ResourceLockTimeout("等待跨进程锁超时") from None
+                time.sleep(min(delay, remaining))
+                delay = min(delay * 2, 0.05)
+
+    def close(self) -> None:
+        with self._guard:
+            for stripe in self._open.values():
+                os.close(stripe.fd)
+            self._open.clear()
+
+
+_active_guard = threading.Lock()
+_active: StripedFileLocks | None = None
+
+
+def configure_file_locks(
+    backend: str,
+    directory: Path | None = None,
+    *,
+    stripes: int = 64,
+    timeout: float = 30.0,
+) -> StripedFileLocks | None:
+    """Select the cross-process layer used by ``resource_lock`` and path locks.
+
+    ``"process"`` disables it; ``"file"`` stripes locks over ``directory``.
+    An unchanged configuration keeps the already-open lock files.
+    """
+    global _active
+    with _active_guard:
+        if backend == "process":
+            _active = None
+        elif backend == "file":
+            if directory is None:
+                raise ValueError("the file lock backend requires a lock directory")
+            current = _active
+            if (
+                current is None
+                or current.directory != Path(directory)
+                or current.stripes != stripes
+            ):
+                _active = StripedFileLocks(directory, stripes=stripes, timeout=timeout)
+            else:
+                current.timeout = timeout
+        else:
+            raise ValueError(f"unknown lock backend: {backend}")
+        return _active
+
+
+def active_file_locks() -> StripedFileLocks | None:
+    return _active
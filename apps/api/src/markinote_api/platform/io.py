@@ -1,61 +1,321 @@
-"""Atomic persistence and lightweight process-local locking."""
+"""Atomic persistence and resource locking."""
 from __future__ import annotations
 
 import hashlib
 import json
+import logging
 import os
 import tempfile
 import threading
+import time
+from collections import OrderedDict
 from contextlib import contextmanager
 from pathlib import Path
+from typing import Literal
+
+from markinote_api.platform.file_locks import active_file_locks
+from markinote_api.platform.metrics import ATOMIC_WRITES, FILE_VERSION_CACHE, FSYNC_SECONDS, RESOURCE_LOCK_WAIT
+
+LOGGER = logging.getLogger(__name__)
+
+# "strict" fsyncs the file and its directory before a write returns.
+# "batched" gives the same guarantee, but concurrent writers into one
+# directory share a directory fsync issued by a background committer.
+# "relaxed" skips both fsyncs: the replacement is atomic for readers but may
+# be lost on power failure, which only regenerable caches can accept.
+Durability = Literal['strict', 'batched', 'relaxed']
+
+
+class SharedLock:
+    """Reentrant shared/exclusive lock that prefers waiting writers.
+
+    Any number of threads may hold the lock shared, or one thread may hold it
+    exclusively. New shared acquisitions wait while a writer is queued so a
+    steady stream of readers cannot starve writers. A thread that already
+    holds the lock in either mode may re-acquire it shared, and an exclusive
+    holder may re-acquire it exclusively; upgrading from shared to exclusive
+    would deadlock two upgraders and is rejected.
+    """
+
+    def __init__(self) -> None:
+        self._condition = threading.Condition(threading.Lock())
+        self._readers: dict[int, int] = {}
+        self._writer: int | None = None
+        self._writer_depth = 0
+        self._waiting_writers = 0
+
+    def acquire_shared(self) -> None:
+        me = threading.get_ident()
+        with self._condition:
+            if self._writer == me or me in self._readers:
+                self._readers[me] = self._readers.get(me, 0) + 1
+                return
+            started = time.perf_counter()
+            while self._writer is not None or self._waiting_writers:
+                self._condition.wait()
+            self._readers[me] = 1
+        RESOURCE_LOCK_WAIT.labels(mode='shared').observe(time.perf_counter() - started)
+
+    def release_shared(self) -> None:
+        me = threading.get_ident()
+        with self._condition:
+            depth = self._readers.get(me, 0)
+            if not depth:
+                raise RuntimeError('释放了未持有的共享锁')
+            if depth > 1:
+                self._readers[me] = depth - 1
+                return
+            del self._readers[me]
+            if not self._readers:
+                self._condition.notify_all()
+
+    def acquire_exclusive(self) -> None:
+        me = threading.get_ident()
+        with self._condition:
+            if self._writer == me:
+                self._writer_depth += 1
+                return
+            if me in self._readers:
+                raise RuntimeError('持有共享锁时不能升级为独占锁')
+            started = time.perf_counter()
+            self._waiting_writers += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._condition.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = me
+            self._writer_depth = 1
+        RESOURCE_LOCK_WAIT.labels(mode='exclusive').observe(time.perf_counter() - started)
+
+    def release_exclusive(self) -> None:
+        with self._condition:
+            if self._writer != threading.get_ident():
+                raise RuntimeError('释放了未持有的独占锁')
+            self._writer_depth -= 1
+            if not self._writer_depth:
+                self._writer = None
+                self._condition.notify_all()
+
 
 _locks_guard = threading.Lock()
-_locks: dict[str, threading.RLock] = {}
+_locks: dict[str, SharedLock] = {}
 
 
 @contextmanager
-def resource_lock(key: str | os.PathLike[str]):
+def resource_lock(key: str | os.PathLike[str], *, shared: bool = False):
+    """Hold the lock for ``key``, exclusively unless ``shared``.
+
+    Threads are coordinated by a process-local lock. When the file backend is
+    configured, the key's lock-file stripe is held as well so that other
+    worker processes are excluded too.
+    """
     normalized = os.path.normcase(os.path.abspath(os.fspath(key)))
     with _locks_guard:
-        lock = _locks.setdefault(normalized, threading.RLock())
-    with lock:
-        yield
+        lock = _locks.get(normalized)
+        if lock is None:
+            lock = _locks[normalized] = SharedLock()
+    if shared:
+        acquire, release = lock.acquire_shared, lock.release_shared
+    else:
+        acquire, release = lock.acquire_exclusive, lock.release_exclusive
+    acquire()
+    try:
+        file_locks = active_file_locks()
+        if file_locks is None:
+            yield
+        else:
+            with file_locks.hold({normalized: not shared}):
+                yield
+    finally:
+        release()
 
 
-def atomic_write_bytes(path: str | os.PathLike[str], content: bytes) -> None:
-    target = Path(path)
-    target.parent.mkdir(parents=True, exist_ok=True)
-    previous_mode = target.stat().st_mode if target.exists() else None
-    temp_name = None
+def _fsync(fd: int, durability: str, target: str) -> None:
+    started = time.perf_counter()
+    os.fsync(fd)
+    FSYNC_SECONDS.labels(durability=durability, target=target).observe(time.perf_counter() - started)
+
+
+def _fsync_directory(directory: str | os.PathLike[str], durability: str) -> None:
+    directory_fd = os.open(directory, os.O_RDONLY | getattr(os, 'O_DIRECTORY', 0))
     try:
-        with tempfile.NamedTemporaryFile(dir=target.parent, prefix=f'.{target.name}.', suffix='.tmp', delete=False) as stream:
-            temp_name = stream.name
-            stream.write(content)
-            stream.flush()
-            os.fsync(stream.fileno())
-        if previous_mode is not None:
-            os.chmod(temp_name, previous_mode)
-        os.replace(temp_name, target)
-        if os.name != 'nt':
-            directory_fd = os.open(target.parent, os.O_RDONLY | getattr(os, 'O_DIRECTORY', 0))
-            try:
-                os.fsync(directory_fd)
-            finally:
-                os.close(directory_fd)
+        _fsync(directory_fd, durability, 'directory')
     finally:
-        if temp_name and os.path.exists(temp_name):
-            os.remove(temp_name)
+        os.close(directory_fd)
+
+
+class _SyncRequest:
+    __slots__ = ('done', 'error')
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.error: Exception | None = None
+
+
+class DirectorySyncCommitter:
+    """Group commit for the directory fsyncs of ``batched`` writes.
+
+    A writer registers its directory after the rename and blocks until a
+    directory fsync that started after the registration has completed, so
+    the rename is durable when ``sync`` returns. The committer thread waits
+    ``window`` seconds after the first request, then fsyncs each distinct
+    directory once for every writer that arrived meanwhile. A failed fsync
+    is raised to that directory's writers and the thread carries on. Should
+    anything else stop the thread, it fails every waiting writer and logs
+    the cause before it exits, and the next ``sync`` starts a new thread.
+    """
+
+    def __init__(self, window: float = 0.002) -> None:
+        self.window = max(0.0, float(window))
+        self._condition = threading.Condition()
+        self._pending: dict[str, list[_SyncRequest]] = {}
+        self._thread: threading.Thread | None = None
+
+    def sync(self, directory: str | os.PathLike[str]) -> None:
+        request = _SyncRequest()
+        with self._condition:
+            self._pending.setdefault(os.fspath(directory), []).append(request)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name='markinote-directory-sync', daemon=True
+                )
+                self._thread.start()
+            self._condition.notify()
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+
+    def _run(self) -> None:
+        batch: dict[str, list[_SyncRequest]] = {}
+        try:
+            while True:
+                with self._condition:
+                    while not self._pending:
+                        self._condition.wait()
+                if self.window:
+                    time.sleep(self.window)
+                with self._condition:
+                    batch, self._pending = self._pending, {}
+                for directory, requests in batch.items():
+                    error: Exception | None = None
+                    try:
+                        _fsync_directory(directory, 'batched')
+                    except Exception as exc:
+                        error = exc
+                    for request in requests:
+                        request.error = error
+                        request.done.set()
+        except BaseException as exc:
+            with self._condition:
+                # The next ``sync`` must not count on this thread while it exits.
+                self._thread = None
+                stranded = [*batch.values(), *self._pending.values()]
+                self._pending = {}
+            stopped = RuntimeError('directory sync committer stopped')
+            stopped.__cause__ = exc
+            for requests in stranded:
+                for request in requests:
+                    if not request.done.is_set():
+                        request.error = stopped
+                        request.done.set()
+            LOGGER.error('directory sync committer stopped', exc_info=exc)
+
+
+_durability: Durability = 'strict'
+_committer = DirectorySyncCommitter()
+
 
+def configure_durability(default: Durability, *, batch_window: float = 0.002) -> None:
+    """Set the mode of atomic writes that do not choose one explicitly."""
+    global _durability
+    if default not in {'strict', 'batched', 'relaxed'}:
+        raise ValueError(f'unknown durability mode: {default}')
+    _durability = default
+    _committer.window = max(0.0, float(batch_window))
 
-def atomic_write_text(path: str | os.PathLike[str], content: str) -> None:
+
+class StagedWrite:
+    """Same-directory temporary file that atomically replaces ``path`` on commit.
+
+    Bytes are hashed and counted as they are written, so streaming callers
+    learn the size and content version without buffering or rereading the
+    payload. Leaving the context without ``commit`` removes the temporary
+    file. ``durability`` defaults to the configured process mode.
+    """
+
+    def __init__(self, path: str | os.PathLike[str], *, durability: Durability | None = None) -> None:
+        self.path = Path(path)
+        self.durability: Durability = durability or _durability
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.size = 0
+        self._digest = hashlib.sha256()
+        self._committed = False
+        # Closed by commit() or discard(); the object outlives this method.
+        self._stream = tempfile.NamedTemporaryFile(  # noqa: SIM115
+            dir=self.path.parent, prefix=f'.{self.path.name}.', suffix='.tmp', delete=False
+        )
+
+    def __enter__(self) -> StagedWrite:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.discard()
+
+    @property
+    def version(self) -> str:
+        return self._digest.hexdigest()
+
+    def write(self, chunk: bytes) -> None:
+        self._stream.write(chunk)
+        self._digest.update(chunk)
+        self.size += len(chunk)
+
+    def commit(self) -> None:
+        previous_mode = self.path.stat().st_mode if self.path.exists() else None
+        self._stream.flush()
+        # The contents must be durable before the rename in every mode but
+        # relaxed, or a crash could leave the new name on an empty file.
+        if self.durability != 'relaxed':
+            _fsync(self._stream.fileno(), self.durability, 'file')
+        self._stream.close()
+        if previous_mode is not None:
+            os.chmod(self._stream.name, previous_mode)
+        os.replace(self._stream.name, self.path)
+        self._committed = True
+        ATOMIC_WRITES.labels(durability=self.durability).inc()
+        if os.name == 'nt' or self.durability == 'relaxed':
+            return
+        if self.durability == 'batched':
+            _committer.sync(self.path.parent)
+        else:
+            _fsync_directory(self.path.parent, 'strict')
+
+    def discard(self) -> None:
+        self._stream.close()
+        if not self._committed and os.path.exists(self._stream.name):
+            os.remove(self._stream.name)
+
+
+def atomic_write_bytes(
+    path: str | os.PathLike[str], content: bytes, *, durability: Durability | None = None
+) -> None:
+    with StagedWrite(path, durability=durability) as staged:
+        staged.write(content)
+        staged.commit()
+
+
+def atomic_write_text(
+    path: str | os.PathLike[str], content: str, *, durability: Durability | None = None
+) -> None:
     if not isinstance(content, str):
         raise TypeError('文件内容必须为字符串')
-    atomic_write_bytes(path, content.encode('utf-8'))
+    atomic_write_bytes(path, content.encode('utf-8'), durability=durability)
 
 
-def atomic_write_json(path: str | os.PathLike[str], value) -> None:
+def atomic_write_json(path: str | os.PathLike[str], value, *, durability: Durability | None = None) -> None:
     payload = json.dumps(value, ensure_ascii=False, indent=2).encode('utf-8') + b'\n'
-    atomic_write_bytes(path, payload)
+    atomic_write_bytes(path, payload, durability=durability)
 
 
 def read_utf8_text(path: str | os.PathLike[str]) -> str:
@@ -74,3 +334,79 @@ def file_version(path: str | os.PathLike[str]) -> str:
         for chunk in iter(lambda: stream.read(1024 * 1024), b''):
             digest.update(chunk)
     return digest.hexdigest()
+
+
+StatKey = tuple[int, int, int, int, int]
+
+
+def stat_key(stat_info: os.stat_result) -> StatKey:
+    return (
+        stat_info.st_dev,
+        stat_info.st_ino,
+        stat_info.st_size,
+        stat_info.st_mtime_ns,
+        stat_info.st_ctime_ns,
+    )
+
+
+class FileVersionCache:
+    """Bounded LRU map from a file's stat identity to its content version.
+
+    Any write through a new inode, a size change, or an mtime/ctime change
+    produces a different key, so a stale version can never be returned.
+    """
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max(1, int(max_entries))
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[StatKey, str] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: StatKey) -> str | None:
+        with self._lock:
+            version = self._entries.get(key)
+            if version is not None:
+                self._entries.move_to_end(key)
+        FILE_VERSION_CACHE.labels('hit' if version is not None else 'miss').inc()
+        return version
+
+    def put(self, key: StatKey, version: str) -> None:
+        with self._lock:
+            self._entries[key] = version
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+FILE_VERSIONS = FileVersionCache(max_entries=4096)
+
+
+def cached_file_version(
+    path: str | os.PathLike[str],
+    stat_info: os.stat_result | None = None,
+) -> str:
+    """Return ``file_version(path)``, hashing only when the file's stat changed.
+
+    Callers that already hold a fresh ``stat_info`` for ``path`` may pass it
+    so that a cache hit costs no additional system call.
+    """
+    before = stat_key(stat_info if stat_info is not None else os.stat(path))
+    version = FILE_VERSIONS.get(before)
+    if version is not None:
+        return version
+    version = file_version(path)
+    # Only remember the digest if the file did not change while it was hashed.
+    if stat_key(os.stat(path)) == before:
+        FILE_VERSIONS.put(before, version)
+    return version
+
+
+def remember_file_version(stat_info: os.stat_result, version: str) -> None:
+    """Record a version computed from bytes the caller just read or wrote."""
+    FILE_VERSIONS.put(stat_key(stat_info), version)
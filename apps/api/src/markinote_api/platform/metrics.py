@@ -7,7 +7,7 @@ values must never become labels.
 
 from __future__ import annotations
 
-from prometheus_client import Counter, Histogram
+from prometheus_client import Counter, Gauge, Histogram
 
 AI_PROVIDER_TIME_TO_FIRST_CONTENT = Histogram(
     "markinote_ai_provider_time_to_first_content_seconds",
@@ -38,3 +38,117 @@ DOCUMENT_CONFLICTS = Counter(
     "Optimistic document save conflicts by HTTP adapter.",
     ("adapter",),
 )
+
+LIBRARY_SIZE_LEDGER = Gauge(
+    "markinote_library_size_ledger_bytes",
+    "Live document library bytes as tracked by the storage capacity ledger.",
+)
+
+LIBRARY_SIZE_DRIFT = Gauge(
+    "markinote_library_size_drift_bytes",
+    (
+        "Signed difference between the last reconciliation walk and the ledger. "
+        "Non-zero values indicate writes that bypassed the storage adapter."
+    ),
+)
+
+LIBRARY_SIZE_RECONCILIATIONS = Counter(
+    "markinote_library_size_reconciliations_total",
+    "Background library-size ledger reconciliations by outcome.",
+    ("outcome",),
+)
+
+FILE_VERSION_CACHE = Counter(
+    "markinote_file_version_cache_lookups_total",
+    "Stat-keyed document version cache lookups by outcome.",
+    ("outcome",),
+)
+
+RESOURCE_LOCK_WAIT = Histogram(
+    "markinote_resource_lock_wait_seconds",
+    "Time spent waiting to acquire a process-local resource lock by lock mode.",
+    ("mode",),
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0),
+)
+
+PATH_LOCK_WAIT = Histogram(
+    "markinote_path_lock_wait_seconds",
+    "Time spent acquiring hierarchical library path locks by request mode.",
+    ("mode",),
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0),
+)
+
+LIBRARY_WATCHER_EVENTS = Counter(
+    "markinote_library_watcher_changes_total",
+    "Coalesced external library changes published by the filesystem watcher.",
+    ("kind",),
+)
+
+IO_EXECUTOR_QUEUE_DEPTH = Histogram(
+    "markinote_io_executor_queue_depth",
+    "Calls of the same operation kind already queued or running when a document I/O call is submitted.",
+    ("operation",),
+    buckets=(0, 1, 2, 4, 8, 16, 32, 64, 128),
+)
+
+IO_EXECUTOR_WAIT = Histogram(
+    "markinote_io_executor_wait_seconds",
+    "Time from submitting a document I/O call until a worker thread starts it.",
+    ("operation",),
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0),
+)
+
+ATOMIC_WRITES = Counter(
+    "markinote_atomic_writes_total",
+    "Atomic file replacements by durability mode.",
+    ("durability",),
+)
+
+FSYNC_SECONDS = Histogram(
+    "markinote_fsync_seconds",
+    "fsync calls issued by atomic writes, by durability mode and target (file or directory).",
+    ("durability", "target"),
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0),
+)
+
+DOCUMENT_SAVES = Counter(
+    "markinote_document_saves_total",
+    "Coalesced editor saves by outcome: written, held, superseded by a newer held save, or dropped on conflict.",
+    ("outcome",),
+)
+
+RENDER_CACHE = Counter(
+    "markinote_render_cache_total",
+    "Rendered-preview cache lookups and evictions by tier (memory, disk or highlight) and outcome.",
+    ("tier", "outcome"),
+)
+
+RENDER_CACHE_BYTES = Gauge(
+    "markinote_render_cache_bytes",
+    "UTF-8 bytes of rendered HTML held by each render cache tier.",
+    ("tier",),
+)
+
+RENDER_QUEUE_DEPTH = Histogram(
+    "markinote_render_queue_depth",
+    "Renders already queued or running in the render worker pool when a render is submitted.",
+    buckets=(0, 1, 2, 4, 8, 16, 32, 64, 128),
+)
+
+RENDER_QUEUE_WAIT = Histogram(
+    "markinote_render_queue_wait_seconds",
+    "Time from submitting a render until a render worker process takes it.",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0),
+)
+
+RENDER_WORKER_RESTARTS = Counter(
+    "markinote_render_worker_restarts_total",
+    "Render worker processes replaced after a render timed out or the worker exited.",
+    ("reason",),
+)
+
+DOCUMENT_PRERENDERS = Counter(
+    "markinote_document_prerenders_total",
+    "Background renders of saved documents by outcome: rendered, cached, skipped, dropped or failed.",
+    ("outcome",),
+)
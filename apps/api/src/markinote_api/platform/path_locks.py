@@ -0,0 +1,196 @@
+"""Hierarchical intention locks over library-relative paths.
+
+A request names the paths it reads (``S``) or writes (``X``). Every ancestor
+of such a path is locked with the matching intention mode (``IS`` or ``IX``),
+so operations on disjoint subtrees proceed in parallel while an ``S`` or ``X``
+lock on a folder still excludes all work below it. All nodes of a request are
+acquired in one global order (ancestors before descendants, then
+lexicographically), which keeps multi-path requests such as moves deadlock
+free.
+
+When the file lock backend is configured, requests additionally hold
+lock-file stripes so other worker processes are excluded. Intention modes
+cannot be expressed with ``flock``, so across processes exclusion is coarser:
+every request shares the library's root stripe (exclusive for writes to the
+root itself) and locks the stripe of each path's top-level entry. These
+stripes have lock files of their own, so a resource lock taken inside a
+path lock never needs to upgrade one of them.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import Counter
+from collections.abc import Iterator
+from contextlib import contextmanager
+from itertools import count
+
+from markinote_api.platform.file_locks import active_file_locks
+from markinote_api.platform.metrics import PATH_LOCK_WAIT
+
+_COMPATIBLE: dict[str, frozenset[str]] = {
+    "IS": frozenset({"IS", "IX", "S"}),
+    "IX": frozenset({"IS", "IX"}),
+    "S": frozenset({"IS", "S"}),
+    "X": frozenset(),
+}
+_INTENTION = {"S": "IS", "X": "IX"}
+
+
+def _combine(first: str | None, second: str) -> str:
+    """Return the weakest mode that grants both ``first`` and ``second``."""
+    if first is None or first == second:
+        return second
+    if {first, second} == {"IS", "IX"}:
+        return "IX"
+    if {first, second} == {"IS", "S"}:
+        return "S"
+    # S together with IX (SIX) is treated as X; the combination only arises
+    # when one request reads a folder and writes below it.
+    return "X"
+
+
+NodeKey = tuple[str, ...]
+
+
+class _Node:
+    __slots__ = ("holders", "waiting")
+
+    def __init__(self) -> None:
+        self.holders: dict[int, Counter[str]] = {}
+        self.waiting: list[tuple[int, int, str]] = []
+
+
+class PathLockManager:
+    """Reentrant IS/IX/S/X lock table for one library root.
+
+    A thread that already holds any mode on a node may re-acquire it without
+    queueing, which lets nested storage calls (for example a rollback issued
+    while the mutation still holds its paths) run. Fresh requests queue in
+    arrival order behind incompatible waiters so writers are not starved.
+    """
+
+    def __init__(self, namespace: str = "") -> None:
+        self.namespace = namespace
+        self._condition = threading.Condition(threading.Lock())
+        self._nodes: dict[NodeKey, _Node] = {}
+        self._tickets = count()
+
+    @contextmanager
+    def shared(self, *paths: str) -> Iterator[None]:
+        with self._hold({path: "S" for path in paths}):
+            yield
+
+    @contextmanager
+    def exclusive(self, *paths: str) -> Iterator[None]:
+        with self._hold({path: "X" for path in paths}):
+            yield
+
+    @staticmethod
+    def _key(path: str) -> NodeKey:
+        normalized = os.path.normcase(path.replace("\\", "/").strip("/"))
+        return tuple(normalized.split("/")) if normalized else ()
+
+    def _plan(self, requests: dict[str, str]) -> list[tuple[NodeKey, str]]:
+        modes: dict[NodeKey, str] = {}
+        for path, mode in requests.items():
+            key = self._key(path)
+            for depth in range(len(key)):
+                ancestor = key[:depth]
+                modes[ancestor] = _combine(modes.get(ancestor), _INTENTION[mode])
+            modes[key] = _combine(modes.get(key), mode)
+        return sorted(modes.items())
+
+    @contextmanager
+    def _hold(self, requests: dict[str, str]) -> Iterator[None]:
+        plan = self._plan(requests)
+        acquired: list[tuple[NodeKey, str]] = []
+        started = time.perf_counter()
+        try:
+            for key, mode in plan:
+                self._acquire(key, mode)
+                acquired.append((key, mode))
+            file_locks = active_file_locks()
+            if file_locks is None:
+                self._observe(requests, started)
+                yield
+            else:
+                with file_locks.hold(self._stripe_requests(requests), group="paths"):
+                    self._observe(requests, started)
+                    yield
+        finally:
+            for key, mode in reversed(acquired):
+                self._release(key, mode)
+
+    def _stripe_requests(self, requests: dict[str, str]) -> dict[str, bool]:
+        stripes = {self.namespace: False}
+        for path, mode in requests.items():
+            key = self._key(path)
+            stripe = f"{self.namespace}/{key[0]}" if key else self.namespace
+            stripes[stripe] = stripes.get(stripe, False) or mode == "X"
+        return stripes
+
+    @staticmethod
+    def _observe(requests: dict[str, str], started: float) -> None:
+        PATH_LOCK_WAIT.labels(
+            mode="exclusive" if "X" in requests.values() else "shared"
+        ).observe(time.perf_counter() - started)
+
+    def _grantable(self, node: _Node, me: int, mode: str, ticket: int) -> bool:
+        compatible = _COMPATIBLE[mode]
+        for thread_id, modes in node.holders.items():
+            if thread_id != me and any(held not in compatible for held in modes):
+                return False
+        if me in node.holders:
+            return True
+        return all(
+            queued_mode in compatible
+            for queued_ticket, thread_id, queued_mode in node.waiting
+            if queued_ticket < ticket and thread_id != me
+        )
+
+    def _acquire(self, key: NodeKey, mode: str) -> None:
+        me = threading.get_ident()
+        with self._condition:
+            node = self._nodes.get(key)
+            if node is None:
+                node = self._nodes[key] = _Node()
+            ticket = next(self._tickets)
+            if not self._grantable(node, me, mode, ticket):
+                entry = (ticket, me, mode)
+                node.waiting.append(entry)
+                try:
+                    while not self._grantable(node, me, mode, ticket):
+                        self._condition.wait()
+                finally:
+                    node.waiting.remove(entry)
+            node.holders.setdefault(me, Counter())[mode] += 1
+
+    def _release(self, key: NodeKey, mode: str) -> None:
+        me = threading.get_ident()
+        with self._condition:
+            node = self._nodes[key]
+            modes = node.holders[me]
+            modes[mode] -= 1
+            if not modes[mode]:
+                del modes[mode]
+                if not modes:
+                    del node.holders[me]
+            if not node.holders and not node.waiting:
+                del self._nodes[key]
+            self._condition.notify_all()
+
+
+_managers_guard = threading.Lock()
+_managers: dict[str, PathLockManager] = {}
+
+
+def path_locks(root: str | os.PathLike[str]) -> PathLockManager:
+    """Return the process-wide lock manager for the library at ``root``."""
+    normalized = os.path.normcase(os.path.realpath(os.fspath(root)))
+    with _managers_guard:
+        manager = _managers.get(normalized)
+        if manager is None:
+            manager = _managers[normalized] = PathLockManager(normalized)
+        return manager
@@ -0,0 +1,472 @@
+"""Library filesystem watcher with an inotify backend and a polling fallback.
+
+External writers such as ``git pull``, sync clients, or bulk imports bypass the
+document storage adapter. The watcher observes the visible library tree and
+publishes coalesced, typed :class:`LibraryChange` batches to in-process
+subscribers so derived caches and indexes can stay long-lived.
+
+On Linux the watcher uses inotify through ``ctypes`` with one watch per
+directory. Elsewhere, or when inotify is unavailable or its watch limit is
+exhausted, it compares periodic ``stat`` snapshots instead. Hidden names are
+never reported and symbolic links are never followed, matching the storage
+adapter's visibility rules.
+"""
+
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Literal
+
+from markinote_api.platform.metrics import LIBRARY_WATCHER_EVENTS
+
+LOGGER = logging.getLogger(__name__)
+
+ChangeKind = Literal["created", "modified", "moved", "deleted"]
+WatcherBackend = Literal["auto", "inotify", "polling"]
+Subscriber = Callable[[list["LibraryChange"]], None]
+
+_IN_MODIFY = 0x00000002
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+_IN_DONT_FOLLOW = 0x02000000
+_IN_EXCL_UNLINK = 0x04000000
+_IN_ISDIR = 0x40000000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_WATCH_MASK = (
+    _IN_MODIFY
+    | _IN_CLOSE_WRITE
+    | _IN_MOVED_FROM
+    | _IN_MOVED_TO
+    | _IN_CREATE
+    | _IN_DELETE
+    | _IN_DELETE_SELF
+    | _IN_ONLYDIR
+    | _IN_DONT_FOLLOW
+    | _IN_EXCL_UNLINK
+)
+_EVENT_HEADER = struct.Struct("iIII")
+# A writer that never pauses must not postpone notifications indefinitely.
+_MAX_BURST_SECONDS = 2.0
+
+
+@dataclass(frozen=True, slots=True)
+class LibraryChange:
+    """One coalesced change below the library root.
+
+    ``path`` is library-relative and uses ``/`` separators. An empty path
+    means the watcher lost track (for example an inotify queue overflow) and
+    subscribers should resynchronize the whole library.
+    """
+
+    kind: ChangeKind
+    path: str
+    is_directory: bool = False
+    source_path: str | None = None
+
+
+def _hidden(relative_path: str) -> bool:
+    return any(part.startswith(".") for part in relative_path.split("/"))
+
+
+def _join(prefix: str, name: str) -> str:
+    return f"{prefix}/{name}" if prefix else name
+
+
+class _Coalescer:
+    """Merge raw events per path until the burst has been quiet long enough."""
+
+    def __init__(self) -> None:
+        self._pending: dict[str, LibraryChange] = {}
+
+    def __bool__(self) -> bool:
+        return bool(self._pending)
+
+    def add(self, change: LibraryChange) -> None:
+        if not change.path:
+            self._pending = {"": change}
+            return
+        if "" in self._pending:
+            return
+        if change.kind == "moved" and change.source_path is not None:
+            earlier = self._pending.pop(change.source_path, None)
+            if earlier is not None and earlier.kind == "created":
+                change = LibraryChange("created", change.path, change.is_directory)
+        previous = self._pending.get(change.path)
+        if previous is None:
+            self._pending[change.path] = change
+        elif previous.kind == "created" and change.kind == "deleted":
+            del self._pending[change.path]
+        elif previous.kind == "created" and change.kind == "modified":
+            return
+        elif previous.kind == "deleted" and change.kind == "created":
+            self._pending[change.path] = LibraryChange("modified", change.path, change.is_directory)
+        elif previous.kind == "moved" and change.kind == "modified":
+            return
+        elif previous.kind == "moved" and change.kind == "deleted" and previous.source_path is not None:
+            del self._pending[change.path]
+            self._pending[previous.source_path] = LibraryChange(
+                "deleted", previous.source_path, previous.is_directory
+            )
+        else:
+            self._pending[change.path] = change
+
+    def drain(self) -> list[LibraryChange]:
+        changes = list(self._pending.values())
+        self._pending.clear()
+        return changes
+
+
+class _InotifyUnavailable(OSError):
+    pass
+
+
+class _Inotify:
+    def __init__(self) -> None:
+        if not sys.platform.startswith("linux"):
+            raise _InotifyUnavailable("inotify requires Linux")
+        library = ctypes.util.find_library("c") or "libc.so.6"
+        try:
+            libc = ctypes.CDLL(library, use_errno=True)
+            self._add_watch = libc.inotify_add_watch
+            init = libc.inotify_init1
+        except (OSError, AttributeError) as exc:
+            raise _InotifyUnavailable("libc does not expose inotify") from exc
+        self._add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        self._add_watch.restype = ctypes.c_int
+        fd = init(_IN_NONBLOCK | _IN_CLOEXEC)
+        if fd < 0:
+            raise _InotifyUnavailable(ctypes.get_errno(), "inotify_init1 failed")
+        self.fd = fd
+
+    def add_watch(self, path: Path) -> int:
+        wd = self._add_watch(self.fd, os.fsencode(path), _WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error), str(path))
+        return wd
+
+    def read(self) -> list[tuple[int, int, int, str]]:
+        try:
+            data = os.read(self.fd, 256 * 1024)
+        except BlockingIOError:
+            return []
+        events: list[tuple[int, int, int, str]] = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            events.append((wd, mask, cookie, name))
+        return events
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class LibraryWatcher:
+    """Publish coalesced filesystem changes below ``root`` to subscribers.
+
+    Subscribers run on the watcher thread, one call per quiet burst. A
+    subscriber failure is logged and does not affect other subscribers.
+    """
+
+    def __init__(
+        self,
+        root: str | os.PathLike[str],
+        *,
+        backend: WatcherBackend = "auto",
+        poll_interval: float = 2.0,
+        debounce: float = 0.2,
+    ) -> None:
+        self.root = Path(root).resolve()
+        self.requested_backend = backend
+        self.poll_interval = max(0.05, float(poll_interval))
+        self.debounce = max(0.0, float(debounce))
+        self._subscribers: list[Subscriber] = []
+        self._subscribers_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._inotify: _Inotify | None = None
+        self._watches: dict[int, str] = {}
+        self._baseline: dict[str, tuple[bool, int, int, int]] = {}
+        self._wake: tuple[int, int] | None = None
+        self.backend: Literal["inotify", "polling"] | None = None
+
+    def subscribe(self, subscriber: Subscriber) -> Callable[[], None]:
+        with self._subscribers_lock:
+            self._subscribers.append(subscriber)
+
+        def unsubscribe() -> None:
+            with self._subscribers_lock:
+                if subscriber in self._subscribers:
+                    self._subscribers.remove(subscriber)
+
+        return unsubscribe
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        if self.requested_backend in ("auto", "inotify"):
+            try:
+                self._start_inotify()
+            except OSError:
+                if self.requested_backend == "inotify":
+                    raise
+                LOGGER.warning("inotify unavailable; library watcher falls back to polling", exc_info=True)
+        if self._inotify is not None:
+            self.backend = "inotify"
+            self._wake = os.pipe()
+            target = self._run_inotify
+        else:
+            self.backend = "polling"
+            self._baseline = self._snapshot()
+            target = self._run_polling
+        self._thread = threading.Thread(target=target, name="markinote-library-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._wake is not None:
+            os.write(self._wake[1], b"\0")
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+            self._watches.clear()
+        if self._wake is not None:
+            for fd in self._wake:
+                os.close(fd)
+            self._wake = None
+
+    def _publish(self, changes: list[LibraryChange]) -> None:
+        if not changes:
+            return
+        for change in changes:
+            LIBRARY_WATCHER_EVENTS.labels(change.kind).inc()
+        with self._subscribers_lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber(changes)
+            except Exception:
+                LOGGER.exception("library change subscriber failed")
+
+    # inotify backend -------------------------------------------------
+
+    def _start_inotify(self) -> None:
+        self._inotify = _Inotify()
+        try:
+            self._watch_tree(self.root, "")
+        except OSError:
+            self._inotify.close()
+            self._inotify = None
+            self._watches.clear()
+            raise
+
+    def _watch_tree(self, directory: Path, prefix: str) -> None:
+        assert self._inotify is not None
+        stack = [(directory, prefix)]
+        while stack:
+            current, current_prefix = stack.pop()
+            try:
+                wd = self._inotify.add_watch(current)
+            except OSError as exc:
+                # The watch limit is a configuration problem; a vanished
+                # directory is an ordinary race with an external writer.
+                if exc.errno in (errno.ENOSPC, errno.ENOMEM) or current == self.root:
+                    raise
+                continue
+            self._watches[wd] = current_prefix
+            try:
+                with os.scandir(current) as entries:
+                    for entry in entries:
+                        if entry.name.startswith(".") or entry.is_symlink():
+                            continue
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append((Path(entry.path), _join(current_prefix, entry.name)))
+            except OSError:
+                continue
+
+    def _rename_watches(self, source: str, destination: str) -> None:
+        prefix = source + "/"
+        for wd, path in list(self._watches.items()):
+            if path == source:
+                self._watches[wd] = destination
+            elif path.startswith(prefix):
+                self._watches[wd] = destination + path[len(source):]
+
+    def _run_inotify(self) -> None:
+        assert self._inotify is not None
+        coalescer = _Coalescer()
+        poller = select.poll()
+        poller.register(self._inotify.fd, select.POLLIN)
+        assert self._wake is not None
+        poller.register(self._wake[0], select.POLLIN)
+        burst_started = last_event = time.monotonic()
+        while not self._stop.is_set():
+            timeout = self.debounce if coalescer else 0.5
+            ready = poller.poll(timeout * 1000)
+            now = time.monotonic()
+            if ready:
+                if not coalescer:
+                    burst_started = now
+                for change in self._translate(self._inotify.read()):
+                    coalescer.add(change)
+                last_event = now
+            if coalescer and (
+                now - last_event >= self.debounce or now - burst_started >= _MAX_BURST_SECONDS
+            ):
+                self._publish(coalescer.drain())
+
+    def _translate(self, raw_events: list[tuple[int, int, int, str]]) -> list[LibraryChange]:
+        changes: list[LibraryChange] = []
+        moved_from: dict[int, tuple[str, bool]] = {}
+        for wd, mask, cookie, name in raw_events:
+            if mask & _IN_Q_OVERFLOW:
+                LOGGER.warning("inotify queue overflowed; requesting a full library resync")
+                changes.append(LibraryChange("modified", "", True))
+                continue
+            if mask & _IN_IGNORED or mask & _IN_DELETE_SELF:
+                self._watches.pop(wd, None)
+                continue
+            parent = self._watches.get(wd)
+            if parent is None or not name:
+                continue
+            path = _join(parent, name)
+            is_directory = bool(mask & _IN_ISDIR)
+            if mask & _IN_MOVED_FROM:
+                moved_from[cookie] = (path, is_directory)
+                continue
+            if mask & _IN_MOVED_TO:
+                source = moved_from.pop(cookie, None)
+                if source is not None and not _hidden(source[0]):
+                    if _hidden(path):
+                        changes.append(LibraryChange("deleted", source[0], source[1]))
+                    else:
+                        changes.append(LibraryChange("moved", path, is_directory, source[0]))
+                    if is_directory:
+                        self._rename_watches(source[0], path)
+                    continue
+                if _hidden(path):
+                    continue
+                if is_directory:
+                    self._watch_tree(self.root / path, path)
+                # A hidden source is an atomic same-directory replacement.
+                changes.append(LibraryChange("modified" if source else "created", path, is_directory))
+                continue
+            if _hidden(path):
+                continue
+            if mask & _IN_CREATE:
+                if is_directory:
+                    self._watch_tree(self.root / path, path)
+                changes.append(LibraryChange("created", path, is_directory))
+            elif mask & _IN_DELETE:
+                changes.append(LibraryChange("deleted", path, is_directory))
+            elif mask & (_IN_MODIFY | _IN_CLOSE_WRITE) and not is_directory:
+                changes.append(LibraryChange("modified", path))
+        # A rename out of the library arrives without its MOVED_TO half.
+        for path, is_directory in moved_from.values():
+            if not _hidden(path):
+                changes.append(LibraryChange("deleted", path, is_directory))
+        return changes
+
+    # polling backend -------------------------------------------------
+
+    def _snapshot(self) -> dict[str, tuple[bool, int, int, int]]:
+        snapshot: dict[str, tuple[bool, int, int, int]] = {}
+        stack = [(self.root, "")]
+        while stack:
+            current, prefix = stack.pop()
+            try:
+                entries = os.scandir(current)
+            except OSError:
+                continue
+            with entries:
+                for entry in entries:
+                    if entry.name.startswith("."):
+                        continue
+                    try:
+                        if entry.is_symlink():
+                            continue
+                        stat_info = entry.stat(follow_symlinks=False)
+                        is_directory = entry.is_dir(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    relative = _join(prefix, entry.name)
+                    snapshot[relative] = (
+                        is_directory,
+                        stat_info.st_ino,
+                        0 if is_directory else stat_info.st_size,
+                        0 if is_directory else stat_info.st_mtime_ns,
+                    )
+                    if is_directory:
+                        stack.append((Path(entry.path), relative))
+        return snapshot
+
+    @staticmethod
+    def _diff(
+        before: dict[str, tuple[bool, int, int, int]],
+        after: dict[str, tuple[bool, int, int, int]],
+    ) -> list[LibraryChange]:
+        removed = {path: before[path] for path in before.keys() - after.keys()}
+        added = {path: after[path] for path in after.keys() - before.keys()}
+        # A rename keeps inode, size, and mtime; matching on all of them keeps
+        # a freshly created file that reuses a deleted inode from looking moved.
+        by_inode = {value: path for path, value in removed.items()}
+        changes: list[LibraryChange] = []
+        moved_roots: list[tuple[str, str]] = []
+        for path in sorted(added):
+            is_directory = added[path][0]
+            if any(path.startswith(destination + "/") for _, destination in moved_roots):
+                removed.pop(by_inode.get(added[path], ""), None)
+                continue
+            source = by_inode.get(added[path])
+            if source is not None and source in removed:
+                del removed[source]
+                changes.append(LibraryChange("moved", path, is_directory, source))
+                if is_directory:
+                    moved_roots.append((source, path))
+            else:
+                changes.append(LibraryChange("created", path, is_directory))
+        for path in sorted(removed):
+            if any(path.startswith(source + "/") for source, _ in moved_roots):
+                continue
+            changes.append(LibraryChange("deleted", path, removed[path][0]))
+        for path in sorted(before.keys() & after.keys()):
+            if before[path] != after[path] and not after[path][0]:
+                changes.append(LibraryChange("modified", path))
+        return changes
+
+    def _run_polling(self) -> None:
+        previous = self._baseline
+        while not self._stop.wait(self.poll_interval):
+            current = self._snapshot()
+            coalescer = _Coalescer()
+            for change in self._diff(previous, current):
+                coalescer.add(change)
+            previous = current
+            self._publish(coalescer.drain())
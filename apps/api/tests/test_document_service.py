@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import tempfile
 import threading
+import time
 import unittest
 from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
@@ -15,6 +16,7 @@ from markinote_api.modules.documents.errors import (
 )
 from markinote_api.modules.documents.service import DocumentService
 from markinote_api.modules.documents.storage import LocalDocumentStorage
+from markinote_api.platform.path_locks import path_locks
 
 
 class DocumentServiceTestCase(unittest.TestCase):
@@ -23,7 +25,12 @@ class DocumentServiceTestCase(unittest.TestCase):
         self.root = Path(self.temp.name)
         self.service = self._build_service()
 
-    def _build_service(self, *, max_library_bytes: int = 16 * 1024 * 1024) -> DocumentService:
+    def _build_service(
+        self,
+        *,
+        max_library_bytes: int = 16 * 1024 * 1024,
+        save_coalesce_seconds: float = 0.0,
+    ) -> DocumentService:
         storage = LocalDocumentStorage(
             self.root / "library",
             self.root / "trash",
@@ -33,7 +40,7 @@ class DocumentServiceTestCase(unittest.TestCase):
             trash_max_items=20,
             trash_max_bytes=16 * 1024 * 1024,
         )
-        return DocumentService(storage)
+        return DocumentService(storage, save_coalesce_seconds=save_coalesce_seconds)
 
     def tearDown(self):
         self.temp.cleanup()
@@ -171,5 +178,86 @@ class DocumentServiceTestCase(unittest.TestCase):
             [old["id"]],
         )
 
+    def test_coalesced_saves_write_the_newest_and_keep_versions_exact(self):
+        service = self._build_service(save_coalesce_seconds=60)
+        self.addCleanup(service.close)
+        service.create_file("", "note.md", "v0")
+        on_disk = service.storage.root / "note.md"
+
+        first = service.save("note.md", "v1", coalesce=True)
+        second = service.save("note.md", "v2", expected_version=first["version"], coalesce=True)
+        third = service.save("note.md", "v3", expected_version=second["version"], coalesce=True)
+        self.assertEqual(on_disk.read_text(encoding="utf-8"), "v1")
+        with self.assertRaises(DocumentConflict) as stale:
+            service.save("note.md", "lost", expected_version=second["version"], coalesce=True)
+        self.assertEqual(stale.exception.details["current_version"], third["version"])
+
+        # Reads write the held save first and report the acknowledged version.
+        read = service.read("note.md")
+        self.assertEqual((read["content"], read["version"]), ("v3", third["version"]))
+
+        held = service.save("note.md", "v4", expected_version=third["version"], coalesce=True)
+        service.rename("note.md", "renamed.md")
+        self.assertEqual(service.read("renamed.md")["version"], held["version"])
+
+        # A change behind the coalescer's back is checked against the disk.
+        service.save("renamed.md", "v5", coalesce=True)
+        (service.storage.root / "renamed.md").write_text("external", encoding="utf-8")
+        with self.assertRaises(DocumentConflict):
+            service.save("renamed.md", "v6", expected_version=held["version"], coalesce=True)
+
+    def test_held_saves_are_written_when_the_window_ends_and_on_close(self):
+        service = self._build_service(save_coalesce_seconds=0.05)
+        service.create_file("", "note.md", "v0")
+        on_disk = service.storage.root / "note.md"
+        first = service.save("note.md", "v1", coalesce=True)
+        service.save("note.md", "v2", expected_version=first["version"], coalesce=True)
+        deadline = time.monotonic() + 5
+        while on_disk.read_text(encoding="utf-8") != "v2" and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(on_disk.read_text(encoding="utf-8"), "v2")
+
+        service.storage.root.joinpath("other.md").write_text("o0", encoding="utf-8")
+        closing = self._build_service(save_coalesce_seconds=60)
+        first = closing.save("other.md", "o1", coalesce=True)
+        closing.save("other.md", "o2", expected_version=first["version"], coalesce=True)
+        closing.close()
+        self.assertEqual(service.storage.root.joinpath("other.md").read_text(encoding="utf-8"), "o2")
+        service.close()
+
+    def test_coalesced_save_does_not_hold_the_coalescer_while_waiting_for_path_locks(self):
+        service = self._build_service(save_coalesce_seconds=60)
+        self.addCleanup(service.close)
+        service.create_file("", "note.md", "v0")
+        first = service.save("note.md", "v1", coalesce=True)
+        service.save("note.md", "v2", expected_version=first["version"], coalesce=True)
+        locked = threading.Event()
+        saving = threading.Event()
+        results: list[dict] = []
+
+        def agent_tool():
+            # Agent tools flush the held saves of the paths they have locked.
+            with path_locks(service.storage.root).exclusive("note.md"):
+                locked.set()
+                saving.wait(5)
+                time.sleep(0.1)
+                service._saves.flush("note.md", wait=False)
+
+        def save():
+            saving.set()
+            results.append(service.save("note.md", "v3", coalesce=True))
+
+        tool = threading.Thread(target=agent_tool, daemon=True)
+        tool.start()
+        locked.wait(5)
+        saver = threading.Thread(target=save, daemon=True)
+        saver.start()
+        tool.join(5)
+        saver.join(5)
+        self.assertFalse(tool.is_alive() or saver.is_alive(), "coalesced save deadlocked with a locked flush")
+        read = service.read("note.md")
+        self.assertEqual((read["content"], read["version"]), ("v3", results[0]["version"]))
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -1,20 +1,32 @@
 from __future__ import annotations
 
 import json
+import random
+import threading
 from datetime import UTC, datetime
+from io import BytesIO
 from pathlib import Path
 
 import pytest
 
+from markinote_api.modules.documents import content_index as content_index_module
+from markinote_api.modules.documents import search_index as search_index_module
+from markinote_api.modules.documents import size_ledger as size_ledger_module
 from markinote_api.modules.documents import storage as storage_module
 from markinote_api.modules.documents.errors import (
     DocumentAlreadyExists,
     DocumentCapacityExceeded,
+    DocumentConflict,
     DocumentNotFound,
     DocumentValidationError,
 )
+from markinote_api.modules.documents.importer import ImportCheckpoint, LibraryImporter
 from markinote_api.modules.documents.service import DocumentService
 from markinote_api.modules.documents.storage import LocalDocumentStorage
+from markinote_api.platform import io as io_module
+from markinote_api.platform.file_locks import configure_file_locks
+from markinote_api.platform.io import content_version
+from markinote_api.platform.path_locks import path_locks
 
 
 def build_storage(
@@ -128,6 +140,294 @@ def test_search_covers_the_full_library_with_bounded_ranked_results(tmp_path: Pa
         service.search("   ")
 
 
+def test_search_index_follows_mutations_without_walking_the_library(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    storage = build_storage(tmp_path)
+    service = DocumentService(storage)
+    service.create_folder("", "Projects")
+    service.create_file("Projects", "alpha-plan.md", "a")
+    service.create_folder("", "Archive")
+    assert storage.rebuild_search_index() == 3
+
+    def search(query: str) -> set[str]:
+        with monkeypatch.context() as patch:
+            patch.setattr(
+                search_index_module.os,
+                "scandir",
+                lambda *_args: pytest.fail("search must be answered by the index"),
+            )
+            return {item["path"] for item in service.search(query, limit=50)["items"]}
+
+    service.rename("Projects/alpha-plan.md", "beta-plan.md")
+    assert search("alpha") == set()
+    assert search("pl") == {"Projects/beta-plan.md"}
+
+    service.move("Projects", "Archive")
+    assert search("beta-plan") == {"Archive/Projects/beta-plan.md"}
+    # Rebuilds and subtree refreshes append entries and sort once.
+    index = storage._search_index
+    assert index._paths == sorted(index._entries)
+    assert index._gram_keys == sorted(index._postings)
+    assert search("archive/proj") == {"Archive/Projects", "Archive/Projects/beta-plan.md"}
+
+    deleted = service.delete("Archive/Projects")
+    assert search("beta") == set()
+    service.restore(deleted["id"])
+    assert search("beta") == {"Archive/Projects/beta-plan.md"}
+
+    (storage.root / "Archive" / "external.md").write_text("synced", encoding="utf-8")
+    assert search("external") == set()
+    storage.refresh_indexes("Archive/external.md")
+    assert search("external") == {"Archive/external.md"}
+
+    (storage.root / "Archive" / "external.md").unlink()
+    result = service.search("external", limit=10)
+    assert result["items"] == []
+    assert result["total"] == 0
+
+
+def test_content_index_ranks_lines_and_follows_mutations(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    storage = build_storage(tmp_path)
+    service = DocumentService(storage)
+    service.create_folder("", "Notes")
+    service.create_file("Notes", "kernel.md", "# Kernel\n\nscheduler notes\nthe scheduler runs\n")
+    service.create_file("", "misc.md", "one scheduler mention among many other words here\n")
+    service.create_file("", "中文.md", "第一行\n全文检索的实现\n")
+    storage.rebuild_search_index()
+
+    def search(query: str, path: str = "") -> dict:
+        with monkeypatch.context() as patch:
+            patch.setattr(
+                search_index_module.os,
+                "scandir",
+                lambda *_args: pytest.fail("content search must be answered by the index"),
+            )
+            return service.search_content(query, path=path, limit=10)
+
+    result = search("Scheduler")
+    assert [item["path"] for item in result["items"]] == ["Notes/kernel.md", "misc.md"]
+    assert result["items"][0]["matches"] == [
+        {"line": 3, "text": "scheduler notes"},
+        {"line": 4, "text": "the scheduler runs"},
+    ]
+    assert search("sched")["total"] == 2
+    assert search("scheduler runs")["total"] == 1
+    assert [item["path"] for item in search("scheduler", path="Notes")["items"]] == ["Notes/kernel.md"]
+    assert search("检索")["items"][0]["matches"] == [{"line": 2, "text": "全文检索的实现"}]
+    assert search("索")["total"] == 1
+
+    service.save("misc.md", "nothing relevant\n")
+    assert search("scheduler")["total"] == 1
+    service.rename("Notes", "Systems")
+    assert [item["path"] for item in search("scheduler")["items"]] == ["Systems/kernel.md"]
+    deleted = service.delete("Systems")
+    assert search("scheduler")["total"] == 0
+    service.restore(deleted["id"])
+    assert search("scheduler")["total"] == 1
+
+    # Out-of-band edits to an indexed document are revalidated on query.
+    (storage.root / "Systems" / "kernel.md").write_text("rewritten\n", encoding="utf-8")
+    assert search("scheduler")["items"] == []
+    assert search("rewritten")["total"] == 1
+    with pytest.raises(DocumentValidationError):
+        service.search_content("   ")
+    with pytest.raises(DocumentNotFound):
+        service.search_content("scheduler", path="missing")
+
+
+def test_content_index_tokenizes_saves_outside_its_lock(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    storage = build_storage(tmp_path)
+    service = DocumentService(storage)
+    service.create_folder("", "Notes")
+    service.create_folder("", "Other")
+    service.create_file("Notes", "draft.md", "draft\n")
+    service.create_file("Other", "kernel.md", "scheduler notes\n")
+    storage.rebuild_search_index()
+
+    tokenizing = threading.Event()
+    release = threading.Event()
+    tokenize = content_index_module.tokenize
+
+    def slow_tokenize(text: str):
+        if "slow" in text:
+            tokenizing.set()
+            release.wait(10)
+        return tokenize(text)
+
+    monkeypatch.setattr(content_index_module, "tokenize", slow_tokenize)
+    saver = threading.Thread(target=service.save, args=("Notes/draft.md", "slow schedule\n"), daemon=True)
+    saver.start()
+    results: list[dict] = []
+    searcher = threading.Thread(
+        target=lambda: results.append(service.search_content("scheduler", path="Other")),
+        daemon=True,
+    )
+    try:
+        assert tokenizing.wait(10)
+        searcher.start()
+        searcher.join(5)
+        assert not searcher.is_alive(), "search waited for a save to be tokenized"
+    finally:
+        release.set()
+        saver.join(10)
+    assert not saver.is_alive()
+    assert [item["path"] for item in results[0]["items"]] == ["Other/kernel.md"]
+
+    # Prefix queries see terms added, removed and added again.
+    assert service.search_content("sched")["total"] == 2
+    service.save("Notes/draft.md", "draft\n")
+    assert service.search_content("schedule")["total"] == 1
+    service.save("Notes/draft.md", "schedule again\n")
+    assert service.search_content("schedule")["total"] == 2
+    assert service.search_content("again")["total"] == 1
+
+
+def test_content_index_vocabulary_follows_term_churn_without_rebuilding(tmp_path: Path) -> None:
+    storage = build_storage(tmp_path, max_document_bytes=64 * 1024)
+    words = [f"term{index:03d}" for index in range(600)]
+    for index in range(4):
+        storage.create_file("", f"{index}.md", " ".join(words[index::4]).encode("utf-8"))
+    storage.rebuild_search_index()
+    index = storage._content_index
+
+    generator = random.Random(7)
+    for step in range(300):
+        path = f"{step % 4}.md"
+        content = " ".join([*generator.sample(words, 40), f"fresh{step}"]).encode("utf-8")
+        storage.save(path, content)
+        for prefix in ("term1", "term00", "fresh", "fresh1"):
+            expected = sorted(term for term in index._postings if term.startswith(prefix))
+            assert sorted(index._expand(prefix, True)) == expected
+    assert index._dead_terms * 2 <= len(index._vocabulary) + len(index._recent_terms)
+
+    # A term losing its last posting is skipped by prefix queries, not filtered out.
+    storage.create_file("", "solo.md", b"solitary")
+    listed = index._vocabulary
+    storage.save("solo.md", b"term001")
+    assert index._expand("solit", True) == []
+    assert index._vocabulary is listed
+
+
+def test_library_size_ledger_enforces_quota_without_walking_and_reconciles_drift(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    storage = build_storage(tmp_path, max_library_bytes=100, max_document_bytes=100)
+    service = DocumentService(storage)
+    service.create_file("", "a.md", "x" * 40)
+    assert storage._library_size() == 40
+
+    with monkeypatch.context() as patch:
+        patch.setattr(
+            storage_module.os,
+            "walk",
+            lambda *_args, **_kwargs: pytest.fail("capacity checks must use the ledger"),
+        )
+        service.save("a.md", "x" * 30)
+        service.create_folder("", "Folder")
+        service.upload("Folder", "b.md", b"y" * 50)
+        service.rename("Folder/b.md", "c.md")
+        with pytest.raises(DocumentCapacityExceeded):
+            service.create_file("", "d.md", "z" * 21)
+        service.create_file("", "d.md", "z" * 20)
+        assert storage._library_size() == 100
+        storage.delete_with_external_snapshot("d.md")
+        assert storage._library_size() == 80
+
+    deleted = service.delete("Folder")
+    assert storage._library_size() == 30
+    service.restore(deleted["id"])
+    assert storage._library_size() == 80
+
+    (storage.root / "external.md").write_bytes(b"e" * 15)
+    assert storage.reconcile_library_size() == 15
+    assert storage._library_size() == 95
+    assert storage.reconcile_library_size() == 0
+    with pytest.raises(DocumentCapacityExceeded):
+        service.create_file("", "f.md", "f" * 6)
+
+    (storage.root / "external.md").unlink()
+    storage.refresh_indexes("external.md")
+    service.create_file("", "f.md", "f" * 20)
+    assert storage._library_size() == 100
+
+
+def test_library_size_ledger_is_shared_by_workers_with_the_file_lock_backend(tmp_path: Path) -> None:
+    configure_file_locks("file", tmp_path / "locks", stripes=8, timeout=1)
+    try:
+        # Two adapters of one library stand in for two worker processes.
+        first = DocumentService(build_storage(tmp_path, max_library_bytes=100, max_document_bytes=100))
+        second = DocumentService(build_storage(tmp_path, max_library_bytes=100, max_document_bytes=100))
+        first.create_file("", "a.md", "x" * 60)
+        with pytest.raises(DocumentCapacityExceeded):
+            second.create_file("", "b.md", "y" * 41)
+        second.create_file("", "b.md", "y" * 40)
+        with pytest.raises(DocumentCapacityExceeded):
+            first.save("a.md", "x" * 61)
+
+        # Reservations of a worker that no longer exists do not count.
+        ledger_path = tmp_path / "trash" / size_ledger_module.LEDGER_NAME
+        ledger = json.loads(ledger_path.read_text(encoding="utf-8"))
+        ledger["reserved"] = {str(2**31 - 1): 50}
+        ledger_path.write_text(json.dumps(ledger), encoding="utf-8")
+        second.delete("b.md")
+        first.create_file("", "c.md", "z" * 40)
+
+        (tmp_path / "library" / "external.md").write_bytes(b"e" * 5)
+        assert second.storage.reconcile_library_size() == 5
+        with pytest.raises(DocumentCapacityExceeded):
+            first.create_file("", "d.md", "")
+    finally:
+        configure_file_locks("process")
+
+
+def test_folder_tree_is_cached_until_a_folder_mutation(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    storage = build_storage(tmp_path)
+    service = DocumentService(storage)
+    service.create_folder("", "Docs")
+    tree, generation = storage.folder_tree()
+    assert [item["path"] for item in tree] == ["", "Docs"]
+
+    with monkeypatch.context() as patch:
+        patch.setattr(
+            storage,
+            "_scan_folders",
+            lambda: pytest.fail("the folder tree must come from the cache"),
+        )
+        service.create_file("Docs", "a.md", "a")
+        service.save("Docs/a.md", "b")
+        service.rename("Docs/a.md", "b.md")
+        service.delete("Docs/b.md")
+        assert storage.folder_tree() == (tree, generation)
+
+    service.upload("Docs/Uploaded", "c.md", b"c")
+    tree, next_generation = storage.folder_tree()
+    assert next_generation > generation
+    assert [item["path"] for item in tree] == ["", "Docs", "Docs/Uploaded"]
+
+    for mutate in (
+        lambda: service.rename("Docs/Uploaded", "Renamed"),
+        lambda: service.restore(service.delete("Docs/Renamed")["id"]),
+        lambda: storage.refresh_indexes("Docs"),
+    ):
+        generation = next_generation
+        mutate()
+        _, next_generation = storage.folder_tree()
+        assert next_generation > generation
+    assert [item["path"] for item in storage.folders()] == ["", "Docs", "Docs/Renamed"]
+
+
 def test_storage_rejects_invalid_content_and_parent_shapes(tmp_path: Path) -> None:
     storage = build_storage(tmp_path, max_document_bytes=5)
     service = DocumentService(storage)
@@ -254,6 +554,46 @@ def test_trash_capacity_pruning_and_corrupt_records_are_fail_closed(
         service.restore(deleted["id"])
 
 
+def test_trash_ledger_prunes_and_lists_without_walking_and_rebuilds_when_lost(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    storage = build_storage(tmp_path, trash_max_items=3, trash_max_bytes=0)
+    service = DocumentService(storage)
+    deleted = []
+    for index in range(5):
+        service.create_file("", f"n{index}.md", "x" * (index + 1))
+        deleted.append(service.delete(f"n{index}.md")["id"])
+
+    with monkeypatch.context() as patch:
+        patch.setattr(
+            storage_module.LocalDocumentStorage,
+            "_path_size",
+            staticmethod(lambda _path: pytest.fail("the ledger must answer without sizing")),
+        )
+        assert [item["id"] for item in service.list_trash()["items"]] == deleted[:1:-1]
+        storage._prune_trash_capacity()
+    assert sorted(path.name for path in storage.trash_root.iterdir() if path.is_dir()) == sorted(
+        deleted[2:]
+    )
+
+    service.restore(deleted[3])
+    assert [item["id"] for item in service.list_trash()["items"]] == [deleted[4], deleted[2]]
+
+    # A lost ledger is rebuilt from the record directories by a fresh process.
+    (storage.trash_root / ".ledger.jsonl").unlink()
+    restarted = DocumentService(build_storage(tmp_path, trash_max_items=3, trash_max_bytes=0))
+    assert [item["id"] for item in restarted.list_trash()["items"]] == [deleted[4], deleted[2]]
+
+    # A record whose ledger line never made it to disk is found on first load.
+    service.create_file("", "late.md", "late")
+    late = service.delete("late.md")["id"]
+    ledger = storage.trash_root / ".ledger.jsonl"
+    ledger.write_bytes(b"".join(ledger.read_bytes().splitlines(keepends=True)[:-1]))
+    restarted = DocumentService(build_storage(tmp_path, trash_max_items=3, trash_max_bytes=0))
+    assert restarted.list_trash()["items"][0]["id"] == late
+
+
 def test_storage_configuration_keeps_trash_outside_the_library(tmp_path: Path) -> None:
     with pytest.raises(ValueError, match="TRASH_FOLDER"):
         LocalDocumentStorage(
@@ -265,3 +605,280 @@ def test_storage_configuration_keeps_trash_outside_the_library(tmp_path: Path) -
             trash_max_items=1,
             trash_max_bytes=1,
         )
+
+
+def test_read_save_and_polls_share_the_version_cache(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    storage = build_storage(tmp_path)
+    service = DocumentService(storage)
+    service.create_file("", "note.md", "first")
+    version = service.read("note.md")["version"]
+
+    monkeypatch.setattr(io_module, "file_version", lambda _path: pytest.fail("version must be cached"))
+    assert service.check_updates("", "note.md")["version"] == version
+    saved = service.save("note.md", "second", expected_version=version)
+    assert service.check_updates("", "note.md")["version"] == saved["version"]
+    with pytest.raises(DocumentConflict):
+        service.save("note.md", "third", expected_version=version)
+
+    monkeypatch.undo()
+    (storage.root / "note.md").write_text("external edit", encoding="utf-8")
+    assert service.check_updates("", "note.md")["version"] == content_version("external edit")
+
+
+def test_streamed_upload_hashes_in_flight_and_leaves_nothing_when_rejected(
+    tmp_path: Path,
+) -> None:
+    storage = build_storage(tmp_path)
+    service = DocumentService(storage)
+    content = ("line of streamed text\n" * 40).encode("utf-8")
+
+    uploaded = service.upload("Inbox", "stream.md", BytesIO(content))
+    assert uploaded["size"] == len(content)
+    assert uploaded["version"] == content_version(content)
+    assert service.read("Inbox/stream.md")["version"] == uploaded["version"]
+
+    with pytest.raises(DocumentCapacityExceeded):
+        service.upload("Fresh/Nested", "large.md", BytesIO(b"x" * 2048))
+    assert not (storage.root / "Fresh").exists()
+    assert sorted(path.name for path in storage.root.iterdir()) == ["Inbox"]
+    assert sorted(path.name for path in (storage.root / "Inbox").iterdir()) == ["stream.md"]
+
+
+def test_listing_pages_with_stable_keyset_cursors_over_cached_snapshots(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    storage = build_storage(tmp_path)
+    service = DocumentService(storage)
+    service.create_folder("", "Zeta")
+    service.create_folder("", "alpha")
+    for name, size in (("b.md", 3), ("A.md", 1), ("c.md", 2)):
+        service.create_file("", name, "x" * size)
+
+    def names(**options) -> list[str]:
+        collected: list[str] = []
+        cursor = None
+        while True:
+            result = service.list(limit=2, cursor=cursor, **options)
+            collected.extend(item["name"] for item in result["items"])
+            cursor = result["next_cursor"]
+            if cursor is None:
+                return collected
+
+    assert names() == ["alpha", "Zeta", "A.md", "b.md", "c.md"]
+    assert names(order="desc") == ["Zeta", "alpha", "c.md", "b.md", "A.md"]
+    assert names(sort="size", order="desc")[2:] == ["b.md", "c.md", "A.md"]
+
+    first = service.list(limit=3)
+    assert first["total"] == 5
+    monkeypatch.setattr(
+        storage_module.os, "scandir", lambda *_args: pytest.fail("pages must reuse the snapshot")
+    )
+    assert [item["name"] for item in service.list(limit=3)["items"]] == ["alpha", "Zeta", "A.md"]
+    monkeypatch.undo()
+
+    # Entries added before the cursor do not shift the following page.
+    service.create_file("", "0-first.md", "new")
+    rest = service.list(limit=10, cursor=first["next_cursor"])
+    assert [item["name"] for item in rest["items"]] == ["b.md", "c.md"]
+    assert rest["next_cursor"] is None and rest["total"] == 6
+
+    service.save("c.md", "x" * 9)
+    assert names(sort="size", order="desc")[2] == "c.md"
+
+    with pytest.raises(DocumentValidationError):
+        service.list(limit=2, sort="size", cursor=first["next_cursor"])
+    with pytest.raises(DocumentValidationError):
+        service.list(cursor="not a cursor")
+
+
+def test_batch_applies_in_order_and_atomic_batches_compensate_on_failure(
+    tmp_path: Path,
+) -> None:
+    storage = build_storage(tmp_path)
+    service = DocumentService(storage)
+    service.create_folder("", "Inbox")
+    service.create_file("Inbox", "a.md", "original")
+    service.create_file("", "old.md", "old")
+
+    result = service.batch(
+        [
+            {"op": "create_folder", "path": "", "name": "Archive"},
+            {"op": "move", "source": "Inbox/a.md", "target": "Archive"},
+            {"op": "rename", "old_path": "Archive/a.md", "new_name": "b.md"},
+            {"op": "delete", "path": "missing.md"},
+            {"op": "save", "path": "Archive/b.md", "content": "edited"},
+        ]
+    )
+    assert result["committed"] is False
+    assert [item["status"] for item in result["results"]] == [
+        "applied", "applied", "applied", "failed", "applied",
+    ]
+    assert result["results"][3]["error"]["code"] == "document_not_found"
+    assert service.read("Archive/b.md")["content"] == "edited"
+
+    before = sorted(path.relative_to(storage.root).as_posix() for path in storage.root.rglob("*"))
+    used = storage._library_size()
+    atomic = service.batch(
+        [
+            {"op": "create_file", "path": "Archive", "name": "new.md", "content": "fresh"},
+            {"op": "save", "path": "Archive/b.md", "content": "overwritten"},
+            {"op": "rename", "old_path": "old.md", "new_name": "renamed.md"},
+            {"op": "delete", "path": "Inbox"},
+            {"op": "create_folder", "path": "", "name": "Archive"},
+            {"op": "delete", "path": "Archive/b.md"},
+        ],
+        atomic=True,
+    )
+    assert atomic["committed"] is False
+    assert [item["status"] for item in atomic["results"]] == [
+        "rolled_back", "rolled_back", "rolled_back", "rolled_back", "failed", "skipped",
+    ]
+    assert sorted(path.relative_to(storage.root).as_posix() for path in storage.root.rglob("*")) == before
+    assert service.read("Archive/b.md")["content"] == "edited"
+    assert storage._library_size() == used
+    assert service.list_trash()["items"] == []
+
+    with pytest.raises(DocumentValidationError) as invalid:
+        service.batch(
+            [
+                {"op": "create_folder", "path": "", "name": "Never"},
+                {"op": "create_file", "path": "", "name": "bad.exe"},
+            ]
+        )
+    assert invalid.value.details["index"] == 1
+    assert not (storage.root / "Never").exists()
+
+
+def test_atomic_batch_prunes_the_trash_only_after_it_finishes(tmp_path: Path) -> None:
+    storage = build_storage(tmp_path, trash_max_items=1)
+    service = DocumentService(storage)
+    service.create_file("", "a.md", "a")
+    service.create_file("", "b.md", "b")
+
+    atomic = service.batch(
+        [
+            {"op": "delete", "path": "a.md"},
+            {"op": "delete", "path": "b.md"},
+            {"op": "save", "path": "missing.md", "content": "x"},
+        ],
+        atomic=True,
+    )
+    assert [item["status"] for item in atomic["results"]] == ["rolled_back", "rolled_back", "failed"]
+    assert service.read("a.md")["content"] == "a"
+    assert service.read("b.md")["content"] == "b"
+    assert service.list_trash()["items"] == []
+
+    committed = service.batch(
+        [{"op": "delete", "path": "a.md"}, {"op": "delete", "path": "b.md"}],
+        atomic=True,
+    )
+    assert committed["committed"] is True
+    assert [item["original_path"] for item in service.list_trash()["items"]] == ["b.md"]
+
+
+def test_batch_reserves_its_net_growth_once_for_the_whole_batch(tmp_path: Path) -> None:
+    storage = build_storage(tmp_path, max_library_bytes=100, max_document_bytes=100)
+    service = DocumentService(storage)
+    service.create_file("", "a.md", "x" * 60)
+
+    # Creating b.md alone would not fit, but the batch as a whole shrinks the library.
+    result = service.batch(
+        [
+            {"op": "create_file", "path": "", "name": "b.md", "content": "y" * 50},
+            {"op": "save", "path": "a.md", "content": "x" * 5},
+        ],
+        atomic=True,
+    )
+    assert result["committed"] is True
+    assert storage._library_size() == 55
+    assert storage._reserved_bytes == 0
+
+    with pytest.raises(DocumentCapacityExceeded):
+        service.batch([{"op": "create_file", "path": "", "name": "c.md", "content": "z" * 50}])
+    assert not (storage.root / "c.md").exists()
+    assert storage._reserved_bytes == 0
+
+
+def test_mutations_in_disjoint_subtrees_do_not_wait_for_each_other(tmp_path: Path) -> None:
+    storage = build_storage(tmp_path)
+    service = DocumentService(storage)
+    for folder in ("projects", "journal"):
+        service.create_folder("", folder)
+    service.create_file("projects", "a.md", "a")
+    service.create_file("journal", "entry.md", "e")
+    finished = threading.Event()
+
+    def save_elsewhere() -> None:
+        service.save("projects/a.md", "saved while journal is locked")
+        service.rename("projects/a.md", "b.md")
+        finished.set()
+
+    with path_locks(storage.root).exclusive("journal"):
+        worker = threading.Thread(target=save_elsewhere)
+        worker.start()
+        assert finished.wait(5)
+        reader = threading.Thread(target=service.read, args=("journal/entry.md",))
+        reader.start()
+        reader.join(0.1)
+        assert reader.is_alive()
+    reader.join(5)
+    worker.join(5)
+    assert service.read("projects/b.md")["content"] == "saved while journal is locked"
+
+
+def test_bulk_import_copies_in_parallel_skips_identical_files_and_resumes(tmp_path: Path) -> None:
+    storage = build_storage(tmp_path)
+    storage.rebuild_search_index()
+    source = tmp_path / "vault"
+    (source / "Projects" / "Alpha").mkdir(parents=True)
+    (source / ".obsidian").mkdir()
+    (source / ".obsidian" / "config.md").write_text("hidden", encoding="utf-8")
+    (source / "Projects" / "Alpha" / "plan.md").write_text("alpha plan", encoding="utf-8")
+    (source / "Projects" / "todo.txt").write_text("todo", encoding="utf-8")
+    (source / "image.png").write_bytes(b"png")
+    (source / "bad:name.md").write_text("rejected", encoding="utf-8")
+    (source / "existing.md").write_text("same", encoding="utf-8")
+    (source / "changed.md").write_text("new", encoding="utf-8")
+    (storage.root / "Imported").mkdir()
+    (storage.root / "Imported" / "existing.md").write_text("same", encoding="utf-8")
+    (storage.root / "Imported" / "changed.md").write_text("old", encoding="utf-8")
+
+    checkpoint_path = tmp_path / "import.jsonl"
+    checkpoint = ImportCheckpoint(checkpoint_path, source=source, target="Imported")
+    storage._library_size()
+    report = LibraryImporter(storage, workers=4, checkpoint=checkpoint).run(source, "Imported")
+    # The next capacity check measures the library with the imported bytes.
+    assert storage._library_bytes is None
+
+    summary = report.summary()
+    assert summary["statuses"] == {
+        "conflict": 1,
+        "created": 2,
+        "ignored": 1,
+        "rejected": 1,
+        "unchanged": 1,
+    }
+    assert summary["bytes_copied"] == len("alpha plan") + len("todo")
+    assert {issue["status"] for issue in summary["issues"]} == {"conflict", "rejected"}
+    assert (storage.root / "Imported" / "Projects" / "Alpha" / "plan.md").read_text(encoding="utf-8") == "alpha plan"
+    assert (storage.root / "Imported" / "changed.md").read_text(encoding="utf-8") == "old"
+    assert not (storage.root / "Imported" / ".obsidian").exists()
+    assert not list(storage.root.rglob("*.tmp"))
+    # Indexes are left to the serving API's library watcher.
+    assert storage.search("plan", limit=10)["items"] == []
+    storage.refresh_indexes("Imported")
+    assert [item["path"] for item in storage.search("plan", limit=10)["items"]] == [
+        "Imported/Projects/Alpha/plan.md"
+    ]
+
+    resumed = ImportCheckpoint(checkpoint_path, source=source, target="Imported")
+    assert len(resumed) == 3
+    second = LibraryImporter(storage, workers=2, overwrite=True, checkpoint=resumed).run(source, "Imported")
+    assert second.summary()["statuses"] == {"ignored": 1, "rejected": 1, "replaced": 1, "resumed": 3}
+    assert (storage.root / "Imported" / "changed.md").read_text(encoding="utf-8") == "new"
+    with pytest.raises(ValueError):
+        ImportCheckpoint(checkpoint_path, source=source, target="Elsewhere")
@@ -1,5 +1,8 @@
 from __future__ import annotations
 
+import json
+from unittest import mock
+
 from prometheus_client import REGISTRY
 
 from .test_platform_api import build_client
@@ -108,6 +111,221 @@ def test_document_search_returns_nested_files_and_bounded_metadata():
         }
         assert client.get("/api/v1/documents/search", params={"q": "x", "limit": 201}).status_code == 422
         assert client.get("/api/v1/documents/search", params={"q": "   "}).status_code == 400
+
+        content = client.get(
+            "/api/v1/documents/search",
+            params={"q": "TARGET", "mode": "content", "path": "Nested"},
+        )
+        assert content.status_code == 200
+        assert content.json()["total"] == 1
+        item = content.json()["items"][0]
+        assert item["path"] == "Nested/Architecture.md"
+        assert item["match_count"] == 1
+        assert item["matches"] == [{"line": 1, "text": "search target"}]
+        assert item["score"] > 0
+        assert client.get("/api/v1/documents/search", params={"q": "x", "mode": "regex"}).status_code == 422
+    finally:
+        client.close()
+        temp.cleanup()
+
+
+def test_folder_tree_is_revalidated_with_generation_etags():
+    client, temp = build_client()
+    try:
+        first = client.get("/api/v1/documents/folders")
+        assert first.status_code == 200
+        etag = first.headers["etag"]
+        assert first.headers["cache-control"] == "private, no-cache"
+        assert etag == f'"folders-{first.json()["generation"]}"'
+
+        unchanged = client.get("/api/v1/documents/folders", headers={"If-None-Match": f"W/{etag}"})
+        assert unchanged.status_code == 304
+        assert unchanged.content == b""
+        assert unchanged.headers["etag"] == etag
+
+        assert client.post("/api/v1/documents/files", json={"path": "", "name": "n.md"}).status_code == 200
+        assert client.get("/api/v1/documents/folders", headers={"If-None-Match": etag}).status_code == 304
+
+        assert client.post("/api/v1/documents/folders", json={"path": "", "name": "Fresh"}).status_code == 200
+        changed = client.get("/api/v1/documents/folders", headers={"If-None-Match": etag})
+        assert changed.status_code == 200
+        assert changed.headers["etag"] != etag
+        assert [item["path"] for item in changed.json()["folders"]] == ["", "Fresh"]
+    finally:
+        client.close()
+        temp.cleanup()
+
+
+def test_content_reads_revalidate_with_version_etags_and_serve_raw_files():
+    client, temp = build_client()
+    try:
+        body = "# Título\n\nraw body\n"
+        assert client.post(
+            "/api/v1/documents/files", json={"path": "", "name": "note.md", "content": body}
+        ).status_code == 200
+        first = client.get("/api/v1/documents/content", params={"path": "note.md"})
+        etag = first.headers["etag"]
+        assert first.headers["cache-control"] == "private, no-cache"
+
+        unchanged = client.get(
+            "/api/v1/documents/content", params={"path": "note.md"}, headers={"If-None-Match": etag}
+        )
+        assert unchanged.status_code == 304
+        assert unchanged.content == b""
+        assert unchanged.headers["etag"] == etag
+
+        raw = client.get("/api/v1/documents/content/raw", params={"path": "note.md"})
+        assert raw.status_code == 200
+        assert raw.content == body.encode("utf-8")
+        assert raw.headers["etag"] == etag
+        assert raw.headers["content-type"] == "text/markdown; charset=utf-8"
+        assert client.get(
+            "/api/v1/documents/content/raw", params={"path": "note.md"}, headers={"If-None-Match": etag}
+        ).status_code == 304
+
+        client.put("/api/v1/documents/content", params={"path": "note.md"}, json={"content": "v2"})
+        changed = client.get(
+            "/api/v1/documents/content", params={"path": "note.md"}, headers={"If-None-Match": etag}
+        )
+        assert changed.status_code == 200
+        assert changed.json()["content"] == "v2"
+        assert changed.headers["etag"] != etag
+        assert client.get(
+            "/api/v1/documents/content/raw", params={"path": "missing.md"}
+        ).status_code == 404
+    finally:
+        client.close()
+        temp.cleanup()
+
+
+def _prerender_count(outcome: str) -> float:
+    return REGISTRY.get_sample_value("markinote_document_prerenders_total", {"outcome": outcome}) or 0.0
+
+
+def test_saved_documents_are_prerendered_and_served_with_version_etags():
+    client, temp = build_client()
+    try:
+        prerenderer = client.app.state.document_prerenderer
+        rendered = _prerender_count("rendered")
+        assert client.post(
+            "/api/v1/documents/files", json={"path": "", "name": "view.md", "content": "# Viewed\r\n"}
+        ).status_code == 200
+        assert client.post(
+            "/api/v1/documents/upload",
+            data={"path": ""},
+            files={"file": ("upload.md", b"*uploaded*", "text/markdown")},
+        ).status_code == 200
+        # The single background worker runs renders in order.
+        prerenderer._executor.submit(lambda: None).result()
+        assert _prerender_count("rendered") == rendered + 2
+
+        with mock.patch(
+            "markinote_api.modules.documents.router.render_document", side_effect=AssertionError
+        ):
+            first = client.get("/api/v1/documents/rendered", params={"path": "view.md"})
+            uploaded = client.get("/api/v1/documents/rendered", params={"path": "upload.md"})
+        assert first.status_code == 200
+        assert first.json()["html"] == '<h1 id="md-viewed">Viewed</h1>'
+        assert uploaded.json()["html"] == "<p><em>uploaded</em></p>"
+        etag = first.headers["etag"]
+        assert etag.startswith(f'"{first.json()["version"]}-')
+        assert first.headers["cache-control"] == "private, no-cache"
+        assert client.get(
+            "/api/v1/documents/rendered", params={"path": "view.md"}, headers={"If-None-Match": etag}
+        ).status_code == 304
+
+        client.put("/api/v1/documents/content", params={"path": "view.md"}, json={"content": "v2"})
+        changed = client.get(
+            "/api/v1/documents/rendered", params={"path": "view.md"}, headers={"If-None-Match": etag}
+        )
+        assert changed.status_code == 200
+        assert changed.json()["html"] == "<p>v2</p>"
+        assert changed.headers["etag"] != etag
+        assert client.get("/api/v1/documents/rendered", params={"path": "missing.md"}).status_code == 404
+    finally:
+        client.close()
+        temp.cleanup()
+
+
+def test_rendered_documents_render_on_demand_without_prerendering():
+    client, temp = build_client(
+        settings_overrides={"render_on_save": False, "max_preview_bytes": 16, "document_io_render_limit": 1}
+    )
+    try:
+        assert client.app.state.document_prerenderer is None
+        # On-demand renders have their own cap on the document I/O pool.
+        assert client.app.state.document_executor.limits["render"] == 1
+        client.post("/api/v1/documents/files", json={"path": "", "name": "a.md", "content": "**on demand**"})
+        client.post("/api/v1/documents/files", json={"path": "", "name": "b.md", "content": "x" * 17})
+        response = client.get("/api/v1/documents/rendered", params={"path": "a.md"})
+        assert response.json()["html"] == "<p><strong>on demand</strong></p>"
+        too_large = client.get("/api/v1/documents/rendered", params={"path": "b.md"})
+        assert too_large.status_code == 413
+        assert too_large.json()["code"] == "document_too_large"
+    finally:
+        client.close()
+        temp.cleanup()
+
+
+def test_listing_paginates_and_streams_ndjson():
+    client, temp = build_client()
+    try:
+        for name in ("c.md", "a.md", "b.md"):
+            assert client.post("/api/v1/documents/files", json={"path": "", "name": name}).status_code == 200
+        first = client.get("/api/v1/documents", params={"limit": 2, "sort": "name"})
+        assert first.status_code == 200
+        body = first.json()
+        assert [item["name"] for item in body["items"]] == ["a.md", "b.md"]
+        assert body["total"] == 3
+
+        streamed = client.get(
+            "/api/v1/documents/entries", params={"limit": 2, "cursor": body["next_cursor"]}
+        )
+        assert streamed.status_code == 200
+        assert streamed.headers["content-type"] == "application/x-ndjson"
+        assert streamed.headers["x-total-count"] == "3"
+        assert "x-next-cursor" not in streamed.headers
+        lines = [json.loads(line) for line in streamed.text.splitlines()]
+        assert [line["name"] for line in lines] == ["c.md"]
+
+        assert client.get("/api/v1/documents", params={"cursor": "bogus"}).status_code == 400
+        assert client.get("/api/v1/documents", params={"limit": 0}).status_code == 422
+    finally:
+        client.close()
+        temp.cleanup()
+
+
+def test_batch_endpoint_reports_per_item_results_and_validates_up_front():
+    client, temp = build_client()
+    try:
+        applied = client.post(
+            "/api/v1/documents/batch",
+            json={
+                "operations": [
+                    {"op": "create_folder", "path": "", "name": "Docs"},
+                    {"op": "create_file", "path": "Docs", "name": "a.md", "content": "a"},
+                    {"op": "rename", "oldPath": "Docs/a.md", "newName": "b.md"},
+                    {"op": "save", "path": "Docs/b.md", "content": "b"},
+                ],
+                "atomic": True,
+            },
+        )
+        assert applied.status_code == 200
+        body = applied.json()
+        assert body["committed"] is True
+        assert [item["status"] for item in body["results"]] == ["applied"] * 4
+        assert body["results"][2]["result"]["new_path"] == "Docs/b.md"
+
+        invalid = client.post(
+            "/api/v1/documents/batch",
+            json={"operations": [{"op": "delete", "path": "Docs"}, {"op": "delete", "path": "../x"}]},
+        )
+        assert invalid.status_code == 403
+        assert invalid.json()["details"]["index"] == 1
+        assert client.get("/api/v1/documents/content", params={"path": "Docs/b.md"}).status_code == 200
+        assert client.post(
+            "/api/v1/documents/batch", json={"operations": [{"op": "chmod", "path": "x"}]}
+        ).status_code == 422
     finally:
         client.close()
         temp.cleanup()
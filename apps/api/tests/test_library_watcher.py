@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from markinote_api.modules.documents.service import DocumentService
+from markinote_api.platform.watcher import LibraryChange, LibraryWatcher, _Coalescer
+
+from .test_document_storage_contract import build_storage
+
+
+def collect(watcher: LibraryWatcher) -> tuple[list[LibraryChange], threading.Event]:
+    received: list[LibraryChange] = []
+    arrived = threading.Event()
+
+    def subscriber(changes: list[LibraryChange]) -> None:
+        received.extend(changes)
+        arrived.set()
+
+    watcher.subscribe(subscriber)
+    return received, arrived
+
+
+def wait_for(predicate, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return predicate()
+
+
+def test_coalescer_merges_bursts_per_path() -> None:
+    coalescer = _Coalescer()
+    coalescer.add(LibraryChange("created", "a.md"))
+    coalescer.add(LibraryChange("modified", "a.md"))
+    coalescer.add(LibraryChange("created", "gone.md"))
+    coalescer.add(LibraryChange("deleted", "gone.md"))
+    coalescer.add(LibraryChange("deleted", "b.md"))
+    coalescer.add(LibraryChange("created", "b.md"))
+    coalescer.add(LibraryChange("moved", "c.md", source_path="a.md"))
+    coalescer.add(LibraryChange("moved", "e.md", source_path="d.md"))
+    coalescer.add(LibraryChange("deleted", "e.md"))
+    assert coalescer.drain() == [
+        LibraryChange("modified", "b.md"),
+        LibraryChange("created", "c.md"),
+        LibraryChange("deleted", "d.md"),
+    ]
+
+    coalescer.add(LibraryChange("modified", "x.md"))
+    coalescer.add(LibraryChange("modified", "", True))
+    coalescer.add(LibraryChange("created", "y.md"))
+    assert coalescer.drain() == [LibraryChange("modified", "", True)]
+
+
+def test_polling_snapshots_report_typed_changes_and_detect_moves(tmp_path: Path) -> None:
+    (tmp_path / "docs").mkdir()
+    (tmp_path / "docs" / "a.md").write_text("a", encoding="utf-8")
+    (tmp_path / "keep.md").write_text("k", encoding="utf-8")
+    (tmp_path / "old.md").write_text("o", encoding="utf-8")
+    watcher = LibraryWatcher(tmp_path, backend="polling")
+    before = watcher._snapshot()
+
+    (tmp_path / "docs").rename(tmp_path / "notes")
+    (tmp_path / "keep.md").write_text("changed", encoding="utf-8")
+    (tmp_path / "old.md").unlink()
+    (tmp_path / "new.md").write_text("n", encoding="utf-8")
+    (tmp_path / ".hidden.md").write_text("h", encoding="utf-8")
+
+    assert sorted(watcher._diff(before, watcher._snapshot()), key=lambda change: change.path) == [
+        LibraryChange("modified", "keep.md"),
+        LibraryChange("created", "new.md"),
+        LibraryChange("moved", "notes", True, "docs"),
+        LibraryChange("deleted", "old.md"),
+    ]
+
+
+@pytest.mark.parametrize("backend", ["inotify", "polling"])
+def test_watcher_keeps_storage_indexes_fresh_for_external_writers(
+    tmp_path: Path,
+    backend: str,
+) -> None:
+    storage = build_storage(tmp_path)
+    service = DocumentService(storage)
+    service.create_folder("", "Notes")
+    storage.rebuild_search_index()
+    watcher = LibraryWatcher(storage.root, backend=backend, poll_interval=0.05, debounce=0.05)
+    watcher.subscribe(storage.apply_library_changes)
+    received, _ = collect(watcher)
+    try:
+        watcher.start()
+    except OSError:
+        pytest.skip("inotify is unavailable in this environment")
+    try:
+        _, generation = storage.folder_tree()
+        (storage.root / "Notes" / "synced.md").write_text("pulled from git", encoding="utf-8")
+        (storage.root / "Incoming").mkdir()
+        assert wait_for(lambda: bool(service.search("synced", limit=5)["items"]))
+        assert wait_for(lambda: storage.folder_tree()[1] != generation)
+        assert [item["path"] for item in service.search_content("pulled", limit=5)["items"]] == [
+            "Notes/synced.md"
+        ]
+
+        os.replace(storage.root / "Notes" / "synced.md", storage.root / "Incoming" / "synced.md")
+        assert wait_for(
+            lambda: [item["path"] for item in service.search("synced", limit=5)["items"]]
+            == ["Incoming/synced.md"]
+        )
+        assert any(change.kind in {"moved", "created"} for change in received)
+
+        (storage.root / "Incoming" / "synced.md").unlink()
+        assert wait_for(lambda: service.search_content("pulled", limit=5)["total"] == 0)
+    finally:
+        watcher.stop()
+    assert watcher.backend == backend
@@ -1,30 +1,57 @@
 from __future__ import annotations
 
+import asyncio
 import hashlib
 import os
+import re
+import threading
+import time
 import unicodedata
 from pathlib import Path
 from unittest import mock
 
 import pytest
+from prometheus_client import REGISTRY
 
+from markinote_api.config import Settings
+from markinote_api.modules.rendering.cache import RenderCache
+from markinote_api.modules.rendering.postprocess import postprocess_html
 from markinote_api.modules.rendering.service import (
+    _ALLOWED_TAGS,
+    _PROTOCOLS,
+    RENDERER_FINGERPRINT,
     _allow_attribute,
+    _markdown_engine,
     _prefix_document_ids,
-    _render_cached,
-    _replace_wrapped_placeholder,
+    _render,
+    _render_blocks,
+    _sanitize,
+    _sanitize_with_tree_repair,
+    _split_blocks,
+    configure_render_cache,
     process_markdown,
 )
+from markinote_api.platform.executor import BoundedIOExecutor
+from markinote_api.platform.file_locks import (
+    ResourceLockTimeout,
+    StripedFileLocks,
+    configure_file_locks,
+)
 from markinote_api.platform.files import allowed_file, safe_filename
 from markinote_api.platform.io import (
+    DirectorySyncCommitter,
+    FileVersionCache,
+    SharedLock,
     atomic_write_bytes,
     atomic_write_json,
     atomic_write_text,
+    cached_file_version,
     content_version,
     file_version,
     read_utf8_text,
     resource_lock,
 )
+from markinote_api.platform.path_locks import PathLockManager, path_locks
 from markinote_api.platform.paths import (
     PathValidationError,
     normalize_relative_path,
@@ -65,8 +92,11 @@ def test_render_allowlist_handles_each_attribute_policy(
 
 
 def test_render_helpers_replace_placeholders_and_make_ids_dom_safe() -> None:
-    assert _replace_wrapped_placeholder("<p>TOKEN</p>", "TOKEN", "<del>x</del>") == "<del>x</del>"
-    assert _replace_wrapped_placeholder("<div>TOKEN</div>", "TOKEN", "<b>x</b>") == "<div><b>x</b></div>"
+    assert _render("~~x~~") == "<del>x</del>"
+    assert _render("a ~~x~~ b") == "<p>a <del>x</del> b</p>"
+    assert _render("~~a `c` b~~") == "<del>a <code>c</code> b</del>"
+    assert _render("~~a $x$ b~~") == '<del>a <span class="math-inline">$x$</span> b</del>'
+    assert _render("$a `b` c$") == '<span class="math-inline">$a `b` c$</span>'
 
     rendered = _prefix_document_ids(
         '<h1 id="same">One</h1><h2 id="same">Two</h2>'
@@ -178,16 +208,179 @@ def test_long_non_mermaid_fence_is_restored_without_shortening_its_delimiter() -
     assert "content inside the longer fence" in rendered
 
 
+def _render_cache_count(tier: str, outcome: str) -> float:
+    return REGISTRY.get_sample_value(
+        "markinote_render_cache_total", {"tier": tier, "outcome": outcome}
+    ) or 0.0
+
+
+def test_placeholder_heavy_documents_restore_every_protected_span() -> None:
+    def placeholder_heavy(count: int) -> str:
+        return "\n\n".join(
+            f"`c{index}` $x_{index}$ ~~s{index} `n{index}`~~\n\n```mermaid\nA{index}-->B\n```"
+            for index in range(count)
+        )
+
+    count = 2000
+    rendered = _render(placeholder_heavy(count))
+    assert re.search(r"MN[0-9A-F]{32}", rendered) is None
+    assert rendered.count("<code>") == 2 * count
+    assert rendered.count('class="math-inline"') == count
+    assert rendered.count("<del>") == count
+    assert rendered.count('class="language-mermaid"') == count
+    assert f"A{count - 1}--&gt;B" in rendered
+
+    # Protection and restoration alone, without Markdown or sanitizing, scale
+    # linearly: four times the spans must not cost anywhere near sixteen times.
+    identity = mock.Mock(convert=lambda text: text)
+    with (
+        mock.patch("markinote_api.modules.rendering.service._markdown_engine", return_value=identity),
+        mock.patch("markinote_api.modules.rendering.service._sanitize", side_effect=lambda text: text),
+    ):
+        timings = {}
+        for size in (count, 4 * count):
+            source = placeholder_heavy(size)
+            runs = []
+            for _ in range(3):
+                started = time.perf_counter()
+                restored = _render(source)
+                runs.append(time.perf_counter() - started)
+            assert re.search(r"MN[0-9A-F]{32}", restored) is None
+            timings[size] = min(runs)
+    assert timings[4 * count] < 8 * timings[count]
+
+
 def test_markdown_rendering_is_cached_and_rejects_non_text() -> None:
-    _render_cached.cache_clear()
-    first = process_markdown("plain")
-    second = process_markdown("plain")
+    cache = configure_render_cache(1024 * 1024)
+    hits = _render_cache_count("memory", "hit")
+    first = process_markdown("plain\nlines")
+    second = process_markdown("plain\r\nlines")
     assert first == second
-    assert _render_cached.cache_info().hits == 1
+    assert _render_cache_count("memory", "hit") == hits + 1
+    assert cache.key("plain") != RenderCache(1024, fingerprint="other").key("plain")
     with pytest.raises(TypeError):
         process_markdown(b"plain")
 
 
+def test_render_cache_evicts_by_bytes_and_persists_a_disk_tier(tmp_path: Path) -> None:
+    cache = RenderCache(10, fingerprint=RENDERER_FINGERPRINT)
+    evictions = _render_cache_count("memory", "eviction")
+    cache.put("a", "12345")
+    cache.put("b", "12345")
+    assert cache.get("a") == "12345"
+    cache.put("c", "é" * 2)
+    assert cache.get("b") is None
+    assert cache.get("a") == "12345"
+    assert _render_cache_count("memory", "eviction") == evictions + 1
+    cache.put("large", "x" * 11)
+    assert cache.get("large") is None
+
+    directory = tmp_path / ".render-cache"
+    try:
+        configure_render_cache(1024, directory=directory, max_disk_bytes=1024)
+        rendered = process_markdown("# Cached")
+        # A restarted process starts with an empty memory tier.
+        restarted = configure_render_cache(1024, directory=directory, max_disk_bytes=1024)
+        disk_hits = _render_cache_count("disk", "hit")
+        with mock.patch("markinote_api.modules.rendering.service._render") as render:
+            assert process_markdown("# Cached") == rendered
+        render.assert_not_called()
+        assert _render_cache_count("disk", "hit") == disk_hits + 1
+
+        for index in range(40):
+            restarted.put(f"{index:02x}" * 32, "y" * 100)
+        assert sum(path.stat().st_size for path in directory.rglob("*.html")) <= 1024
+    finally:
+        configure_render_cache(32 * 1024 * 1024)
+
+
+def test_large_documents_render_by_block_and_rerender_only_edited_blocks() -> None:
+    sections = [
+        f"# Section\n\nParagraph {index} links to [the intro](#section) with $x_{index}$.\n\n"
+        f"- item\n\n- loose item\n\n```python\nvalue = {index}\n\n\nother = 2\n```\n\n"
+        f"$$\na_{index}\n\n+ b\n$$\n\n> quote\n\n> more\n"
+        for index in range(240)
+    ]
+    source = "\n".join(sections)
+    blocks = _split_blocks(source)
+    assert len(blocks) > 12
+    assert "".join(blocks) == source
+    cache = RenderCache(64 * 1024 * 1024)
+    assert _render_blocks(source, cache) == _render(source)
+
+    edited = source.replace("Paragraph 200 ", "Paragraph two hundred ")
+    with mock.patch(
+        "markinote_api.modules.rendering.service._render", side_effect=_render
+    ) as render:
+        assert "Paragraph two hundred" in _render_blocks(edited, cache)
+    assert render.call_count < len(blocks) // 4
+
+    footnoted = source + "\nA note[^1].\n\n[^1]: Defined at the end.\n"
+    assert _split_blocks(footnoted) == [footnoted]
+
+    # Explicit IDs repeated across blocks are numbered as in a whole render.
+    section = "## Setup {#setup}\n\n## Setup\n\n[s](#setup) [s1](#setup_1)\n\n" + "Long text. " * 300 + "\n\n"
+    explicit = section * 4
+    assert _split_blocks(explicit) == [explicit]
+    assert _render_blocks(explicit, cache) == _render(explicit)
+
+
+def test_markdown_engines_are_reused_per_thread_and_code_highlighting_is_memoized() -> None:
+    source = "Note[^1] *[HTML]\n\n```python\nvalue = 1\n```\n\n[^1]: Footnote.\n\n*[HTML]: Markup\n"
+    first = _render(source)
+    engine = _markdown_engine()
+    hits = _render_cache_count("highlight", "hit")
+    assert _render(source) == first
+    assert _render("# Other") == '<h1 id="md-other">Other</h1>'
+    assert _markdown_engine() is engine
+    assert _render_cache_count("highlight", "hit") == hits + 1
+
+    engines: list[object] = []
+    thread = threading.Thread(target=lambda: engines.append(_markdown_engine()))
+    thread.start()
+    thread.join()
+    assert engines[0] is not engine
+
+
+@pytest.mark.parametrize(
+    "source",
+    (
+        "# Intro\n\n## Intro\n\n[again](#intro) [ok](http://x \"t\") ~~gone~~ $a<b$\n",
+        "### Setup {#custom-id .cls}\n\n[back](#custom-id) [missing](#nowhere)\n",
+        '<a href="javascript:alert(1)" target="_blank">bad</a> <a href="https://ok" target="_blank">ok</a>\n',
+        "Text <span style=\"color:red\" title='a \"b\" & c'>html</span> &copy; &amp; &#169; &bogus & raw.\n",
+        "```python\nx = 1 < 2 and 'a' & \"b\"\n\n\ny = 2\n```\n\n    indented <code>\n",
+        "- item\n\n- loose\n\n| a | b |\n|:--|--:|\n| 1 | 2 |\n\nTerm\n\n: definition\n",
+        "Note[^n] and <!-- hidden -->\n\n[^n]: With [link](http://x).\n\n<section>dropped</section>\n",
+        "<details><summary>More</summary>\n\nHidden *text*\n\n</details>\n\n<p>unclosed <b>bold\n\nnext",
+        "Keep this <!--> visible text and more -->tail\n",
+        "Also <!---> shown -->, <!-- closed --!> too --> and <!-- -- fine --->\n",
+        "Never <!-- closed\n\nstill text\n",
+        "Form\x0cfeed <b>bold\x0c</b>\n",
+    ),
+)
+def test_single_pass_postprocessor_matches_the_tree_repairing_sanitizer(source: str) -> None:
+    with mock.patch(
+        "markinote_api.modules.rendering.service.postprocess_html", return_value=None
+    ):
+        expected = _render(source)
+    assert _render(source) == expected
+
+
+def test_postprocessor_defers_markup_that_needs_tree_repair() -> None:
+    for rendered in (
+        "<p>a<div>b</div></p>",
+        "<script>alert('<b>x</b>')</script><p>after</p>",
+        "<table><tr><td>raw</td></tr></table>",
+        "<h1>a<h2>b</h2></h1>",
+    ):
+        assert postprocess_html(
+            rendered, tags=_ALLOWED_TAGS, attribute_filter=_allow_attribute, protocols=_PROTOCOLS
+        ) is None
+        assert _sanitize(rendered) == _sanitize_with_tree_repair(rendered)
+    assert "<script" not in _sanitize("<script>alert(1)</script>")
+
+
 @pytest.mark.parametrize(
     ("filename", "extensions", "expected"),
     (
@@ -338,6 +531,318 @@ def test_atomic_io_round_trip_hashing_and_locking(tmp_path: Path) -> None:
     assert target.read_text(encoding="utf-8") == "locked"
 
 
+def test_durability_modes_control_and_coalesce_fsyncs(tmp_path: Path) -> None:
+    def fsyncs(durability: str, target: str) -> float:
+        return REGISTRY.get_sample_value(
+            "markinote_fsync_seconds_count", {"durability": durability, "target": target}
+        ) or 0.0
+
+    before = {(mode, target): fsyncs(mode, target) for mode in ("strict", "relaxed") for target in ("file", "directory")}
+    atomic_write_bytes(tmp_path / "strict.json", b"{}", durability="strict")
+    atomic_write_bytes(tmp_path / "relaxed.json", b"{}", durability="relaxed")
+    assert fsyncs("strict", "file") == before[("strict", "file")] + 1
+    assert fsyncs("strict", "directory") == before[("strict", "directory")] + 1
+    assert fsyncs("relaxed", "file") == before[("relaxed", "file")]
+    assert fsyncs("relaxed", "directory") == before[("relaxed", "directory")]
+    assert (tmp_path / "relaxed.json").read_bytes() == b"{}"
+
+    committer = DirectorySyncCommitter(window=0.05)
+    synced: list[str] = []
+    writers = 8
+    ready = threading.Barrier(writers, timeout=5)
+
+    def write() -> None:
+        ready.wait()
+        committer.sync(tmp_path)
+
+    with mock.patch("markinote_api.platform.io._fsync_directory", side_effect=lambda path, _: synced.append(path)):
+        threads = [threading.Thread(target=write) for _ in range(writers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+    assert not any(thread.is_alive() for thread in threads)
+    # Every writer returned only after a directory fsync, and they shared it.
+    assert 1 <= len(synced) < writers
+    assert set(synced) == {str(tmp_path)}
+
+    with (
+        mock.patch("markinote_api.platform.io._fsync_directory", side_effect=OSError("disk")),
+        pytest.raises(OSError),
+    ):
+        committer.sync(tmp_path)
+
+
+def test_directory_sync_committer_never_strands_writers(tmp_path: Path) -> None:
+    committer = DirectorySyncCommitter(window=0)
+
+    def sync() -> BaseException | None:
+        outcome: list[BaseException | None] = []
+
+        def run() -> None:
+            try:
+                committer.sync(tmp_path)
+            except BaseException as exc:
+                outcome.append(exc)
+            else:
+                outcome.append(None)
+
+        writer = threading.Thread(target=run, daemon=True)
+        writer.start()
+        writer.join(5)
+        assert outcome, "writer is still waiting for the directory sync"
+        return outcome[0]
+
+    class Stop(BaseException):
+        pass
+
+    with mock.patch("markinote_api.platform.io._fsync_directory", side_effect=ValueError("bug")):
+        assert isinstance(sync(), ValueError)
+    with mock.patch("markinote_api.platform.io._fsync_directory", side_effect=Stop):
+        error = sync()
+    assert isinstance(error, RuntimeError)
+    assert isinstance(error.__cause__, Stop)
+    # The committer that died is replaced by the next writer.
+    synced: list[str] = []
+    with mock.patch("markinote_api.platform.io._fsync_directory", side_effect=lambda path, _: synced.append(path)):
+        assert sync() is None
+    assert synced == [str(tmp_path)]
+
+
+def test_file_version_cache_hashes_only_after_a_stat_change(tmp_path: Path) -> None:
+    target = tmp_path / "note.md"
+    atomic_write_bytes(target, b"first")
+    assert cached_file_version(target) == content_version(b"first")
+
+    with mock.patch("markinote_api.platform.io.file_version", side_effect=AssertionError("rehashed")):
+        assert cached_file_version(target) == content_version(b"first")
+
+    atomic_write_bytes(target, b"second")
+    assert cached_file_version(target) == content_version(b"second")
+
+    cache = FileVersionCache(max_entries=2)
+    cache.put((1, 1, 1, 1, 1), "a")
+    cache.put((1, 2, 1, 1, 1), "b")
+    assert cache.get((1, 1, 1, 1, 1)) == "a"
+    cache.put((1, 3, 1, 1, 1), "c")
+    assert cache.get((1, 2, 1, 1, 1)) is None
+    assert cache.get((1, 1, 1, 1, 1)) == "a"
+    assert len(cache) == 2
+
+
+def test_resource_lock_shares_readers_and_prefers_waiting_writers(tmp_path: Path) -> None:
+    key = tmp_path / "library"
+    both_reading = threading.Barrier(2, timeout=5)
+
+    def reader() -> None:
+        with resource_lock(key, shared=True):
+            both_reading.wait()
+
+    readers = [threading.Thread(target=reader) for _ in range(2)]
+    for thread in readers:
+        thread.start()
+    for thread in readers:
+        thread.join(5)
+    assert not both_reading.broken
+
+    waits_before = REGISTRY.get_sample_value(
+        "markinote_resource_lock_wait_seconds_count", {"mode": "exclusive"}
+    ) or 0.0
+    lock = SharedLock()
+    order: list[str] = []
+
+    def writer() -> None:
+        lock.acquire_exclusive()
+        order.append("writer")
+        lock.release_exclusive()
+
+    def late_reader() -> None:
+        lock.acquire_shared()
+        order.append("reader")
+        lock.release_shared()
+
+    lock.acquire_shared()
+    lock.acquire_shared()
+    writer_thread = threading.Thread(target=writer)
+    writer_thread.start()
+    while not lock._waiting_writers:
+        time.sleep(0.001)
+    reader_thread = threading.Thread(target=late_reader)
+    reader_thread.start()
+    reader_thread.join(0.1)
+    assert reader_thread.is_alive()
+    with pytest.raises(RuntimeError):
+        lock.acquire_exclusive()
+    lock.release_shared()
+    lock.release_shared()
+    writer_thread.join(5)
+    reader_thread.join(5)
+
+    assert order == ["writer", "reader"]
+    assert REGISTRY.get_sample_value(
+        "markinote_resource_lock_wait_seconds_count", {"mode": "exclusive"}
+    ) == waits_before + 1
+    with resource_lock(key), resource_lock(key, shared=True), resource_lock(key):
+        pass
+
+
+def test_path_locks_isolate_subtrees_and_order_multi_path_requests() -> None:
+    locks = PathLockManager()
+
+    def blocked(*, shared: tuple[str, ...] = (), exclusive: tuple[str, ...] = ()) -> bool:
+        acquired = threading.Event()
+
+        def worker() -> None:
+            with locks.shared(*shared), locks.exclusive(*exclusive):
+                acquired.set()
+
+        thread = threading.Thread(target=worker, daemon=True)
+        thread.start()
+        return not acquired.wait(0.1)
+
+    with locks.exclusive("projects/a.md"):
+        assert not blocked(exclusive=("journal/2026",))
+        assert not blocked(shared=("projects/b.md",))
+        assert blocked(shared=("projects/a.md",))
+        assert blocked(shared=("projects",))
+        with locks.exclusive("projects/a.md"), locks.shared(""):
+            pass
+
+    with locks.shared("journal"):
+        assert not blocked(shared=("journal/2026/entry.md",))
+        assert blocked(exclusive=("journal/2026/entry.md",))
+
+    finished: list[str] = []
+
+    def mover(source: str, destination: str) -> None:
+        for _ in range(200):
+            with locks.exclusive(source, destination):
+                pass
+        finished.append(source)
+
+    movers = [
+        threading.Thread(target=mover, args=("a/x.md", "b/x.md")),
+        threading.Thread(target=mover, args=("b/y.md", "a/y.md")),
+    ]
+    for thread in movers:
+        thread.start()
+    for thread in movers:
+        thread.join(10)
+    assert sorted(finished) == ["a/x.md", "b/y.md"]
+
+
+@pytest.mark.skipif(os.name == "nt", reason="flock is POSIX-only")
+def test_bounded_io_executor_caps_each_kind_and_records_queueing() -> None:
+    executor = BoundedIOExecutor(4, {"search": 1}, name="test-io")
+    release = threading.Event()
+    running: list[str] = []
+
+    def blocking(label: str) -> str:
+        running.append(label)
+        release.wait(5)
+        return label
+
+    waits_before = REGISTRY.get_sample_value(
+        "markinote_io_executor_wait_seconds_count", {"operation": "search"}
+    ) or 0.0
+
+    async def exercise() -> list[str]:
+        searches = [asyncio.create_task(executor.run("search", blocking, f"s{i}")) for i in range(2)]
+        read = asyncio.create_task(executor.run("read", blocking, "r"))
+        while len(running) < 2:
+            await asyncio.sleep(0.001)
+        await asyncio.sleep(0.05)
+        assert sorted(running) == ["r", "s0"]
+        release.set()
+        return await asyncio.gather(*searches, read)
+
+    try:
+        assert asyncio.run(exercise()) == ["s0", "s1", "r"]
+    finally:
+        executor.shutdown()
+    assert REGISTRY.get_sample_value(
+        "markinote_io_executor_wait_seconds_count", {"operation": "search"}
+    ) == waits_before + 2
+    assert REGISTRY.get_sample_value(
+        "markinote_io_executor_queue_depth_bucket", {"operation": "search", "le": "0.0"}
+    ) is not None
+    with pytest.raises(ValueError):
+        BoundedIOExecutor(0)
+
+
+def test_file_locks_exclude_other_processes_with_striping_and_timeouts(tmp_path: Path) -> None:
+    # flock state belongs to the open file description, so a second instance
+    # with its own descriptors stands in for another worker process.
+    worker = StripedFileLocks(tmp_path, stripes=4, timeout=0.1)
+    other_worker = StripedFileLocks(tmp_path, stripes=4, timeout=0.1)
+    try:
+        with worker.hold({"commands.json": True}):
+            with pytest.raises(ResourceLockTimeout), other_worker.hold({"commands.json": False}):
+                pass
+            with worker.hold({"commands.json": True}):
+                pass
+        with (
+            worker.hold({"commands.json": False}),
+            other_worker.hold({"commands.json": False}),
+            pytest.raises(RuntimeError),
+            worker.hold({"commands.json": True}),
+        ):
+            pass
+        for index in range(50):
+            with worker.hold({f"conversation-{index}.json": True}):
+                pass
+        assert len(list(tmp_path.glob("*.lock"))) <= 4
+    finally:
+        worker.close()
+        other_worker.close()
+
+
+@pytest.mark.skipif(os.name == "nt", reason="flock is POSIX-only")
+def test_configured_file_backend_extends_resource_and_path_locks(tmp_path: Path) -> None:
+    lock_folder = tmp_path / "locks"
+    configure_file_locks("file", lock_folder, stripes=8, timeout=0.1)
+    other_worker = StripedFileLocks(lock_folder, stripes=8, timeout=0.1)
+    try:
+        journal = tmp_path / "commands.json"
+        journal_key = os.path.normcase(os.path.abspath(journal))
+        with (
+            resource_lock(journal),
+            pytest.raises(ResourceLockTimeout),
+            other_worker.hold({journal_key: False}),
+        ):
+            pass
+        with other_worker.hold({journal_key: True}):
+            pass
+
+        library = tmp_path / "library"
+        library.mkdir()
+        root_key = os.path.normcase(os.path.realpath(library))
+        projects_key = f"{root_key}/projects"
+        # A resource whose key stripes like the library root, as the trash can.
+        resource = next(
+            candidate
+            for candidate in (tmp_path / f"resource-{index}" for index in range(1000))
+            if other_worker.stripe(os.path.normcase(os.path.abspath(candidate))) == other_worker.stripe(root_key)
+        )
+        with path_locks(library).exclusive("projects/a.md"):
+            with pytest.raises(ResourceLockTimeout), other_worker.hold({projects_key: False}, group="paths"):
+                pass
+            if other_worker.stripe(root_key) != other_worker.stripe(projects_key):
+                with other_worker.hold({root_key: False}, group="paths"):
+                    pass
+            with resource_lock(resource):
+                pass
+    finally:
+        configure_file_locks("process")
+        other_worker.close()
+
+    with pytest.raises(ValueError, match="lock_backend=file"):
+        Settings(workers=2)
+    assert Settings(workers=2, lock_backend="file").workers == 2
+    with pytest.raises(ValueError, match="document_save_coalesce_ms"):
+        Settings(workers=2, lock_backend="file", document_save_coalesce_ms=500)
+
+
 def test_atomic_io_rejects_non_text_and_removes_failed_temporary_file(tmp_path: Path) -> None:
     with pytest.raises(TypeError):
         atomic_write_text(tmp_path / "invalid.txt", b"bytes")
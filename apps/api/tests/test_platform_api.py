@@ -6,6 +6,7 @@ from typing import Any
 
 import pytest
 from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
 from pydantic import ValidationError
 from starlette.exceptions import HTTPException
 
@@ -197,6 +198,38 @@ def test_rendering_preview_has_an_independent_configured_limit():
         temp.cleanup()
 
 
+def test_process_render_backend_times_out_and_replaces_the_worker():
+    def timeout_restarts() -> float:
+        return REGISTRY.get_sample_value("markinote_render_worker_restarts_total", {"reason": "timeout"}) or 0.0
+
+    client, temp = build_client(
+        settings_overrides={"render_backend": "process", "render_workers": 1, "render_timeout_seconds": 30}
+    )
+    try:
+        with client:
+            pool = client.app.state.render_pool
+            response = client.post("/api/v1/rendering/preview", json={"markdown": "# Worker"})
+            assert response.status_code == 200
+            assert response.json()["html"] == '<h1 id="md-worker">Worker</h1>'
+
+            restarts = timeout_restarts()
+            pool.timeout = 0.05
+            heavy = "\n\n".join(f"`c{index}` $x_{index}$ ~~s{index}~~" for index in range(20_000))
+            response = client.post("/api/v1/rendering/preview", json={"markdown": heavy})
+            assert response.status_code == 503
+            assert response.json()["code"] == "render_timeout"
+            assert timeout_restarts() == restarts + 1
+
+            pool.timeout = 30
+            response = client.post("/api/v1/rendering/preview", json={"markdown": "*after*"})
+            assert response.json()["html"] == "<p><em>after</em></p>"
+        with pytest.raises(RuntimeError, match="closed"):
+            pool.render("*closed*")
+    finally:
+        client.close()
+        temp.cleanup()
+
+
 def test_access_token_is_exchanged_for_signed_http_only_session():
     raw_token = "do-not-persist-this-token"
     client, temp = build_client(